@@ -0,0 +1,215 @@
+"""
+Streaming catalog and order exports for downstream feeds.
+
+Rows are read with `.values().iterator(chunk_size=...)` and encoded one
+at a time, so memory use does not grow with the size of the export. The
+same generators back the admin_api export endpoints and the `export_data`
+management command.
+
+Incremental exports: every export starts by taking a watermark (the current
+time). Passing it back as `since` returns only rows whose `updated_at` is
+at or after it. Rows changed while an export is running can therefore show
+up in two consecutive exports, but are never missed. Deleted rows are not
+reported; products that were deactivated are, with `is_active` false.
+"""
+import csv
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils import timezone
+
+from orders.models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+from store.models import Product
+
+DEFAULT_CHUNK_SIZE = 2000
+# Encoded output is handed to the response (or file) in blocks of this size.
+BUFFER_SIZE = 64 * 1024
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+class ProductExport:
+    """
+    The active catalog, or every product changed since the watermark.
+    """
+    name = 'products'
+    fields = {
+        'id': 'id',
+        'slug': 'slug',
+        'name': 'name',
+        'description': 'description',
+        'price': 'price',
+        'stock_quantity': 'stock_quantity',
+        'color': 'color',
+        'category': 'category__slug',
+        'category_name': 'category__name',
+        'is_featured': 'is_featured',
+        'is_active': 'is_active',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+    }
+
+    @property
+    def columns(self):
+        return list(self.fields)
+
+    def get_queryset(self, since=None):
+        if since is None:
+            queryset = Product.objects.filter(is_active=True)
+        else:
+            # A renamed category changes every product row that embeds it.
+            queryset = Product.objects.filter(
+                Q(updated_at__gte=since) | Q(category__updated_at__gte=since)
+            )
+        return queryset.order_by('pk').values_list(*self.fields.values())
+
+    def rows(self, since=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        columns = list(self.fields)
+        for values in self.get_queryset(since).iterator(chunk_size=chunk_size):
+            yield dict(zip(columns, values))
+
+
+class OrderExport:
+    """
+    Order history with the shipping address and the ordered items,
+    including orders moved to the archive tables (orders.archive).
+    """
+    name = 'orders'
+    fields = {
+        'id': 'id',
+        'user': 'user__username',
+        'email': 'user__email',
+        'status': 'status',
+        'total_amount': 'total_amount',
+        'shipping_city': 'shipping_address__city',
+        'shipping_postal_code': 'shipping_address__postal_code',
+        'shipping_country': 'shipping_address__country',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+    }
+    item_fields = ('product_name', 'price', 'quantity')
+    # Live orders are read before archived ones: an order archived while
+    # the export runs is then exported twice at worst, never missed.
+    sources = ((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem))
+
+    @property
+    def columns(self):
+        return [*self.fields, 'items']
+
+    def get_querysets(self, since=None):
+        """
+        Yield an `(orders, item model)` pair for the live and the archived
+        orders.
+        """
+        for model, item_model in self.sources:
+            queryset = model.objects.all()
+            if since is not None:
+                queryset = queryset.filter(updated_at__gte=since)
+            yield queryset.order_by('pk').values_list(*self.fields.values()), item_model
+
+    def rows(self, since=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        columns = list(self.fields)
+        for queryset, item_model in self.get_querysets(since):
+            chunk = []
+            for values in queryset.iterator(chunk_size=chunk_size):
+                chunk.append(dict(zip(columns, values)))
+                if len(chunk) >= chunk_size:
+                    yield from self.with_items(chunk, item_model)
+                    chunk = []
+            yield from self.with_items(chunk, item_model)
+
+    def with_items(self, orders, item_model=OrderItem):
+        """
+        Attach items to a chunk of orders with one query.
+        """
+        if not orders:
+            return
+        items = {order['id']: [] for order in orders}
+        queryset = (
+            item_model.objects.filter(order_id__in=list(items))
+            .order_by('pk')
+            .values_list('order_id', *self.item_fields)
+        )
+        for order_id, *values in queryset:
+            items[order_id].append(dict(zip(self.item_fields, values)))
+        for order in orders:
+            order['items'] = items[order['id']]
+            yield order
+
+
+EXPORTS = {export.name: export for export in (ProductExport(), OrderExport())}
+
+
+class _Echo:
+    """
+    File-like object whose write() returns the written value, for csv.writer.
+    """
+
+    def write(self, value):
+        return value
+
+
+def encode_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder, separators=(',', ':')) + '\n'
+
+
+def _csv_value(value):
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, cls=DjangoJSONEncoder, separators=(',', ':'))
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return '' if value is None else value
+
+
+def encode_csv(rows, columns):
+    """
+    Encode rows as CSV. Nested values (order items) become JSON text.
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([_csv_value(row[column]) for column in columns])
+
+
+def to_bytes(chunks, compress=False):
+    """
+    Join encoded text into BUFFER_SIZE blocks, gzipping them on the fly.
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    buffer, size = [], 0
+    for chunk in chunks:
+        data = chunk.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        if size >= BUFFER_SIZE:
+            block = b''.join(buffer)
+            buffer, size = [], 0
+            if compressor:
+                block = compressor.compress(block)
+            if block:
+                yield block
+    block = b''.join(buffer)
+    if compressor:
+        block = compressor.compress(block) + compressor.flush()
+    if block:
+        yield block
+
+
+def stream_export(export, output_format, since=None, compress=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Return (watermark, byte iterator) for an export in the given format.
+    """
+    watermark = timezone.now()
+    rows = export.rows(since=since, chunk_size=chunk_size)
+    if output_format == 'csv':
+        text = encode_csv(rows, export.columns)
+    else:
+        text = encode_ndjson(rows)
+    return watermark, to_bytes(text, compress=compress)
@@ -0,0 +1,22 @@
+from django_filters import rest_framework as filters
+from orders.models import ArchivedOrder, Order
+
+class AdminOrderFilter(filters.FilterSet):
+    """
+    Filters for the admin order list. Each combination is served by one of
+    the Order indexes in created_at order: `status` and the date range by
+    (status, created_at), `user` by (user, created_at), the date range alone
+    by (created_at, id).
+    """
+    status = filters.ChoiceFilter(choices=Order.STATUS_CHOICES)
+    user = filters.NumberFilter(field_name='user_id')
+    created_after = filters.IsoDateTimeFilter(field_name='created_at', lookup_expr='gte')
+    created_before = filters.IsoDateTimeFilter(field_name='created_at', lookup_expr='lt')
+
+    class Meta:
+        model = Order
+        fields = ['status', 'user', 'created_after', 'created_before']
+
+class AdminArchivedOrderFilter(AdminOrderFilter):
+    class Meta(AdminOrderFilter.Meta):
+        model = ArchivedOrder
@@ -1,11 +1,14 @@
 from rest_framework import serializers
 from store.models import Product, Category
-from orders.models import Order
+from orders.models import ArchivedOrder, Order
+from users.serializers import AddressSerializer
 
 class AdminProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = '__all__'
+        # Maintained by cart.reservations only.
+        read_only_fields = ('reserved_quantity',)
 
 class AdminCategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -13,12 +16,44 @@ class AdminCategorySerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 class AdminOrderSerializer(serializers.ModelSerializer):
+    username = serializers.CharField(source='user.username', read_only=True)
+    email = serializers.EmailField(source='user.email', read_only=True)
+    shipping_address_detail = AddressSerializer(source='shipping_address', read_only=True)
+
     class Meta:
         model = Order
         fields = '__all__'
         read_only_fields = ('user', 'total_amount', 'shipping_address')
 
+class AdminArchivedOrderSerializer(AdminOrderSerializer):
+    class Meta(AdminOrderSerializer.Meta):
+        model = ArchivedOrder
+
 class AdminOrderStatusSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = ['status']
+
+    def validate_status(self, value):
+        order = self.instance
+        if order is not None and value != order.status and not order.can_transition_to(value):
+            raise serializers.ValidationError(f"An order cannot move from '{order.status}' to '{value}'.")
+        return value
+
+class AdminOrderBulkStatusSerializer(serializers.Serializer):
+    """
+    Target status plus either explicit order `ids` or a `filter` with the
+    admin order list's filter parameters.
+    """
+    MAX_ORDERS = 10000
+
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=MAX_ORDERS, required=False
+    )
+    filter = serializers.DictField(child=serializers.CharField(), required=False)
+
+    def validate(self, data):
+        if ('ids' in data) == ('filter' in data):
+            raise serializers.ValidationError('Send either ids or filter.')
+        return data
@@ -0,0 +1,439 @@
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+from orders.archive import archive_orders
+from orders.models import DailyProductSales, DailySales, Order, OrderItem
+from orders.rollups import backfill, record_order_created
+from orders.transitions import transition_orders
+from store.models import Category, Product
+from store.testing import QueryPlanMixin
+from users.models import Address
+from .filters import AdminOrderFilter
+from .views import AdminOrderListView, AdminOrderPagination, AdminOrderUpdateStatusView
+
+User = get_user_model()
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='adminpass', is_staff=True)
+        self.customer = User.objects.create_user(username='buyer', email='buyer@example.com', password='pass')
+        self.client.force_authenticate(user=self.admin)
+        self.category = Category.objects.create(name='Export Category')
+        self.lamp = Product.objects.create(name='Lamp', category=self.category, price=10, description='Bright')
+        self.chair = Product.objects.create(name='Chair', category=self.category, price=25, description='Comfy')
+        Product.objects.create(name='Retired', category=self.category, price=5, description='', is_active=False)
+        self.order = Order.objects.create(user=self.customer, total_amount=35)
+        OrderItem.objects.create(order=self.order, product_name='Lamp', price=10, quantity=1)
+        OrderItem.objects.create(order=self.order, product_name='Chair', price=25, quantity=1)
+        self.products_url = reverse('admin_api:admin-product-export')
+        self.orders_url = reverse('admin_api:admin-order-export')
+
+    def read(self, response):
+        body = b''.join(response.streaming_content)
+        if response.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        return body.decode('utf-8')
+
+    def test_requires_admin(self):
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.get(self.products_url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_product_ndjson_exports_active_catalog(self):
+        response = self.client.get(self.products_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertIn('X-Export-Watermark', response)
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual([row['slug'] for row in rows], ['lamp', 'chair'])
+        self.assertEqual(rows[0]['price'], '10.00')
+        self.assertEqual(rows[0]['category'], self.category.slug)
+
+    def test_product_csv(self):
+        response = self.client.get(self.products_url, {'output': 'csv'})
+        rows = list(csv.DictReader(io.StringIO(self.read(response))))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1]['name'], 'Chair')
+        self.assertEqual(rows[1]['is_active'], 'true')
+
+    def test_gzip_when_accepted(self):
+        response = self.client.get(self.products_url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(len(self.read(response).splitlines()), 2)
+
+    def test_since_returns_changed_rows_only(self):
+        watermark = self.client.get(self.products_url)['X-Export-Watermark']
+        Product.objects.filter(pk=self.lamp.pk).update(updated_at=timezone.now() + timedelta(seconds=1))
+        self.lamp.refresh_from_db()
+        self.chair.is_active = False
+        self.chair.save()
+        response = self.client.get(self.products_url, {'since': watermark})
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual({row['slug']: row['is_active'] for row in rows}, {'lamp': True, 'chair': False})
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get(self.products_url, {'since': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get(self.products_url, {'output': 'xml'}).status_code, 400)
+
+    def test_order_export_includes_items(self):
+        response = self.client.get(self.orders_url)
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['email'], 'buyer@example.com')
+        self.assertEqual([item['product_name'] for item in rows[0]['items']], ['Lamp', 'Chair'])
+
+    def test_order_export_includes_archived_orders(self):
+        old = Order.objects.create(user=self.customer, total_amount=10, status='completed')
+        OrderItem.objects.create(order=old, product_name='Lamp', price=10, quantity=1)
+        Order.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=400))
+        archive_orders(timezone.now() - timedelta(days=365))
+
+        response = self.client.get(self.orders_url)
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.order.pk, old.pk])
+        self.assertEqual(rows[1]['status'], 'completed')
+        self.assertEqual(rows[1]['items'], [{'product_name': 'Lamp', 'price': '10.00', 'quantity': 1}])
+
+    def test_command_writes_gzipped_csv(self):
+        handle, path = tempfile.mkstemp(suffix='.csv.gz')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        err = StringIO()
+        call_command('export_data', 'orders', '--output-format', 'csv', '--gzip', '-o', path, stderr=err)
+        with gzip.open(path, 'rt') as export:
+            rows = list(csv.DictReader(export))
+        self.assertEqual(rows[0]['user'], 'buyer')
+        self.assertEqual(len(json.loads(rows[0]['items'])), 2)
+        self.assertIn('Watermark:', err.getvalue())
+
+class AdminOrderListTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='ops', password='adminpass', is_staff=True)
+        self.client.force_authenticate(user=self.admin)
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com')
+        self.bob = User.objects.create_user(username='bob')
+        address = Address.objects.create(
+            profile=self.alice.profile, address_line_1='1 Main St', city='Springfield',
+            state='IL', postal_code='62701', country='US'
+        )
+        start = timezone.now() - timedelta(days=30)
+        orders = []
+        for i in range(30):
+            orders.append(Order(
+                user=self.alice if i % 2 else self.bob,
+                shipping_address=address if i % 2 else None,
+                status='paid' if i % 3 == 0 else 'pending',
+                total_amount=10 + i,
+            ))
+        Order.objects.bulk_create(orders)
+        # created_at is auto_now_add; spread the orders one day apart.
+        for day, order in enumerate(Order.objects.order_by('pk')):
+            Order.objects.filter(pk=order.pk).update(created_at=start + timedelta(days=day))
+        self.start = start
+        self.url = reverse('admin_api:admin-order-list')
+
+    def test_pages_are_one_query_and_follow_the_cursor(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {'page_size': 20})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        first = response.data['results']
+        self.assertEqual(len(first), 20)
+        self.assertNotIn('count', response.data)
+        self.assertEqual(first[0]['total_amount'], '39.00')
+        self.assertEqual(first[0]['username'], 'alice')
+        self.assertEqual(first[0]['shipping_address_detail']['city'], 'Springfield')
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertIsNone(response.data['next'])
+        ids = [row['id'] for row in first + response.data['results']]
+        self.assertEqual(ids, list(Order.objects.order_by('-created_at', '-id').values_list('pk', flat=True)))
+
+    def test_filters(self):
+        params = {
+            'status': 'paid',
+            'user': self.bob.pk,
+            'created_after': (self.start + timedelta(days=10)).isoformat(),
+            'created_before': (self.start + timedelta(days=20)).isoformat(),
+        }
+        response = self.client.get(self.url, params)
+        expected = Order.objects.filter(
+            status='paid', user=self.bob,
+            created_at__gte=self.start + timedelta(days=10), created_at__lt=self.start + timedelta(days=20),
+        )
+        self.assertEqual(sorted(row['id'] for row in response.data['results']),
+                         sorted(expected.values_list('pk', flat=True)))
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_archived_orders(self):
+        Order.objects.filter(status='paid').update(status='completed')
+        archived = set(Order.objects.filter(status='completed', user=self.alice).values_list('pk', flat=True))
+        archive_orders(before=timezone.now())
+        response = self.client.get(self.url, {'archived': 'true', 'user': self.alice.pk, 'page_size': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = response.data['results'] + self.client.get(response.data['next']).data['results']
+        self.assertEqual(len(rows), 5)
+        self.assertEqual({row['id'] for row in rows}, archived)
+        self.assertEqual(rows[0]['username'], 'alice')
+        self.assertIn('archived_at', rows[0])
+        self.assertFalse(Order.objects.filter(pk__in=archived).exists())
+
+    def test_invalid_status_is_rejected(self):
+        response = self.client.get(self.url, {'status': 'lost'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_requires_admin(self):
+        self.client.force_authenticate(user=self.alice)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite syntax')
+class AdminOrderListQueryPlanTests(QueryPlanMixin, TestCase):
+    """
+    Every filter combination of the admin order list reads an index in
+    page order: no full scan and no sort.
+    """
+    def assertIndexOrdered(self, params, cursor=None):
+        queryset = AdminOrderFilter(params, queryset=AdminOrderListView.queryset).qs
+        request = Request(APIRequestFactory().get('/', {'cursor': cursor} if cursor else {}))
+        page = self.capture_queries('orders_order', AdminOrderPagination().paginate_queryset, queryset, request)[0]
+        # A first page may walk an index from its end; a later page must
+        # seek to the cursor.
+        self.assertUsesIndex(page, ordered=True, seek=cursor is not None)
+
+    def test_filter_combinations(self):
+        since = timezone.now().isoformat()
+        for params in [
+            {},
+            {'status': 'paid'},
+            {'status': 'paid', 'created_after': since},
+            {'user': '1'},
+            {'user': '1', 'created_after': since},
+            {'created_after': since, 'created_before': since},
+        ]:
+            with self.subTest(params=params):
+                self.assertIndexOrdered(params)
+
+    def test_cursor_pages_seek_into_the_index(self):
+        user = User.objects.create_user(username='deep')
+        order = Order.objects.create(user=user, total_amount=1)
+        paginator = AdminOrderPagination()
+        paginator.field = 'created_at'
+        cursor = paginator.encode_cursor(order, reverse=False)
+        for params in [{}, {'status': 'paid'}, {'user': str(user.pk)}]:
+            with self.subTest(params=params):
+                self.assertIndexOrdered(params, cursor)
+
+class AdminOrderBulkStatusTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='warehouse', password='adminpass', is_staff=True)
+        self.client.force_authenticate(user=self.admin)
+        self.alice = User.objects.create_user(username='alice')
+        self.bob = User.objects.create_user(username='bob')
+        self.orders = {
+            status: Order.objects.create(user=self.alice, status=status, total_amount=10)
+            for status, label in Order.STATUS_CHOICES
+        }
+        self.url = reverse('admin_api:admin-order-bulk-status')
+
+    def test_outcome_per_id(self):
+        ids = [self.orders[s].pk for s in ('paid', 'shipped', 'completed', 'canceled')] + [999999]
+        response = self.client.post(self.url, {'status': 'shipped', 'ids': ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        outcomes = [(row['outcome'], row['status']) for row in response.data['results']]
+        self.assertEqual(outcomes, [
+            ('updated', 'shipped'),
+            ('unchanged', 'shipped'),
+            ('invalid_transition', 'completed'),
+            ('invalid_transition', 'canceled'),
+            ('not_found', None),
+        ])
+        self.assertEqual(response.data['counts'],
+                         {'updated': 1, 'unchanged': 1, 'invalid_transition': 2, 'not_found': 1})
+        self.assertEqual(Order.objects.get(pk=self.orders['paid'].pk).status, 'shipped')
+        self.assertEqual(Order.objects.get(pk=self.orders['completed'].pk).status, 'completed')
+
+    def test_chunks_cost_a_fixed_number_of_statements(self):
+        orders = Order.objects.bulk_create(
+            Order(user=self.bob, status='paid', total_amount=1) for _ in range(10)
+        )
+        # A locking UPDATE, a SELECT, an UPDATE and a rollup upsert per chunk
+        # of 4, each chunk in a savepoint here.
+        with self.assertNumQueries(3 * 6):
+            results = transition_orders([order.pk for order in orders], 'shipped', chunk_size=4)
+        self.assertEqual({result['outcome'] for result in results}, {'updated'})
+
+    def test_filter_selects_orders_that_can_move(self):
+        bob_pending = Order.objects.bulk_create(
+            Order(user=self.bob, status='pending', total_amount=1) for _ in range(3)
+        )
+        Order.objects.create(user=self.bob, status='completed', total_amount=1)
+        response = self.client.post(
+            self.url, {'status': 'canceled', 'filter': {'user': str(self.bob.pk)}}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted(row['id'] for row in response.data['results']),
+                         sorted(order.pk for order in bob_pending))
+        self.assertEqual(response.data['counts']['updated'], 3)
+        self.assertEqual(Order.objects.get(pk=self.orders['pending'].pk).status, 'pending')
+
+    def test_request_shape_is_validated(self):
+        for body in [
+            {'status': 'paid'},
+            {'status': 'paid', 'ids': [1], 'filter': {'user': '1'}},
+            {'status': 'lost', 'ids': [1]},
+            {'status': 'paid', 'filter': {'status': 'lost'}},
+        ]:
+            with self.subTest(body=body):
+                response = self.client.post(self.url, body, format='json')
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_single_order_update_enforces_transitions(self):
+        url = reverse('admin_api:admin-order-status-update', args=[self.orders['completed'].pk])
+        response = self.client.patch(url, {'status': 'pending'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        url = reverse('admin_api:admin-order-status-update', args=[self.orders['pending'].pk])
+        response = self.client.patch(url, {'status': 'paid'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_single_order_update_rechecks_the_stored_status(self):
+        order = self.orders['pending']
+        url = reverse('admin_api:admin-order-status-update', args=[order.pk])
+        real_get_object = AdminOrderUpdateStatusView.get_object
+
+        def get_object_then_cancel(view):
+            # The order is canceled by someone else after the view read it.
+            instance = real_get_object(view)
+            Order.objects.filter(pk=instance.pk).update(status='canceled')
+            return instance
+
+        with mock.patch.object(AdminOrderUpdateStatusView, 'get_object', get_object_then_cancel):
+            response = self.client.patch(url, {'status': 'paid'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Order.objects.get(pk=order.pk).status, 'canceled')
+
+        order = self.orders['paid']
+        url = reverse('admin_api:admin-order-status-update', args=[order.pk])
+        response = self.client.patch(url, {'status': 'shipped'}, format='json')
+        self.assertEqual(response.data, {'status': 'shipped'})
+        self.assertEqual(
+            DailySales.objects.get(date=timezone.localdate(order.created_at), status='shipped').order_count, 1
+        )
+
+class AdminAnalyticsTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='analyst', password='adminpass', is_staff=True)
+        self.client.force_authenticate(user=self.admin)
+        self.today = timezone.localdate()
+        self.yesterday = self.today - timedelta(days=1)
+        DailySales.objects.bulk_create([
+            DailySales(date=self.yesterday, status='paid', order_count=2, revenue=Decimal('30.00')),
+            DailySales(date=self.yesterday, status='shipped', order_count=1, revenue=Decimal('10.00')),
+            DailySales(date=self.yesterday, status='canceled', order_count=1, revenue=Decimal('99.00')),
+            DailySales(date=self.today, status='pending', order_count=3, revenue=Decimal('10.00')),
+            DailySales(date=self.today - timedelta(days=40), status='paid', order_count=1, revenue=Decimal('5.00')),
+        ])
+        DailyProductSales.objects.bulk_create([
+            DailyProductSales(date=self.yesterday, product_name='Lamp', units=3, revenue=Decimal('30.00')),
+            DailyProductSales(date=self.today, product_name='Lamp', units=1, revenue=Decimal('10.00')),
+            DailyProductSales(date=self.today, product_name='Chair', units=5, revenue=Decimal('50.00')),
+            DailyProductSales(date=self.today, product_name='Gone', units=0, revenue=Decimal('0.00')),
+        ])
+
+    def test_revenue_per_day_excludes_canceled_by_default(self):
+        response = self.client.get(reverse('admin_api:admin-analytics-revenue'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['days'], [
+            {'date': self.yesterday, 'orders': 3, 'revenue': Decimal('40.00'),
+             'average_order_value': Decimal('13.33')},
+            {'date': self.today, 'orders': 3, 'revenue': Decimal('10.00'),
+             'average_order_value': Decimal('3.33')},
+        ])
+        self.assertEqual(response.data['totals'],
+                         {'orders': 6, 'revenue': Decimal('50.00'), 'average_order_value': Decimal('8.33')})
+
+    def test_revenue_filters(self):
+        response = self.client.get(reverse('admin_api:admin-analytics-revenue'), {
+            'start': (self.today - timedelta(days=60)).isoformat(), 'end': self.yesterday.isoformat(),
+            'status': ['paid', 'canceled'],
+        })
+        self.assertEqual([(row['date'], row['orders']) for row in response.data['days']],
+                         [(self.today - timedelta(days=40), 1), (self.yesterday, 3)])
+        for params in [{'start': 'yesterday'}, {'status': 'lost'},
+                       {'start': self.today.isoformat(), 'end': self.yesterday.isoformat()}]:
+            response = self.client.get(reverse('admin_api:admin-analytics-revenue'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def test_top_products(self):
+        response = self.client.get(reverse('admin_api:admin-analytics-products'), {'limit': 5})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['products'], [
+            {'product_name': 'Chair', 'units': 5, 'revenue': Decimal('50.00')},
+            {'product_name': 'Lamp', 'units': 4, 'revenue': Decimal('40.00')},
+        ])
+        response = self.client.get(reverse('admin_api:admin-analytics-products'), {'limit': 1})
+        self.assertEqual([row['product_name'] for row in response.data['products']], ['Chair'])
+
+    def test_requires_staff(self):
+        self.client.force_authenticate(user=User.objects.create_user(username='customer'))
+        response = self.client.get(reverse('admin_api:admin-analytics-revenue'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+class SalesRollupTests(APITestCase):
+    """
+    The rollups kept up by status changes match a backfill from the orders.
+    """
+    def setUp(self):
+        self.admin = User.objects.create_user(username='ops', password='adminpass', is_staff=True)
+        self.client.force_authenticate(user=self.admin)
+        customer = User.objects.create_user(username='shopper')
+        self.orders = []
+        for i, status_ in enumerate(['pending', 'pending', 'paid']):
+            order = Order.objects.create(user=customer, status=status_, total_amount=Decimal('12.50'))
+            items = OrderItem.objects.bulk_create([
+                OrderItem(order=order, product_name='Mug', quantity=i + 1, price=Decimal('2.50')),
+                OrderItem(order=order, product_name='Tea', quantity=1, price=Decimal('5.00')),
+            ])
+            record_order_created(order, items)
+            self.orders.append(order)
+
+    def snapshot(self):
+        return (
+            sorted(DailySales.objects.exclude(order_count=0).values_list('date', 'status', 'order_count', 'revenue')),
+            sorted(DailyProductSales.objects.exclude(units=0).values_list('date', 'product_name', 'units', 'revenue')),
+        )
+
+    def test_status_changes_match_backfill(self):
+        self.client.patch(reverse('admin_api:admin-order-status-update', args=[self.orders[0].pk]),
+                          {'status': 'paid'}, format='json')
+        self.client.post(reverse('admin_api:admin-order-bulk-status'),
+                         {'status': 'canceled', 'ids': [self.orders[1].pk, self.orders[2].pk]}, format='json')
+        sales, products = self.snapshot()
+        today = timezone.localdate()
+        self.assertEqual(sales, [
+            (today, 'canceled', 2, Decimal('25.00')),
+            (today, 'paid', 1, Decimal('12.50')),
+        ])
+        # Only the first order's items still count as sold.
+        self.assertEqual(products, [
+            (today, 'Mug', 1, Decimal('2.50')),
+            (today, 'Tea', 1, Decimal('5.00')),
+        ])
+        backfill(today, today)
+        self.assertEqual(self.snapshot(), (sales, products))
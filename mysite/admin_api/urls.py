@@ -6,6 +6,13 @@ from .views import (
     AdminCategoryRetrieveUpdateDestroyView,
     AdminOrderListView,
     AdminOrderUpdateStatusView,
+    AdminOrderBulkStatusView,
+    AdminRevenueAnalyticsView,
+    AdminProductAnalyticsView,
+    AdminPaymentGatewayStatsView,
+    AdminCatalogCacheStatsView,
+    AdminProductExportView,
+    AdminOrderExportView,
 )
 
 app_name = 'admin_api'
@@ -17,4 +24,11 @@ urlpatterns = [
     path('categories/<int:pk>/', AdminCategoryRetrieveUpdateDestroyView.as_view(), name='admin-category-detail'),
     path('orders/', AdminOrderListView.as_view(), name='admin-order-list'),
     path('orders/<int:pk>/status/', AdminOrderUpdateStatusView.as_view(), name='admin-order-status-update'),
+    path('orders/status/', AdminOrderBulkStatusView.as_view(), name='admin-order-bulk-status'),
+    path('analytics/revenue/', AdminRevenueAnalyticsView.as_view(), name='admin-analytics-revenue'),
+    path('analytics/products/', AdminProductAnalyticsView.as_view(), name='admin-analytics-products'),
+    path('cache/stats/', AdminCatalogCacheStatsView.as_view(), name='admin-catalog-cache-stats'),
+    path('payments/gateway/stats/', AdminPaymentGatewayStatsView.as_view(), name='admin-payment-gateway-stats'),
+    path('exports/products/', AdminProductExportView.as_view(), name='admin-product-export'),
+    path('exports/orders/', AdminOrderExportView.as_view(), name='admin-order-export'),
 ]
@@ -1,13 +1,39 @@
-from rest_framework import generics, permissions
+from datetime import date, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from django.db.models import Sum
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from django.utils import timezone
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework import generics, permissions, views
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+from store.cache import stats as catalog_cache_stats
 from store.models import Product, Category
-from orders.models import Order
+from store.pagination import KeysetPagination
+from cart.models import CENTS
+from orders.archive import archive_requested
+from orders.models import ArchivedOrder, DailyProductSales, DailySales, Order
+from orders.transitions import INVALID_TRANSITION, NOT_FOUND, summarize, transition_orders
+from payments.gateway import get_gateway
+from .exports import EXPORTS, FORMATS, stream_export
+from .filters import AdminArchivedOrderFilter, AdminOrderFilter
 from .serializers import (
     AdminProductSerializer,
     AdminCategorySerializer,
     AdminOrderSerializer,
-    AdminOrderStatusSerializer
+    AdminArchivedOrderSerializer,
+    AdminOrderStatusSerializer,
+    AdminOrderBulkStatusSerializer,
 )
 
+def revenue_row(orders, revenue, **extra):
+    # SQLite drops the scale of summed decimals.
+    revenue = revenue.quantize(CENTS)
+    average = (revenue / orders).quantize(CENTS) if orders else Decimal('0.00')
+    return {**extra, 'orders': orders, 'revenue': revenue, 'average_order_value': average}
+
 class IsAdminUser(permissions.BasePermission):
     """
     Allows access only to admin users.
@@ -35,12 +61,244 @@ class AdminCategoryRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIVi
     serializer_class = AdminCategorySerializer
     permission_classes = [IsAdminUser]
 
+class AdminOrderPagination(KeysetPagination):
+    page_size = 50
+    max_page_size = 200
+
 class AdminOrderListView(generics.ListAPIView):
-    queryset = Order.objects.all()
+    """
+    Orders for the order-ops screen, newest first, filtered by `status`,
+    `user` and `created_after` / `created_before` (see AdminOrderFilter).
+
+    Pages are fetched by cursor over (created_at, id) without a total count,
+    so a page costs one indexed query however many orders there are.
+    `?archived=true` lists archived orders (see orders.archive), whose
+    table has the same indexes.
+    """
+    queryset = Order.objects.select_related('user', 'shipping_address')
     serializer_class = AdminOrderSerializer
     permission_classes = [IsAdminUser]
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = AdminOrderFilter
+    pagination_class = AdminOrderPagination
+
+    def get_queryset(self):
+        if archive_requested(self.request):
+            return ArchivedOrder.objects.select_related('user', 'shipping_address')
+        return super().get_queryset()
+
+    def get_serializer_class(self):
+        if archive_requested(self.request):
+            return AdminArchivedOrderSerializer
+        return super().get_serializer_class()
+
+    def filter_queryset(self, queryset):
+        if archive_requested(self.request):
+            self.filterset_class = AdminArchivedOrderFilter
+        return super().filter_queryset(queryset)
 
 class AdminOrderUpdateStatusView(generics.UpdateAPIView):
     queryset = Order.objects.all()
     serializer_class = AdminOrderStatusSerializer
     permission_classes = [IsAdminUser]
+
+    def perform_update(self, serializer):
+        # The same guarded UPDATE as bulk changes, so an order changed since
+        # it was read is never moved past the state machine or miscounted in
+        # the rollups.
+        target = serializer.validated_data.get('status')
+        if target is None:
+            return
+        result, = transition_orders([serializer.instance.pk], target)
+        if result['outcome'] == NOT_FOUND:
+            raise NotFound()
+        if result['outcome'] == INVALID_TRANSITION:
+            raise ValidationError({'status': [f"An order cannot move from '{result['status']}' to '{target}'."]})
+        serializer.instance.status = result['status']
+
+class AdminOrderBulkStatusView(generics.GenericAPIView):
+    """
+    Move many orders to one status, e.g. mark a warehouse batch as shipped.
+
+    Orders are picked by `ids` or by a `filter` (the admin order list's
+    filter parameters, limited to orders that may make the transition) and
+    moved with chunked set-based updates (see orders.transitions). The
+    response reports the outcome for every order.
+    """
+    serializer_class = AdminOrderBulkStatusSerializer
+    permission_classes = [IsAdminUser]
+
+    def get_order_ids(self, data):
+        if 'ids' in data:
+            return data['ids']
+        limit = self.serializer_class.MAX_ORDERS
+        queryset = Order.objects.filter(status__in=Order.sources_of(data['status']))
+        filterset = AdminOrderFilter(data['filter'], queryset=queryset)
+        if not filterset.is_valid():
+            raise ValidationError({'filter': filterset.errors})
+        ids = list(filterset.qs.order_by('pk').values_list('pk', flat=True)[:limit + 1])
+        if len(ids) > limit:
+            raise ValidationError({'filter': f'Matches more than {limit} orders; narrow it down.'})
+        return ids
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        target = serializer.validated_data['status']
+        results = transition_orders(self.get_order_ids(serializer.validated_data), target)
+        return Response({'status': target, 'counts': summarize(results), 'results': results})
+
+class AdminAnalyticsView(views.APIView):
+    """
+    Base for the analytics endpoints, which read the daily sales rollups
+    (orders.rollups) for `?start=` to `?end=` (ISO dates, inclusive; the
+    last 30 days by default).
+    """
+    permission_classes = [IsAdminUser]
+    default_days = 30
+    max_days = 366
+
+    def get_date_range(self, request):
+        try:
+            end = date.fromisoformat(request.query_params.get('end') or timezone.localdate().isoformat())
+            start = request.query_params.get('start')
+            start = date.fromisoformat(start) if start else end - timedelta(days=self.default_days - 1)
+        except ValueError:
+            raise ValidationError({'detail': 'start and end must be YYYY-MM-DD dates.'})
+        if start > end:
+            raise ValidationError({'start': 'start must not be after end.'})
+        if (end - start).days >= self.max_days:
+            raise ValidationError({'start': f'At most {self.max_days} days per request.'})
+        return start, end
+
+class AdminRevenueAnalyticsView(AdminAnalyticsView):
+    """
+    Orders, revenue and average order value per day and in total. Canceled
+    orders are left out unless `?status=` asks for them; repeat `status` to
+    combine statuses.
+    """
+
+    def get_statuses(self, request):
+        choices = dict(Order.STATUS_CHOICES)
+        statuses = request.query_params.getlist('status') or [s for s in choices if s != 'canceled']
+        unknown = [s for s in statuses if s not in choices]
+        if unknown:
+            raise ValidationError({'status': f'Unknown status: {", ".join(unknown)}.'})
+        return statuses
+
+    def get(self, request, *args, **kwargs):
+        start, end = self.get_date_range(request)
+        statuses = self.get_statuses(request)
+        days = (
+            DailySales.objects.filter(date__range=(start, end), status__in=statuses)
+            .values('date')
+            .annotate(orders=Sum('order_count'), revenue=Sum('revenue'))
+            .order_by('date')
+        )
+        rows, orders, revenue = [], 0, Decimal('0.00')
+        for day in days:
+            orders += day['orders']
+            revenue += day['revenue']
+            rows.append(revenue_row(day['orders'], day['revenue'], date=day['date']))
+        return Response({
+            'start': start, 'end': end, 'statuses': statuses,
+            'totals': revenue_row(orders, revenue),
+            'days': rows,
+        })
+
+class AdminProductAnalyticsView(AdminAnalyticsView):
+    """
+    Best-selling products by units over the date range (`?limit=`, default
+    50), canceled orders excluded.
+    """
+    default_limit = 50
+    max_limit = 500
+
+    def get(self, request, *args, **kwargs):
+        start, end = self.get_date_range(request)
+        try:
+            limit = min(int(request.query_params.get('limit', self.default_limit)), self.max_limit)
+        except ValueError:
+            raise ValidationError({'limit': 'Expected an integer.'})
+        products = (
+            DailyProductSales.objects.filter(date__range=(start, end))
+            .values('product_name')
+            .annotate(units=Sum('units'), revenue=Sum('revenue'))
+            .filter(units__gt=0)
+            .order_by('-units', 'product_name')[:max(limit, 0)]
+        )
+        return Response({
+            'start': start, 'end': end,
+            'products': [
+                {'product_name': row['product_name'], 'units': row['units'],
+                 'revenue': row['revenue'].quantize(CENTS)}
+                for row in products
+            ],
+        })
+
+class AdminCatalogCacheStatsView(views.APIView):
+    """
+    Report hit and miss counts for the public catalog cache in this process.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(catalog_cache_stats.snapshot())
+
+class AdminPaymentGatewayStatsView(views.APIView):
+    """
+    Report call counts, latency and circuit state of the Stripe gateway in
+    this process.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        gateway = get_gateway()
+        return Response({**gateway.stats.snapshot(), 'circuit': gateway.breaker.state})
+
+class AdminExportView(views.APIView):
+    """
+    Stream a full or incremental export as NDJSON (default) or CSV.
+
+    - `?output=csv` selects CSV; DRF reserves `format` for content negotiation.
+    - `?since=<ISO datetime>` limits the export to rows changed since then;
+      pass back the `X-Export-Watermark` header of the previous export.
+    - The body is gzipped on the fly when the client accepts gzip.
+    """
+    permission_classes = [IsAdminUser]
+    export_name = None
+
+    def get_since(self, request):
+        value = request.query_params.get('since')
+        if not value:
+            return None
+        since = parse_datetime(value)
+        if since is None:
+            raise ValidationError({'since': 'Expected an ISO 8601 datetime.'})
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since, dt_timezone.utc)
+        return since
+
+    def get(self, request, *args, **kwargs):
+        output_format = request.query_params.get('output', 'ndjson')
+        if output_format not in FORMATS:
+            raise ValidationError({'output': f'Choose one of: {", ".join(FORMATS)}.'})
+        since = self.get_since(request)
+        compress = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+
+        watermark, stream = stream_export(
+            EXPORTS[self.export_name], output_format, since=since, compress=compress
+        )
+        response = StreamingHttpResponse(stream, content_type=FORMATS[output_format])
+        response['Content-Disposition'] = f'attachment; filename="{self.export_name}.{output_format}"'
+        response['X-Export-Watermark'] = watermark.isoformat()
+        if compress:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ['Accept-Encoding'])
+        return response
+
+class AdminProductExportView(AdminExportView):
+    export_name = 'products'
+
+class AdminOrderExportView(AdminExportView):
+    export_name = 'orders'
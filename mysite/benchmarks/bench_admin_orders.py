@@ -0,0 +1,87 @@
+"""
+Latency of the admin order list pages against the size of the orders table.
+
+    python -m benchmarks.bench_admin_orders --rows 10000 100000
+"""
+import argparse
+from datetime import timedelta
+
+from benchmarks.common import measure, print_table, setup_django
+
+
+def seed_orders(rows, users, batch_size=5000):
+    from django.utils import timezone
+    from orders.models import Order
+
+    statuses = ['pending', 'paid', 'shipped', 'completed', 'canceled']
+    start = timezone.now() - timedelta(days=365)
+    existing = Order.objects.count()
+    batch = []
+    for i in range(existing, rows):
+        batch.append(Order(
+            user=users[i % len(users)],
+            status=statuses[i % len(statuses)],
+            total_amount=10 + i % 500,
+            created_at=start + timedelta(seconds=i * 30),
+        ))
+        if len(batch) >= batch_size:
+            Order.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Order.objects.bulk_create(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.contrib.auth import get_user_model
+    from rest_framework.test import APIClient
+    from admin_api.views import AdminOrderPagination
+    from orders.models import Order
+
+    User = get_user_model()
+    admin = User.objects.create_user(username='bench-admin', is_staff=True)
+    users = User.objects.bulk_create(User(username=f'customer{i}') for i in range(100))
+    client = APIClient()
+    client.force_authenticate(user=admin)
+    url = '/api/admin/orders/'
+
+    def fetch(params):
+        def run():
+            response = client.get(url, params)
+            assert response.status_code == 200, response.status_code
+        return run
+
+    rows = []
+    for total in sorted(args.rows):
+        seed_orders(total, users)
+        # The cursor a client holds after paging halfway through the table.
+        boundary = Order.objects.order_by('-created_at', '-id')[total // 2]
+        paginator = AdminOrderPagination()
+        paginator.field = 'created_at'
+        deep = paginator.encode_cursor(boundary, reverse=False)
+        for label, params in [
+            ('first page', {}),
+            ('page at 50%', {'cursor': deep}),
+            ('status=paid', {'status': 'paid'}),
+            ('one user', {'user': users[0].pk}),
+            ('status + last 30 days', {'status': 'shipped',
+                                       'created_after': (boundary.created_at - timedelta(days=30)).isoformat()}),
+        ]:
+            stats = measure(fetch(params), args.repeat)
+            rows.append((total, label, f"{stats['median']:.2f}", f"{stats['p95']:.2f}"))
+
+    print_table(
+        f'Admin order list, {AdminOrderPagination.page_size} orders per page',
+        ['orders', 'request', 'median ms', 'p95 ms'],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main()
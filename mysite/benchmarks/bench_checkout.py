@@ -0,0 +1,73 @@
+"""
+Checkout latency and query count against cart size.
+
+    python -m benchmarks.bench_checkout --sizes 1 10 50 200
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks.common import print_table, seed_catalog, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 50, 200])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from cart.models import Cart, CartItem
+    from cart.reservations import hold_stock
+    from orders.checkout import place_order
+    from store.models import Product
+    from users.models import Address
+
+    seed_catalog(max(args.sizes))
+    product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+    Product.objects.update(stock_quantity=10 ** 6)
+    user = get_user_model().objects.create_user(username='bench-buyer')
+    address = Address.objects.create(
+        profile=user.profile, address_line_1='1 Main St', city='Springfield',
+        state='IL', postal_code='62701', country='US'
+    )
+
+    def fill_cart(size):
+        cart, created = Cart.objects.get_or_create(user=user)
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product_id=product_id, quantity=2) for product_id in product_ids[:size]
+        ])
+        # Half of the lines hold their stock, as after a mix of fresh and
+        # expired holds.
+        hold_stock(cart, {product_id: 2 for product_id in product_ids[:size:2]})
+
+    rows = []
+    for size in args.sizes:
+        samples, queries = [], 0
+        for _ in range(args.repeat):
+            fill_cart(size)
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                place_order(user, address)
+                samples.append((time.perf_counter() - started) * 1000)
+            queries = len(captured)
+        samples.sort()
+        rows.append((
+            size, queries,
+            f'{statistics.median(samples):.2f}',
+            f'{samples[min(len(samples) - 1, int(len(samples) * 0.95))]:.2f}',
+        ))
+
+    print_table(
+        f'Checkout, {args.repeat} orders per cart size',
+        ['cart lines', 'queries', 'median ms', 'p95 ms'],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+Flash-sale load test: concurrent buyers checking out with the synchronous
+pipeline against the async queue (CHECKOUT_MODE = "async") drained by a
+worker pool.
+
+    python -m benchmarks.bench_checkout_queue --buyers 300 --clients 16 --workers 2
+    python -m benchmarks.bench_checkout_queue --db-file /tmp/bench.sqlite3
+
+A request that fails on SQLite's lock is retried by its client unless the
+order (or job) turns out to exist, as a client checking its order history
+would; the retries are counted and included in latency.
+For the async mode, "placed" latency runs from the request to the job's
+finished_at.
+"""
+import argparse
+import queue
+import threading
+import time
+
+from benchmarks.common import print_table, setup_django
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--buyers', type=int, default=300)
+    parser.add_argument('--clients', type=int, default=16, help='Concurrent client threads.')
+    parser.add_argument('--workers', type=int, default=2, help='Checkout worker threads in async mode.')
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--lines', type=int, default=3, help='Cart lines per buyer.')
+    parser.add_argument('--db-file', help='Run against an SQLite file (commits hit the disk) instead of memory.')
+    args = parser.parse_args()
+
+    setup_django(args.db_file)
+
+    from django.contrib.auth import get_user_model
+    from django.db import OperationalError, connection
+    from django.test.utils import override_settings
+    from rest_framework.test import APIClient
+    from cart.models import Cart, CartItem
+    from orders.checkout_queue import run_worker
+    from orders.models import CheckoutJob, Order
+    from store.models import Category, Product
+    from users.models import Address
+
+    User = get_user_model()
+    category = Category.objects.create(name='Drop')
+    products = Product.objects.bulk_create(
+        Product(name=f'Drop {i}', slug=f'drop-{i}', category=category, price=25, stock_quantity=10 ** 6)
+        for i in range(args.lines)
+    )
+
+    def make_buyers(prefix):
+        buyers = []
+        for i in range(args.buyers):
+            user = User.objects.create_user(username=f'{prefix}{i}')
+            cart = Cart.objects.get(user=user)
+            CartItem.objects.bulk_create(CartItem(cart=cart, product=p, quantity=1) for p in products)
+            address = Address.objects.create(
+                profile=user.profile, address_line_1='1 Main St', city='Springfield',
+                state='IL', postal_code='62701', country='US'
+            )
+            buyers.append((user, address))
+        return buyers
+
+    def exists(queryset):
+        while True:
+            try:
+                return queryset.exists()
+            except OperationalError:
+                time.sleep(0.001)
+
+    def load(buyers, expected_status, model):
+        pending = queue.Queue()
+        for buyer in buyers:
+            pending.put(buyer)
+        latencies, sent_at, retries, lock = [], {}, [0], threading.Lock()
+
+        def client_thread():
+            client = APIClient()
+            try:
+                while True:
+                    try:
+                        user, address = pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    client.force_authenticate(user=user)
+                    started = time.perf_counter()
+                    while True:
+                        try:
+                            response = client.post('/api/orders/orders/', {'address_id': address.id}, format='json')
+                        except OperationalError:
+                            with lock:
+                                retries[0] += 1
+                            if exists(model.objects.filter(user=user)):
+                                break
+                            time.sleep(0.001)
+                            continue
+                        assert response.status_code == expected_status, response.status_code
+                        break
+                    with lock:
+                        latencies.append((time.perf_counter() - started) * 1000)
+                        sent_at[user.pk] = started
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=client_thread) for _ in range(args.clients)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, sent_at, retries[0], time.perf_counter() - started
+
+    rows = []
+    with override_settings(CHECKOUT_MODE='sync'):
+        latencies, _, retries, elapsed = load(make_buyers('sync'), 201, Order)
+    assert Order.objects.count() == args.buyers
+    rows.append(('sync', 'response', f'{args.buyers / elapsed:,.0f}',
+                 f'{percentile(latencies, 0.5):.1f}', f'{percentile(latencies, 0.99):.1f}', retries))
+
+    with override_settings(CHECKOUT_MODE='async'):
+        buyers = make_buyers('async')
+        stop = threading.Event()
+
+        def worker_thread():
+            try:
+                run_worker(args.batch_size, 0.01, stop=stop)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker_thread) for _ in range(args.workers)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        latencies, sent_at, retries, _ = load(buyers, 202, CheckoutJob)
+        while exists(CheckoutJob.objects.filter(status=CheckoutJob.QUEUED)):
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        for worker in workers:
+            worker.join()
+        # finished_at is wall-clock time; line it up with perf_counter.
+        offset = time.time() - time.perf_counter()
+        placed = [
+            (finished_at.timestamp() - offset - sent_at[user_id]) * 1000
+            for user_id, finished_at in CheckoutJob.objects.values_list('user_id', 'finished_at')
+        ]
+    assert Order.objects.count() == 2 * args.buyers
+    rows.append(('async', 'response', f'{args.buyers / elapsed:,.0f}',
+                 f'{percentile(latencies, 0.5):.1f}', f'{percentile(latencies, 0.99):.1f}', retries))
+    rows.append(('async', 'placed', '',
+                 f'{percentile(placed, 0.5):.1f}', f'{percentile(placed, 0.99):.1f}', ''))
+
+    print_table(
+        f'Checkout under load: {args.buyers} buyers, {args.clients} clients, '
+        f'{args.workers} workers, batches of {args.batch_size}',
+        ['mode', 'latency of', 'orders/s', 'p50 ms', 'p99 ms', 'lock retries'],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+Throughput and peak Python memory of the streaming product export.
+
+    python -m benchmarks.bench_export --rows 100000
+"""
+import argparse
+import time
+import tracemalloc
+
+from benchmarks.common import print_table, seed_catalog, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from admin_api.exports import EXPORTS, stream_export
+
+    seed_catalog(args.rows)
+    rows = []
+    for output_format in ('ndjson', 'csv'):
+        for compress in (False, True):
+            tracemalloc.start()
+            started = time.perf_counter()
+            _, stream = stream_export(EXPORTS['products'], output_format, compress=compress)
+            size = sum(len(block) for block in stream)
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            rows.append((
+                output_format + (' + gzip' if compress else ''),
+                f'{size / 1e6:.1f}',
+                f'{elapsed:.2f}',
+                f'{args.rows / elapsed:,.0f}',
+                f'{peak / 1e6:.1f}',
+            ))
+
+    print_table(
+        f'Product export over {args.rows} products',
+        ['format', 'MB out', 'seconds', 'rows/s', 'peak MB'],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main()
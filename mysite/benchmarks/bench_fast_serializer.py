@@ -0,0 +1,61 @@
+"""
+Latency of a product page rendered through the standard ModelSerializer and
+through store.fastpath.
+
+    python -m benchmarks.bench_fast_serializer --rows 5000 --page-size 100
+"""
+import argparse
+
+from benchmarks.common import measure, print_table, seed_catalog, setup_django
+
+VARIANTS = [
+    ('full', {}),
+    ('fields=name,price,slug', {'fields': 'name,price,slug'}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.test import override_settings
+    from rest_framework.test import APIClient
+    from store.cache import get_catalog_cache
+
+    seed_catalog(args.rows)
+    client = APIClient()
+    cache = get_catalog_cache()
+    url = '/api/store/products/'
+
+    rows = []
+    for label, extra in VARIANTS:
+        params = dict(extra, page_size=args.page_size, pagination='cursor')
+        timings = {}
+        for fast in (False, True):
+            def run():
+                cache.clear()
+                with override_settings(FAST_LIST_SERIALIZATION=fast):
+                    return client.get(url, params)
+
+            timings[fast] = measure(run, args.repeat)
+        rows.append((
+            label,
+            f"{timings[False]['median']:.2f}",
+            f"{timings[True]['median']:.2f}",
+            f"{timings[False]['median'] / timings[True]['median']:.1f}x",
+        ))
+
+    print_table(
+        f'ProductListView, {args.page_size}-item page over {args.rows} products',
+        ['variant', 'standard ms', 'fast ms', 'speedup'],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main()
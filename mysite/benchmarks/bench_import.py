@@ -0,0 +1,83 @@
+"""
+Throughput of the import_products command against one-at-a-time saves.
+
+    python -m benchmarks.bench_import --rows 100000
+"""
+import argparse
+import csv
+import os
+import tempfile
+import time
+
+from benchmarks.common import print_table, setup_django
+
+
+def write_feed(path, rows, categories, named_only):
+    with open(path, 'w', newline='') as feed:
+        writer = csv.writer(feed)
+        writer.writerow(['name', 'slug', 'description', 'price', 'category', 'color', 'stock_quantity'])
+        for i in range(rows):
+            # Every tenth name repeats, exercising slug collision handling.
+            name = f'Feed product {i % (rows - rows // 10) if named_only else i}'
+            slug = '' if named_only else f'feed-{i}'
+            writer.writerow([name, slug, f'Supplier text {i}', 5 + i % 300, f'Category {i % categories}', 'Red', 10])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--categories', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--baseline-rows', type=int, default=2000,
+                        help='Rows saved one at a time for the baseline.')
+    args = parser.parse_args()
+
+    setup_django()
+
+    from io import StringIO
+    from django.core.management import call_command
+    from store.models import Category, Product
+
+    Category.objects.bulk_create(
+        Category(name=f'Category {i}', slug=f'category-{i}') for i in range(args.categories)
+    )
+    categories = {c.name: c for c in Category.objects.all()}
+
+    rows = []
+    started = time.perf_counter()
+    for i in range(args.baseline_rows):
+        Product.objects.create(
+            name=f'Baseline {i}', description='Supplier text', price=5,
+            category=categories[f'Category {i % args.categories}'], color='Red',
+        )
+    elapsed = time.perf_counter() - started
+    rows.append(('Product.save() per row', args.baseline_rows, f'{elapsed:.1f}',
+                 f'{args.baseline_rows / elapsed:,.0f}'))
+
+    handle, path = tempfile.mkstemp(suffix='.csv')
+    os.close(handle)
+    try:
+        for label, named_only, extra in [
+            ('import, generated slugs', True, []),
+            ('import, upsert by slug (insert)', False, []),
+            ('import, upsert by slug (update)', False, []),
+            ('import, generated slugs, --no-index', True, ['--no-index']),
+        ]:
+            write_feed(path, args.rows, args.categories, named_only)
+            started = time.perf_counter()
+            call_command('import_products', path, '--batch-size', str(args.batch_size),
+                         '--progress-every', str(args.rows * 2), *extra, stdout=StringIO())
+            elapsed = time.perf_counter() - started
+            rows.append((label, args.rows, f'{elapsed:.1f}', f'{args.rows / elapsed:,.0f}'))
+    finally:
+        os.remove(path)
+
+    print_table(
+        f'Product import, batch size {args.batch_size}',
+        ['method', 'rows', 'seconds', 'rows/s'],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main()
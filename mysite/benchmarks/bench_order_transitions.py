@@ -0,0 +1,67 @@
+"""
+Bulk order status transitions against one-order-per-request updates.
+
+    python -m benchmarks.bench_order_transitions --orders 10000
+"""
+import argparse
+import time
+
+from benchmarks.common import print_table, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--orders', type=int, default=10_000)
+    parser.add_argument('--baseline-orders', type=int, default=500,
+                        help='Orders updated one request at a time for the baseline.')
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.contrib.auth import get_user_model
+    from rest_framework.test import APIClient
+    from orders.models import Order
+
+    User = get_user_model()
+    admin = User.objects.create_user(username='bench-admin', is_staff=True)
+    customer = User.objects.create_user(username='bench-customer')
+    client = APIClient()
+    client.force_authenticate(user=admin)
+
+    def paid_orders(count):
+        orders = Order.objects.bulk_create(
+            Order(user=customer, status='paid', total_amount=10) for _ in range(count)
+        )
+        return [order.pk for order in orders]
+
+    rows = []
+    ids = paid_orders(args.baseline_orders)
+    started = time.perf_counter()
+    for pk in ids:
+        response = client.patch(f'/api/admin/orders/{pk}/status/', {'status': 'shipped'}, format='json')
+        assert response.status_code == 200, response.status_code
+    elapsed = time.perf_counter() - started
+    rows.append(('PATCH per order', args.baseline_orders, f'{elapsed:.2f}',
+                 f'{args.baseline_orders / elapsed:,.0f}'))
+
+    ids = paid_orders(args.orders)
+    started = time.perf_counter()
+    response = client.post('/api/admin/orders/status/', {'status': 'shipped', 'ids': ids}, format='json')
+    elapsed = time.perf_counter() - started
+    assert response.data['counts']['updated'] == args.orders, response.data['counts']
+    rows.append(('bulk, by ids', args.orders, f'{elapsed:.2f}', f'{args.orders / elapsed:,.0f}'))
+
+    paid_orders(args.orders)
+    started = time.perf_counter()
+    response = client.post(
+        '/api/admin/orders/status/', {'status': 'shipped', 'filter': {'user': str(customer.pk)}}, format='json'
+    )
+    elapsed = time.perf_counter() - started
+    assert response.data['counts']['updated'] == args.orders, response.data['counts']
+    rows.append(('bulk, by filter', args.orders, f'{elapsed:.2f}', f'{args.orders / elapsed:,.0f}'))
+
+    print_table('Order status transitions', ['method', 'orders', 'seconds', 'orders/s'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Compare page-number and keyset pagination latency on ProductListView.
+
+    python -m benchmarks.bench_pagination --rows 100000 --page-size 10
+"""
+import argparse
+
+from benchmarks.common import measure, print_table, seed_catalog, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--page-size', type=int, default=10)
+    parser.add_argument('--pages', type=int, nargs='+', default=[1, 100, 10_000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from rest_framework.test import APIClient
+    from store.cache import get_catalog_cache
+    from store.models import Product
+    from store.pagination import ProductKeysetPagination
+
+    seed_catalog(args.rows)
+    client = APIClient()
+    cache = get_catalog_cache()
+    url = '/api/store/products/'
+
+    def fetch(params):
+        def run():
+            # Bypass the response cache so every call does the real work.
+            cache.clear()
+            response = client.get(url, params)
+            assert response.status_code == 200, response.status_code
+        return run
+
+    rows = []
+    for page in args.pages:
+        offset = (page - 1) * args.page_size
+        if offset >= args.rows:
+            continue
+
+        numbered = measure(fetch({'page': page, 'page_size': args.page_size}), args.repeat)
+
+        params = {'pagination': 'cursor', 'page_size': args.page_size}
+        if offset:
+            # Build the cursor a client would hold after walking to this page.
+            boundary = Product.objects.filter(is_active=True).order_by(
+                '-created_at', '-id'
+            )[offset - 1]
+            paginator = ProductKeysetPagination()
+            paginator.field = 'created_at'
+            params['cursor'] = paginator.encode_cursor(boundary, reverse=False)
+        keyset = measure(fetch(params), args.repeat)
+
+        rows.append((
+            page,
+            f"{numbered['median']:.2f}", f"{numbered['p95']:.2f}",
+            f"{keyset['median']:.2f}", f"{keyset['p95']:.2f}",
+        ))
+
+    print_table(
+        f'ProductListView, {args.rows} products, page_size={args.page_size} (ms)',
+        ['page', 'number median', 'number p95', 'cursor median', 'cursor p95'],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main()
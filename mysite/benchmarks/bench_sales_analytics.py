@@ -0,0 +1,61 @@
+"""
+Revenue per day read from the sales rollups against aggregating the orders
+table, over the last 30 days.
+
+    python -m benchmarks.bench_sales_analytics --rows 10000 100000
+"""
+import argparse
+from datetime import timedelta
+
+from benchmarks.bench_admin_orders import seed_orders
+from benchmarks.common import measure, print_table, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.contrib.auth import get_user_model
+    from django.db.models import Count, Sum
+    from django.db.models.functions import TruncDate
+    from django.utils import timezone
+    from rest_framework.test import APIClient
+    from orders.models import Order
+    from orders.rollups import backfill
+
+    User = get_user_model()
+    admin = User.objects.create_user(username='bench-admin', is_staff=True)
+    users = User.objects.bulk_create(User(username=f'customer{i}') for i in range(100))
+    client = APIClient()
+    client.force_authenticate(user=admin)
+
+    def rollups():
+        response = client.get('/api/admin/analytics/revenue/')
+        assert response.status_code == 200, response.status_code
+
+    def full_scan():
+        since = timezone.now() - timedelta(days=30)
+        list(
+            Order.objects.filter(created_at__gte=since).exclude(status='canceled')
+            .annotate(date=TruncDate('created_at')).values('date')
+            .annotate(orders=Count('id'), revenue=Sum('total_amount')).order_by('date')
+        )
+
+    rows = []
+    for total in sorted(args.rows):
+        seed_orders(total, users)
+        first = timezone.localdate(Order.objects.order_by('created_at').first().created_at)
+        backfill(first, timezone.localdate())
+        for label, run in [('orders table', full_scan), ('rollups endpoint', rollups)]:
+            stats = measure(run, args.repeat)
+            rows.append((total, label, f"{stats['median']:.2f}", f"{stats['p95']:.2f}"))
+
+    print_table('Revenue per day, last 30 days', ['orders', 'source', 'median ms', 'p95 ms'], rows)
+
+
+if __name__ == '__main__':
+    main()
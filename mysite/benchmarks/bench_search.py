@@ -0,0 +1,60 @@
+"""
+Compare ranked search (`?q=`) against an icontains scan on ProductListView.
+
+    python -m benchmarks.bench_search --rows 500000
+"""
+import argparse
+
+from benchmarks.common import measure, print_table, seed_catalog, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=500_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--queries', nargs='+', default=['product 4242', 'green', 'category 7 red'])
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.db.models import Q
+    from store import search
+    from store.models import Product
+
+    seed_catalog(args.rows)
+    # bulk_create bypasses the signals, so build the index in one pass.
+    from django.core.management import call_command
+    call_command('rebuild_search_index', batch_size=5000)
+
+    backend = search.get_backend()
+    active = Product.objects.filter(is_active=True)
+    rows = []
+    for query in args.queries:
+        def ranked():
+            list(search.search_products(active, query).values_list('id', flat=True)[:10])
+
+        def scan():
+            condition = Q()
+            for token in search.tokenize(query):
+                condition &= (
+                    Q(name__icontains=token) | Q(description__icontains=token)
+                    | Q(color__icontains=token) | Q(category__name__icontains=token)
+                )
+            # Ranking needs every match, so the scan must read the whole table.
+            active.filter(condition).count()
+
+        indexed = measure(ranked, args.repeat)
+        scanned = measure(scan, max(3, args.repeat // 5), warmup=1)
+        rows.append((
+            query, f"{indexed['median']:.2f}", f"{indexed['p95']:.2f}", f"{scanned['median']:.2f}",
+        ))
+
+    print_table(
+        f'Search over {args.rows} products, {backend.name} backend (ms)',
+        ['query', 'ranked median', 'ranked p95', 'icontains scan median'],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Payload size and latency of a 100-item product page with and without
+sparse fieldsets.
+
+    python -m benchmarks.bench_sparse_fields --rows 5000
+"""
+import argparse
+
+from benchmarks.common import measure, print_table, seed_catalog, setup_django
+
+VARIANTS = [
+    ('full', {}),
+    ('omit=description', {'omit': 'description'}),
+    ('fields=name,price,slug', {'fields': 'name,price,slug'}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from rest_framework.test import APIClient
+    from store.cache import get_catalog_cache
+
+    seed_catalog(args.rows)
+    client = APIClient()
+    cache = get_catalog_cache()
+    url = '/api/store/products/'
+
+    rows = []
+    for label, extra in VARIANTS:
+        params = dict(extra, page_size=args.page_size, pagination='cursor')
+
+        def run():
+            cache.clear()
+            return client.get(url, params)
+
+        size = len(run().content)
+        timing = measure(run, args.repeat)
+        rows.append((label, size, f"{timing['median']:.2f}", f"{timing['p95']:.2f}"))
+
+    print_table(
+        f'ProductListView, {args.page_size}-item page over {args.rows} products',
+        ['variant', 'bytes', 'median ms', 'p95 ms'],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Throughput of stock holds when many shoppers race for one hot SKU.
+
+    python -m benchmarks.bench_stock_reservations --shoppers 200 --threads 8 --stock 50
+    python -m benchmarks.bench_stock_reservations --db-file /tmp/bench.sqlite3
+
+A hold that fails on SQLite's lock is retried, and the retries are counted.
+"""
+import argparse
+import threading
+import time
+
+from benchmarks.common import print_table, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--shoppers', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--stock', type=int, default=50)
+    parser.add_argument('--db-file', help='Run against an SQLite file (commits hit the disk) instead of memory.')
+    args = parser.parse_args()
+
+    setup_django(args.db_file)
+
+    from django.contrib.auth import get_user_model
+    from django.db import OperationalError, connection
+    from cart.models import Cart
+    from cart.reservations import InsufficientStock, hold_stock
+    from store.models import Category, Product
+
+    category = Category.objects.create(name='Flash Sale')
+    sku = Product.objects.create(name='Flash SKU', category=category, price=1, stock_quantity=args.stock)
+    User = get_user_model()
+    carts = [
+        Cart.objects.get(user=User.objects.create_user(username=f'shopper{i}'))
+        for i in range(args.shoppers)
+    ]
+    held, retries, lock = [0], [0], threading.Lock()
+
+    def shopper(chunk):
+        try:
+            for cart in chunk:
+                while True:
+                    try:
+                        hold_stock(cart, {sku.pk: 1})
+                    except InsufficientStock:
+                        break
+                    except OperationalError:
+                        with lock:
+                            retries[0] += 1
+                        time.sleep(0.001)
+                        continue
+                    with lock:
+                        held[0] += 1
+                    break
+        finally:
+            connection.close()
+
+    workers = [threading.Thread(target=shopper, args=(carts[i::args.threads],)) for i in range(args.threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    sku.refresh_from_db()
+    assert held[0] == sku.reserved_quantity == min(args.stock, args.shoppers)
+    print_table(
+        f'Stock holds on one SKU: {args.shoppers} shoppers, {args.threads} threads, stock {args.stock}',
+        ['attempts/s', 'held', 'lock retries'],
+        [(f'{args.shoppers / elapsed:,.0f}', held[0], retries[0])],
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Payment-intent creation against a local fake Stripe: the stripe library's
+defaults (a new connection per call, no timeouts of ours) against the
+gateway, while Stripe is healthy and while it hangs.
+
+    python -m benchmarks.bench_stripe_gateway --calls 200 --stall 3
+
+"Hanging" means every response takes `--stall` seconds; the column shows
+how long each caller is held before it gets an answer or an error.
+"""
+import argparse
+
+from benchmarks.common import measure, print_table, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--stall', type=float, default=3, help='Seconds a hanging Stripe takes to answer.')
+    args = parser.parse_args()
+
+    setup_django()
+
+    import stripe
+    from payments.gateway import GatewayUnavailable, StripeGateway
+    from payments.tests import FakeStripe
+
+    fake = FakeStripe()
+    params = {'amount': 1999, 'currency': 'usd'}
+    plain = stripe.StripeClient(
+        'sk_test_fake', base_addresses={'api': fake.url}, http_client=stripe.RequestsClient(),
+    )
+    gateway = StripeGateway(
+        api_key='sk_test_fake', api_base=fake.url, connect_timeout=1, read_timeout=0.5,
+        max_retries=1, backoff=0.05, max_backoff=0.2, pool_size=4,
+        failure_threshold=5, reset_timeout=30,
+    )
+
+    def plain_call():
+        try:
+            plain.payment_intents.create(params=params)
+        except stripe.error.StripeError:
+            pass
+
+    def gateway_call():
+        try:
+            gateway.create_payment_intent(**params)
+        except (stripe.error.StripeError, GatewayUnavailable):
+            pass
+
+    rows = []
+    for name, call in (('stripe defaults', plain_call), ('gateway', gateway_call)):
+        healthy = measure(call, repeat=args.calls)
+        fake.script.extend([(200, None, args.stall)] * 10)
+        hanging = measure(call, repeat=10, warmup=0)
+        fake.script.clear()
+        rows.append((name, f"{healthy['median']:.2f}", f"{healthy['p95']:.2f}",
+                     f"{hanging['median']:.0f}", f"{hanging['max']:.0f}"))
+    fake.stop()
+
+    print_table(
+        f'Creating payment intents: {args.calls} calls healthy, 10 calls while Stripe hangs {args.stall:g}s',
+        ['client', 'healthy p50 ms', 'healthy p95 ms', 'hanging p50 ms', 'hanging max ms'],
+        rows,
+    )
+    print('Gateway stats:', gateway.stats.snapshot(), 'circuit:', gateway.breaker.state)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Stripe's redelivery burst after an outage: every payment_intent.succeeded
+event delivered (at least) twice by concurrent senders, then the stored
+events worked through by process_stripe_events, in batches against one
+event at a time.
+
+    python -m benchmarks.bench_stripe_webhooks --orders 2000 --senders 16
+    python -m benchmarks.bench_stripe_webhooks --db-file /tmp/bench.sqlite3
+
+A delivery that fails on SQLite's lock is sent again, as Stripe would; the
+resends are counted and included in latency.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import queue
+import threading
+import time
+
+from benchmarks.common import print_table, setup_django
+
+SECRET = 'whsec_bench'
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--orders', type=int, default=2000)
+    parser.add_argument('--deliveries', type=int, default=2, help='Times each event is delivered.')
+    parser.add_argument('--senders', type=int, default=16, help='Concurrent delivering threads.')
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--db-file', help='Run against an SQLite file (commits hit the disk) instead of memory.')
+    args = parser.parse_args()
+
+    setup_django(args.db_file)
+
+    from django.contrib.auth import get_user_model
+    from django.db import OperationalError, connection
+    from django.test.utils import override_settings
+    from rest_framework.test import APIClient
+    from orders.models import Order
+    from payments.models import StripeEvent
+    from payments.webhooks import run_worker
+
+    user = get_user_model().objects.create_user(username='bench-payer')
+
+    def make_events(prefix):
+        orders = Order.objects.bulk_create(
+            Order(user=user, total_amount='19.99') for _ in range(args.orders)
+        )
+        return [
+            json.dumps({
+                'id': f'evt_{prefix}{order.pk}', 'object': 'event', 'type': 'payment_intent.succeeded',
+                'data': {'object': {
+                    'object': 'payment_intent', 'amount_received': 1999, 'currency': 'usd',
+                    'metadata': {'order_id': str(order.pk)},
+                }},
+            })
+            for order in orders
+        ]
+
+    def deliver(payloads):
+        pending = queue.Queue()
+        for _ in range(args.deliveries):
+            for payload in payloads:
+                pending.put(payload)
+        latencies, resends, lock = [], [0], threading.Lock()
+
+        def sender():
+            client = APIClient()
+            try:
+                while True:
+                    try:
+                        payload = pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    timestamp = int(time.time())
+                    digest = hmac.new(SECRET.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256)
+                    signature = f't={timestamp},v1={digest.hexdigest()}'
+                    started = time.perf_counter()
+                    while True:
+                        try:
+                            response = client.generic(
+                                'POST', '/api/payments/stripe/webhook/', payload,
+                                content_type='application/json', HTTP_STRIPE_SIGNATURE=signature,
+                            )
+                        except OperationalError:
+                            with lock:
+                                resends[0] += 1
+                            time.sleep(0.001)
+                            continue
+                        assert response.status_code == 200, response.status_code
+                        break
+                    with lock:
+                        latencies.append((time.perf_counter() - started) * 1000)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=sender) for _ in range(args.senders)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, resends[0], time.perf_counter() - started
+
+    rows = []
+    with override_settings(STRIPE_WEBHOOK_SECRET=SECRET):
+        for name, batch_size in (('one at a time', 1), (f'batches of {args.batch_size}', args.batch_size)):
+            latencies, resends, elapsed = deliver(make_events(batch_size))
+            assert StripeEvent.objects.filter(status=StripeEvent.PENDING).count() == args.orders
+            started = time.perf_counter()
+            processed = run_worker(batch_size, drain=True)
+            drained = time.perf_counter() - started
+            assert processed == args.orders
+            rows.append((
+                name, f'{args.orders * args.deliveries / elapsed:,.0f}',
+                f'{percentile(latencies, 0.5):.1f}', f'{percentile(latencies, 0.99):.1f}', resends,
+                f'{args.orders / drained:,.0f}',
+            ))
+    assert Order.objects.filter(status='paid').count() == 2 * args.orders
+
+    print_table(
+        f'Webhook burst: {args.orders} events x {args.deliveries} deliveries, {args.senders} senders',
+        ['processing', 'acks/s', 'ack p50 ms', 'ack p99 ms', 'lock resends', 'orders paid/s'],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Shared set-up for the benchmark scripts.
+
+Benchmarks run against a throwaway test database, never db.sqlite3:
+
+    cd mysite
+    python -m benchmarks.bench_pagination --rows 100000
+"""
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django(test_db_name=None):
+    """
+    Configure Django and create an empty test database to benchmark against.
+    On SQLite the test database lives in memory unless `test_db_name` names
+    a file.
+    """
+    if str(BASE_DIR) not in sys.path:
+        sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
+
+    import django
+    django.setup()
+
+    from django.db import connection
+    if test_db_name:
+        connection.settings_dict['TEST']['NAME'] = test_db_name
+    from django.test.utils import setup_test_environment
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+
+def measure(func, repeat=20, warmup=2):
+    """
+    Call `func` repeatedly and return latency statistics in milliseconds.
+    """
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'median': statistics.median(samples),
+        'p95': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        'max': samples[-1],
+    }
+
+
+def seed_catalog(rows, categories=20, batch_size=5000):
+    """
+    Bulk-insert `rows` active products spread across `categories` categories.
+    """
+    from store.models import Category, Product
+
+    cats = Category.objects.bulk_create(
+        Category(name=f'Category {i}', slug=f'category-{i}') for i in range(categories)
+    )
+    colors = ['Red', 'Blue', 'Green', 'Black', 'White']
+    batch = []
+    for i in range(rows):
+        batch.append(Product(
+            name=f'Product {i}',
+            slug=f'product-{i}',
+            description=f'Description for product {i}. ' * 8,
+            price=5 + (i * 7919) % 500,
+            stock_quantity=100,
+            category=cats[i % categories],
+            color=colors[i % len(colors)],
+            is_featured=i % 50 == 0,
+        ))
+        if len(batch) >= batch_size:
+            Product.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Product.objects.bulk_create(batch)
+    return cats
+
+
+def print_table(title, headers, rows):
+    print(f'\n{title}')
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) for i, h in enumerate(headers)]
+    print('  '.join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print('  '.join(str(c).ljust(w) for c, w in zip(row, widths)))
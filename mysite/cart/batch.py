@@ -0,0 +1,122 @@
+"""
+Apply many cart edits in one transaction.
+
+An operation is a dict with `op` ('add', 'set' or 'remove'), `product_id`
+and, except for 'remove', `quantity`. Operations are applied in order to
+the cart's current quantities; the result is validated against one
+`id__in` product query, held against the stock (cart.reservations) and
+written with one bulk_create, one bulk_update and one delete.
+
+The transaction starts by touching the cart, which takes its row lock (the
+write lock on SQLite) before anything is read, so concurrent batches and
+checkouts of the same cart queue up instead of failing on a lock upgrade.
+Single-line edits don't take that lock; should one create a line this
+batch is about to create, the batch is started over.
+"""
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from store.models import Product
+from .models import Cart, CartItem
+from .reservations import InsufficientStock, hold_stock
+
+MAX_OPERATIONS = 200
+# Times a batch is started over after losing a race to create a line.
+MAX_ATTEMPTS = 3
+ADD, SET, REMOVE = 'add', 'set', 'remove'
+
+
+def _final_quantities(current, operations):
+    quantities = dict(current)
+    for operation in operations:
+        product_id = operation['product_id']
+        if operation['op'] == ADD:
+            quantities[product_id] = quantities.get(product_id, 0) + operation['quantity']
+        elif operation['op'] == SET:
+            quantities[product_id] = operation['quantity']
+        else:
+            quantities[product_id] = 0
+    return quantities
+
+
+def resolve_quantities(current, operations, products, strict=True):
+    """
+    Return the quantity of every touched product after `operations`.
+
+    `products` maps product ids to products with `is_active` and
+    `stock_quantity` loaded. With `strict`, a ValidationError keyed by
+    operation index is raised for operations that cannot be applied;
+    otherwise they are dropped and quantities are capped at the stock.
+    """
+    quantities = _final_quantities(current, operations)
+    errors = {}
+    for index, operation in enumerate(operations):
+        product_id = operation['product_id']
+        product = products.get(product_id)
+        if operation['op'] == REMOVE or quantities[product_id] == 0:
+            continue
+        if product is None:
+            errors[index] = ['Product not found.']
+            quantities[product_id] = current.get(product_id, 0)
+        elif not product.is_active:
+            errors[index] = ['This product is not active.']
+            quantities[product_id] = current.get(product_id, 0)
+        elif product.stock_quantity < quantities[product_id]:
+            errors[index] = ['Not enough stock available.']
+            quantities[product_id] = product.stock_quantity
+    if errors and strict:
+        raise serializers.ValidationError({'operations': errors})
+    return quantities
+
+
+def apply_cart_operations(cart, operations, strict=True):
+    """
+    Apply `operations` to `cart` atomically. See resolve_quantities() for
+    how invalid operations are handled.
+    """
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            with transaction.atomic():
+                return _apply(cart, operations, strict)
+        except IntegrityError:
+            if attempt == MAX_ATTEMPTS:
+                raise
+
+
+def _apply(cart, operations, strict):
+    product_ids = {operation['product_id'] for operation in operations}
+    # A write first, so the lock is held before anything is read.
+    Cart.objects.filter(pk=cart.pk).update(updated_at=timezone.now())
+    products = Product.objects.only('id', 'is_active', 'stock_quantity').in_bulk(product_ids)
+
+    items = {item.product_id: item for item in cart.items.filter(product_id__in=product_ids)}
+    current = {product_id: item.quantity for product_id, item in items.items()}
+    quantities = resolve_quantities(current, operations, products, strict=strict)
+    try:
+        quantities.update(hold_stock(cart, quantities, strict=strict))
+    except InsufficientStock as exc:
+        raise serializers.ValidationError({'operations': {
+            index: ['Not enough stock available.']
+            for index, operation in enumerate(operations)
+            if operation['product_id'] in exc.product_ids
+        }})
+
+    to_create, to_update, to_delete = [], [], []
+    for product_id, quantity in quantities.items():
+        item = items.get(product_id)
+        if item is None:
+            if quantity:
+                to_create.append(CartItem(cart=cart, product_id=product_id, quantity=quantity))
+        elif not quantity:
+            to_delete.append(item.pk)
+        elif quantity != item.quantity:
+            item.quantity = quantity
+            to_update.append(item)
+
+    if to_create:
+        CartItem.objects.bulk_create(to_create)
+    if to_update:
+        CartItem.objects.bulk_update(to_update, ['quantity'])
+    if to_delete:
+        CartItem.objects.filter(pk__in=to_delete).delete()
@@ -0,0 +1,124 @@
+"""
+Carts for anonymous visitors, kept in the cache instead of the database.
+
+A guest cart is a `{product_id: quantity}` mapping stored under an opaque
+token with a sliding expiry (GUEST_CART_TTL). Clients send the token in
+the `X-Guest-Cart` header. Abandoned guest carts simply expire; a guest
+cart only reaches the database when its owner logs in or registers, and is
+then merged into their Cart with one apply_cart_operations() call.
+"""
+import secrets
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import serializers
+
+from store.models import Product
+from .batch import ADD, MAX_OPERATIONS, apply_cart_operations, resolve_quantities
+from .models import CENTS, Cart
+
+GUEST_CART_HEADER = 'HTTP_X_GUEST_CART'
+GUEST_CART_FIELD = 'guest_cart_token'
+KEY_PREFIX = 'cart:guest:'
+MAX_LINES = MAX_OPERATIONS
+
+
+def get_guest_cache():
+    return caches[getattr(settings, 'GUEST_CART_CACHE_ALIAS', 'default')]
+
+
+def get_guest_ttl():
+    return getattr(settings, 'GUEST_CART_TTL', 60 * 60 * 24 * 7)
+
+
+def get_guest_token(request):
+    """
+    Read the guest cart token from the header or, on login and register,
+    from the request body.
+    """
+    token = request.META.get(GUEST_CART_HEADER)
+    if not token and isinstance(getattr(request, 'data', None), dict):
+        token = request.data.get(GUEST_CART_FIELD)
+    return token or None
+
+
+class GuestCart:
+    def __init__(self, token=None, lines=None):
+        self.token = token or secrets.token_urlsafe(24)
+        self.lines = lines or {}
+
+    @property
+    def key(self):
+        return f'{KEY_PREFIX}{self.token}'
+
+    @classmethod
+    def load(cls, token):
+        """
+        Return the guest cart for `token`, or None if it expired or never
+        existed.
+        """
+        if not token:
+            return None
+        cart = cls(token)
+        lines = get_guest_cache().get(cart.key)
+        if lines is None:
+            return None
+        cart.lines = lines
+        return cart
+
+    def save(self):
+        get_guest_cache().set(self.key, self.lines, get_guest_ttl())
+
+    def delete(self):
+        get_guest_cache().delete(self.key)
+
+    def apply(self, operations):
+        """
+        Apply add / set / remove operations, validated like a persistent
+        cart's, and save the result.
+        """
+        product_ids = {operation['product_id'] for operation in operations}
+        products = Product.objects.only('id', 'is_active', 'stock_quantity').in_bulk(product_ids)
+        quantities = resolve_quantities(self.lines, operations, products)
+        lines = {**self.lines, **quantities}
+        lines = {product_id: quantity for product_id, quantity in lines.items() if quantity}
+        if len(lines) > MAX_LINES:
+            raise serializers.ValidationError(
+                {'operations': [f'A guest cart holds at most {MAX_LINES} products.']}
+            )
+        self.lines = lines
+        self.save()
+
+    def to_representation(self):
+        products = Product.objects.only('id', 'price').in_bulk(list(self.lines))
+        items, total = [], Decimal('0.00')
+        for product_id, quantity in self.lines.items():
+            product = products.get(product_id)
+            if product is None:
+                continue
+            item_total = product.price * quantity
+            total += item_total
+            items.append({'product_id': product_id, 'quantity': quantity, 'item_total': item_total})
+        return {'token': self.token, 'items': items, 'total_cost': total.quantize(CENTS)}
+
+
+def merge_guest_cart(user, token):
+    """
+    Merge the guest cart for `token` into the user's Cart in one batched
+    operation and discard it. Lines that are no longer available are
+    dropped and quantities are capped at the stock, so logging in never
+    fails because of the guest cart.
+    """
+    guest = GuestCart.load(token)
+    if guest is None:
+        return None
+    cart, created = Cart.objects.get_or_create(user=user)
+    if guest.lines:
+        operations = [
+            {'op': ADD, 'product_id': product_id, 'quantity': quantity}
+            for product_id, quantity in guest.lines.items()
+        ]
+        apply_cart_operations(cart, operations, strict=False)
+    guest.delete()
+    return cart
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from cart.reservations import DEFAULT_SWEEP_BATCH_SIZE, release_expired
+
+
+class Command(BaseCommand):
+    help = 'Release expired cart stock reservations in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_SWEEP_BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep sweeping every --interval seconds instead of exiting.')
+        parser.add_argument('--interval', type=float, default=30.0)
+
+    def handle(self, *args, **options):
+        while True:
+            total = self.sweep(options['batch_size'])
+            if total or options['verbosity'] > 1:
+                self.stdout.write(f'Released {total} expired reservations.')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def sweep(self, batch_size):
+        total = 0
+        while True:
+            released = release_expired(batch_size)
+            total += released
+            if released < batch_size:
+                return total
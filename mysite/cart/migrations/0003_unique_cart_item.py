@@ -0,0 +1,38 @@
+# Generated by Django 5.2.9 on 2026-10-18 03:08
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_items(apps, schema_editor):
+    """
+    Fold every group of lines for the same cart and product into its oldest
+    line, summing the quantities.
+    """
+    CartItem = apps.get_model('cart', 'CartItem')
+    duplicates = (
+        CartItem.objects.values('cart_id', 'product_id')
+        .annotate(lines=Count('id'), first_id=Min('id'), total=Sum('quantity'))
+        .filter(lines__gt=1)
+    )
+    for group in list(duplicates):
+        CartItem.objects.filter(pk=group['first_id']).update(quantity=group['total'])
+        CartItem.objects.filter(
+            cart_id=group['cart_id'], product_id=group['product_id'],
+        ).exclude(pk=group['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0002_stock_reservations'),
+        ('store', '0005_product_reserved_quantity'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('cart', 'product'), name='cart_item_cart_product_uniq'),
+        ),
+    ]
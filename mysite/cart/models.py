@@ -1,27 +1,120 @@
-from django.db import models
+from decimal import Decimal
+from django.db import IntegrityError, models, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Prefetch, Sum, Value
+from django.db.models.functions import Coalesce
 from django.conf import settings
 from store.models import Product
 
+CENTS = Decimal('0.01')
+
+def line_total(prefix=''):
+    """
+    Database expression for price * quantity of a cart item, optionally
+    reached through a relation (e.g. prefix='items__' from Cart).
+    """
+    return ExpressionWrapper(
+        F(f'{prefix}product__price') * F(f'{prefix}quantity'),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+def sum_of_lines(prefix=''):
+    return Coalesce(
+        Sum(line_total(prefix)), Value(Decimal('0.00')),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+class CartQuerySet(models.QuerySet):
+    def with_contents(self):
+        """
+        Annotate each cart's total and prefetch its items with their
+        products, so a cart of any size is read in two queries.
+        """
+        return self.annotate(items_total=sum_of_lines('items__')).prefetch_related(
+            Prefetch('items', queryset=CartItem.objects.select_related('product').order_by('pk'))
+        )
+
+class CartItemQuerySet(models.QuerySet):
+    def add(self, cart, product_id, quantity):
+        """
+        Add `quantity` units of a product to `cart` and return the line with
+        its new quantity and product loaded.
+
+        The line is incremented in the database with F() and created only if
+        the increment matched nothing; the (cart, product) unique constraint
+        turns a concurrent create into an increment, so simultaneous adds
+        never lose units or create a second line.
+        """
+        line = self.filter(cart=cart, product_id=product_id)
+        if not line.update(quantity=F('quantity') + quantity):
+            try:
+                with transaction.atomic():
+                    self.create(cart=cart, product_id=product_id, quantity=quantity)
+            except IntegrityError:
+                # Another request created the line since the update above.
+                line.update(quantity=F('quantity') + quantity)
+        return line.select_related('product').get()
+
 class Cart(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='cart')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CartQuerySet.as_manager()
+
     def __str__(self):
         return f"Cart for {self.user.username}"
 
     @property
     def total_cost(self):
-        return sum(item.item_total for item in self.items.all())
+        # Set by Cart.objects.with_contents(); otherwise summed by the database.
+        if hasattr(self, 'items_total'):
+            total = self.items_total
+        else:
+            total = self.items.aggregate(total=sum_of_lines())['total']
+        # SQLite drops the scale of computed decimals.
+        return total.quantize(CENTS)
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
 
+    objects = CartItemQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.quantity} of {self.product.name} in cart for {self.cart.user.username}"
 
     @property
     def item_total(self):
         return self.product.price * self.quantity
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='cart_item_cart_product_uniq'),
+        ]
+
+class StockReservation(models.Model):
+    """
+    A time-limited hold of `quantity` units of a product for a cart, counted
+    in Product.reserved_quantity until it is converted by checkout or
+    released (see cart.reservations).
+    """
+    # Holds deliberately outlive a deleted cart: the sweeper still finds
+    # and releases them when they expire, so no reserved stock is leaked.
+    cart = models.ForeignKey(
+        Cart, on_delete=models.DO_NOTHING, db_constraint=False, related_name='reservations'
+    )
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.quantity} of product {self.product_id} held for cart {self.cart_id}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='cart_reservation_cart_product_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='cart_reservation_expiry_idx'),
+        ]
@@ -0,0 +1,233 @@
+"""
+Time-limited stock holds for cart lines.
+
+Every cart line holds its quantity against the product's stock: the units
+are counted in `Product.reserved_quantity` and recorded in a
+`StockReservation` that expires CART_RESERVATION_TTL after the line was
+last changed. A hold is only ever taken with a conditional update,
+
+    UPDATE product SET reserved_quantity = reserved_quantity + n
+    WHERE id = ? AND is_active AND stock_quantity >= reserved_quantity + n
+
+so concurrent carts can never hold more than the stock between them.
+Checkout converts a cart's holds into stock decrements and
+`release_expired()` (run by the `release_expired_reservations` command)
+gives expired holds back in batches.
+
+Checkout's stock decrement also sets `Product.updated_at` and, once
+committed, invalidates the cached catalog responses (store.cache), so
+product pages, their validators and `?since=` exports see the new stock.
+Holds only change the internal `reserved_quantity`, so they leave both
+alone and adding to a cart never empties the catalog cache.
+
+Each transaction here starts by updating the reservation rows it is about
+to read. That refresh takes the row locks (the write lock on SQLite), so
+the sweeper and a cart can never both act on the same hold.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest, Now
+from django.utils import timezone
+
+from store.cache import bump_version
+from store.models import Product
+from .models import StockReservation
+
+DEFAULT_SWEEP_BATCH_SIZE = 500
+
+
+class InsufficientStock(Exception):
+    """
+    Raised when a hold cannot be taken; `product_ids` lists the products
+    that are short.
+    """
+
+    def __init__(self, product_ids):
+        super().__init__('Not enough stock available.')
+        self.product_ids = list(product_ids)
+
+
+def get_reservation_ttl():
+    return timedelta(seconds=getattr(settings, 'CART_RESERVATION_TTL', 15 * 60))
+
+
+def _stock_changed():
+    transaction.on_commit(lambda: bump_version(Product))
+
+
+def _reserve(product_id, quantity):
+    return Product.objects.filter(
+        pk=product_id, is_active=True,
+        stock_quantity__gte=F('reserved_quantity') + quantity,
+    ).update(reserved_quantity=F('reserved_quantity') + quantity) == 1
+
+
+def _release(product_id, quantity):
+    Product.objects.filter(pk=product_id).update(
+        reserved_quantity=Greatest(F('reserved_quantity') - quantity, Value(0))
+    )
+
+
+def hold_stock(cart, quantities, strict=True):
+    """
+    Make `cart` hold exactly `quantities[product_id]` units of each product
+    (0 releases the hold) and refresh the expiry of those holds.
+
+    With `strict`, raise InsufficientStock and change nothing if any hold
+    cannot be grown. Otherwise such products keep their current hold.
+    Return the quantity now held for each product.
+    """
+    expires_at = timezone.now() + get_reservation_ttl()
+    with transaction.atomic():
+        reservations = StockReservation.objects.filter(cart=cart, product_id__in=list(quantities))
+        reservations.update(expires_at=expires_at)
+        held = dict(reservations.values_list('product_id', 'quantity'))
+
+        result, short = {}, []
+        for product_id, quantity in quantities.items():
+            delta = quantity - held.get(product_id, 0)
+            if delta > 0 and not _reserve(product_id, delta):
+                short.append(product_id)
+                result[product_id] = held.get(product_id, 0)
+                continue
+            if delta < 0:
+                _release(product_id, -delta)
+            result[product_id] = quantity
+        if short and strict:
+            raise InsufficientStock(short)
+
+        released = [product_id for product_id, quantity in result.items() if not quantity]
+        if released:
+            reservations.filter(product_id__in=released).delete()
+        kept = [
+            StockReservation(cart=cart, product_id=product_id, quantity=quantity, expires_at=expires_at)
+            for product_id, quantity in result.items() if quantity
+        ]
+        if kept:
+            StockReservation.objects.bulk_create(
+                kept, update_conflicts=True,
+                unique_fields=['cart', 'product'], update_fields=['quantity', 'expires_at'],
+            )
+    return result
+
+
+def _per_product(values):
+    """
+    CASE expression mapping product ids to `values`, 0 for other products.
+    Products with the same value share one WHEN ... IN (...), which keeps
+    the statement small for typical carts.
+    """
+    by_value = defaultdict(list)
+    for product_id, value in values.items():
+        if value:
+            by_value[value].append(product_id)
+    return Case(
+        *[When(pk__in=sorted(ids), then=Value(value)) for value, ids in sorted(by_value.items())],
+        default=Value(0), output_field=IntegerField(),
+    )
+
+
+class _Shortfall(Exception):
+    pass
+
+
+def consume_stock(cart, quantities):
+    """
+    Turn the holds of `cart` into stock decrements of `quantities` for an
+    order. Lines whose hold expired are decremented from the unreserved
+    stock instead, and holds beyond the ordered quantities are given back.
+    Raise InsufficientStock, changing nothing, if any product is short.
+    Must run inside the checkout transaction.
+    """
+    consume_carts_stock({cart: quantities})
+
+
+def consume_carts_stock(orders):
+    """
+    consume_stock() for several carts at once: `orders` maps each cart to
+    the quantities ordered from it. Raise InsufficientStock, changing
+    nothing, if the carts together are short of any product.
+
+    Every product is decremented by one conditional UPDATE, whatever the
+    number and size of the carts:
+
+        UPDATE product
+        SET stock_quantity = stock_quantity - CASE id WHEN ... END,
+            reserved_quantity = MAX(reserved_quantity - CASE id WHEN ... END, 0)
+        WHERE id IN (...) AND stock_quantity >= reserved_quantity - <held> + <ordered>
+    """
+    quantities, held = defaultdict(int), defaultdict(int)
+    for cart_quantities in orders.values():
+        for product_id, quantity in cart_quantities.items():
+            quantities[product_id] += quantity
+    with transaction.atomic():
+        reservations = StockReservation.objects.filter(cart__in=list(orders))
+        reservations.update(expires_at=F('expires_at'))
+        for product_id, quantity in reservations.values_list('product_id', 'quantity'):
+            held[product_id] += quantity
+
+        ordered, released = _per_product(quantities), _per_product(held)
+        available = Q(stock_quantity__gte=F('reserved_quantity') - released + ordered)
+        # Products that are only released cannot be short.
+        products = Product.objects.filter(
+            available | Q(pk__in=[product_id for product_id in held if product_id not in quantities]),
+        )
+        product_ids = set(quantities) | set(held)
+        try:
+            with transaction.atomic():
+                updated = products.filter(pk__in=product_ids).update(
+                    stock_quantity=F('stock_quantity') - ordered,
+                    reserved_quantity=Greatest(F('reserved_quantity') - released, Value(0)),
+                    updated_at=Now(),
+                )
+                if updated != len(product_ids):
+                    raise _Shortfall
+        except _Shortfall:
+            # The decrement was rolled back, so this sees the stock it saw.
+            enough = set(products.filter(pk__in=product_ids).values_list('pk', flat=True))
+            raise InsufficientStock(sorted(product_ids - enough))
+        reservations.delete()
+        _stock_changed()
+
+
+def release_cart(cart):
+    """
+    Give back every hold of `cart`.
+    """
+    with transaction.atomic():
+        reservations = StockReservation.objects.filter(cart=cart)
+        product_ids = list(reservations.values_list('product_id', flat=True))
+        if product_ids:
+            hold_stock(cart, dict.fromkeys(product_ids, 0))
+
+
+def release_expired(batch_size=DEFAULT_SWEEP_BATCH_SIZE, now=None):
+    """
+    Release up to `batch_size` expired holds in one transaction and return
+    how many were released.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        ids = list(
+            StockReservation.objects.filter(expires_at__lte=now)
+            .order_by('expires_at').values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+        expired = StockReservation.objects.filter(pk__in=ids, expires_at__lte=now)
+        # Claim the rows first; a hold refreshed in the meantime no longer
+        # matches and is left alone.
+        expired.update(expires_at=F('expires_at'))
+        rows = list(expired.values_list('pk', 'product_id', 'quantity'))
+
+        totals = defaultdict(int)
+        for _, product_id, quantity in rows:
+            totals[product_id] += quantity
+        for product_id, quantity in totals.items():
+            _release(product_id, quantity)
+        StockReservation.objects.filter(pk__in=[row[0] for row in rows]).delete()
+    return len(rows)
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from .batch import ADD, MAX_OPERATIONS, REMOVE, SET
 from .models import Cart, CartItem
 from store.models import Product
 
@@ -10,18 +11,13 @@ class CartItemSerializer(serializers.ModelSerializer):
         fields = ('id', 'product_id', 'quantity', 'item_total')
         read_only_fields = ('id', 'item_total')
 
-    def validate_product_id(self, value):
-        try:
-            product = Product.objects.get(id=value)
-        except Product.DoesNotExist:
-            raise serializers.ValidationError("Product not found.")
-        return value
-
     def validate(self, data):
-        product_id = data.get('product_id')
-        quantity = data.get('quantity')
-        product = Product.objects.get(id=product_id)
+        product_id = data.get('product_id', getattr(self.instance, 'product_id', None))
+        quantity = data.get('quantity', getattr(self.instance, 'quantity', 1))
+        product = Product.objects.only('is_active', 'stock_quantity').filter(id=product_id).first()
 
+        if product is None:
+            raise serializers.ValidationError({'product_id': ["Product not found."]})
         if not product.is_active:
             raise serializers.ValidationError("This product is not active.")
         if product.stock_quantity < quantity:
@@ -36,3 +32,18 @@ class CartSerializer(serializers.ModelSerializer):
         model = Cart
         fields = ('id', 'user', 'items', 'total_cost')
         read_only_fields = ('id', 'user', 'total_cost')
+
+class CartOperationSerializer(serializers.Serializer):
+    op = serializers.ChoiceField(choices=[ADD, SET, REMOVE])
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=0, required=False)
+
+    def validate(self, data):
+        if data['op'] == ADD and not data.get('quantity'):
+            raise serializers.ValidationError({'quantity': 'A positive quantity is required.'})
+        if data['op'] == SET and 'quantity' not in data:
+            raise serializers.ValidationError({'quantity': 'This field is required.'})
+        return data
+
+class CartBatchSerializer(serializers.Serializer):
+    operations = CartOperationSerializer(many=True, allow_empty=False, max_length=MAX_OPERATIONS)
@@ -1,9 +1,24 @@
 
+from decimal import Decimal
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
-from .models import Cart, CartItem
+from .guest import GuestCart, get_guest_cache
+from .models import Cart, CartItem, StockReservation
+from .reservations import InsufficientStock, hold_stock, release_expired
+from users.models import Address
+from store.cache import get_catalog_cache
 from store.models import Product, Category
 
 User = get_user_model()
@@ -90,6 +105,21 @@ class CartApiTests(APITestCase):
         cart_item.refresh_from_db()
         self.assertEqual(cart_item.quantity, 5)
 
+    def test_changing_line_to_a_product_already_in_cart_is_rejected(self):
+        cart = Cart.objects.get(user=self.user)
+        other_product = Product.objects.create(
+            name='Other Product', category=self.category, price=5.00, stock_quantity=10, is_active=True
+        )
+        CartItem.objects.create(cart=cart, product=self.active_product, quantity=1)
+        line = CartItem.objects.create(cart=cart, product=other_product, quantity=2)
+        url = reverse('cart-item-detail', kwargs={'pk': line.id})
+
+        response = self.client.patch(url, {'product_id': self.active_product.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('product_id', response.data)
+        line.refresh_from_db()
+        self.assertEqual(line.product_id, other_product.id)
+
     def test_remove_item_from_cart(self):
         cart_item = CartItem.objects.create(
             cart=Cart.objects.get(user=self.user),
@@ -116,3 +146,367 @@ class CartApiTests(APITestCase):
         
         self.assertEqual(response_get.status_code, status.HTTP_401_UNAUTHORIZED)
         self.assertEqual(response_post.status_code, status.HTTP_401_UNAUTHORIZED)
+
+class CartReadQueryTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='bulkbuyer', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.category = Category.objects.create(name='Query Category')
+        self.cart = Cart.objects.get(user=self.user)
+
+    def fill_cart(self, lines):
+        start = self.cart.items.count()
+        for i in range(start, start + lines):
+            product = Product.objects.create(
+                name=f'Line {i}', category=self.category, price='2.50', stock_quantity=100
+            )
+            CartItem.objects.create(cart=self.cart, product=product, quantity=i + 1)
+
+    def test_cart_is_read_in_a_fixed_number_of_queries(self):
+        added = 0
+        for size in (1, 10, 100):
+            self.fill_cart(size - added)
+            added = size
+            with self.subTest(items=size), self.assertNumQueries(2):
+                response = self.client.get(reverse('cart-detail'))
+            self.assertEqual(len(response.data['items']), size)
+
+    def test_total_is_computed_by_the_database(self):
+        self.fill_cart(3)
+        response = self.client.get(reverse('cart-detail'))
+        self.assertEqual(str(response.data['total_cost']), '15.00')
+        self.assertEqual(response.data['items'][2]['item_total'], Decimal('7.50'))
+        self.assertEqual(Cart.objects.get(pk=self.cart.pk).total_cost, Decimal('15.00'))
+
+    def test_empty_cart_total(self):
+        response = self.client.get(reverse('cart-detail'))
+        self.assertEqual(response.data['total_cost'], Decimal('0.00'))
+
+class CartBatchTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='syncer', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        category = Category.objects.create(name='Batch Category')
+        self.lamp = Product.objects.create(name='Lamp', category=category, price=10, stock_quantity=5)
+        self.chair = Product.objects.create(name='Chair', category=category, price=20, stock_quantity=5)
+        self.desk = Product.objects.create(name='Desk', category=category, price=30, stock_quantity=5)
+        self.retired = Product.objects.create(
+            name='Retired', category=category, price=1, stock_quantity=5, is_active=False
+        )
+        self.cart = Cart.objects.get(user=self.user)
+        CartItem.objects.create(cart=self.cart, product=self.lamp, quantity=1)
+        CartItem.objects.create(cart=self.cart, product=self.chair, quantity=1)
+        self.url = reverse('cart-items-batch')
+
+    def test_applies_operations_and_returns_cart(self):
+        operations = [
+            {'op': 'add', 'product_id': self.lamp.id, 'quantity': 2},
+            {'op': 'remove', 'product_id': self.chair.id},
+            {'op': 'set', 'product_id': self.desk.id, 'quantity': 4},
+        ]
+        # Cart, lock (an UPDATE), products, items, three stock holds (refresh, read, one
+        # conditional update per product, hold upsert and delete), insert,
+        # update, delete, cart read (x2), plus savepoints inside the test case.
+        with self.assertNumQueries(19):
+            response = self.client.post(self.url, {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lines = {item['product_id']: item['quantity'] for item in response.data['items']}
+        self.assertEqual(lines, {self.lamp.id: 3, self.desk.id: 4})
+        self.assertEqual(response.data['total_cost'], Decimal('150.00'))
+
+    def test_invalid_operation_rolls_back_everything(self):
+        operations = [
+            {'op': 'set', 'product_id': self.lamp.id, 'quantity': 2},
+            {'op': 'add', 'product_id': self.retired.id, 'quantity': 1},
+            {'op': 'add', 'product_id': self.desk.id, 'quantity': 6},
+            {'op': 'add', 'product_id': 99999, 'quantity': 1},
+        ]
+        response = self.client.post(self.url, {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.data['operations']), {1, 2, 3})
+        self.assertEqual(CartItem.objects.get(cart=self.cart, product=self.lamp).quantity, 1)
+
+    def test_cart_is_locked_with_a_write_before_any_read(self):
+        operations = [{'op': 'add', 'product_id': self.desk.id, 'quantity': 1}]
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(self.url, {'operations': operations}, format='json')
+        sql = [q['sql'] for q in queries if not q['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+        first = next(i for i, q in enumerate(sql) if 'store_product' in q or 'cart_cartitem' in q)
+        self.assertTrue(sql[first - 1].startswith('UPDATE "cart_cart"'))
+
+    def test_lost_race_to_create_a_line_starts_over(self):
+        bulk_create = CartItem.objects.bulk_create
+        calls = []
+
+        def racing_bulk_create(objs, *args, **kwargs):
+            calls.append(objs)
+            if len(calls) == 1:
+                raise IntegrityError('UNIQUE constraint failed')
+            return bulk_create(objs, *args, **kwargs)
+
+        operations = [{'op': 'add', 'product_id': self.desk.id, 'quantity': 2}]
+        with mock.patch.object(CartItem.objects, 'bulk_create', side_effect=racing_bulk_create):
+            response = self.client.post(self.url, {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(CartItem.objects.get(cart=self.cart, product=self.desk).quantity, 2)
+        self.assertEqual(Product.objects.get(pk=self.desk.pk).reserved_quantity, 2)
+
+    def test_operation_shape_is_validated(self):
+        response = self.client.post(
+            self.url, {'operations': [{'op': 'add', 'product_id': self.lamp.id}]}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.url, {'operations': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class CartItemUpsertTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='tabber', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        category = Category.objects.create(name='Upsert Category')
+        self.product = Product.objects.create(name='Mug', category=category, price=5, stock_quantity=10)
+        self.cart = Cart.objects.get(user=self.user)
+
+    def test_adding_twice_increments_one_line(self):
+        for quantity in (2, 3):
+            response = self.client.post(
+                reverse('cart-items'), {'product_id': self.product.id, 'quantity': quantity}, format='json'
+            )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['quantity'], 5)
+        self.assertEqual(response.data['item_total'], Decimal('25.00'))
+        self.assertEqual(list(self.cart.items.values_list('quantity', flat=True)), [5])
+
+    def test_increment_of_existing_line_is_one_update(self):
+        CartItem.objects.create(cart=self.cart, product=self.product, quantity=1)
+        # The F() increment and the read back of the line.
+        with self.assertNumQueries(2):
+            item = CartItem.objects.add(self.cart, self.product.id, 2)
+        self.assertEqual(item.quantity, 3)
+
+    def test_duplicate_lines_are_rejected(self):
+        CartItem.objects.create(cart=self.cart, product=self.product, quantity=1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CartItem.objects.create(cart=self.cart, product=self.product, quantity=1)
+
+class GuestCartTests(APITestCase):
+    def setUp(self):
+        get_guest_cache().clear()
+        category = Category.objects.create(name='Guest Category')
+        self.lamp = Product.objects.create(name='Lamp', category=category, price=10, stock_quantity=5)
+        self.chair = Product.objects.create(name='Chair', category=category, price=20, stock_quantity=2)
+        self.url = reverse('guest-cart')
+
+    def add_to_guest_cart(self, operations, token=None):
+        headers = {'HTTP_X_GUEST_CART': token} if token else {}
+        return self.client.post(self.url, {'operations': operations}, format='json', **headers)
+
+    def test_guest_cart_never_writes_to_the_database(self):
+        with self.assertNumQueries(2):
+            response = self.add_to_guest_cart([{'op': 'add', 'product_id': self.lamp.id, 'quantity': 2}])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        token = response.data['token']
+        self.add_to_guest_cart([{'op': 'add', 'product_id': self.chair.id, 'quantity': 1}], token)
+
+        response = self.client.get(self.url, HTTP_X_GUEST_CART=token)
+        self.assertEqual(response.data['total_cost'], Decimal('40.00'))
+        self.assertEqual(len(response.data['items']), 2)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_guest_cart_validates_stock(self):
+        response = self.add_to_guest_cart([{'op': 'add', 'product_id': self.chair.id, 'quantity': 3}])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_unknown_token_is_404(self):
+        response = self.client.get(self.url, HTTP_X_GUEST_CART='expired')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_login_merges_guest_cart(self):
+        user = User.objects.create_user(username='returning', password='testpass123')
+        cart = Cart.objects.get(user=user)
+        CartItem.objects.create(cart=cart, product=self.chair, quantity=1)
+        token = self.add_to_guest_cart([
+            {'op': 'add', 'product_id': self.lamp.id, 'quantity': 2},
+            {'op': 'add', 'product_id': self.chair.id, 'quantity': 2},
+        ]).data['token']
+
+        response = self.client.post(
+            reverse('token_obtain_pair'),
+            {'username': 'returning', 'password': 'testpass123'},
+            format='json', HTTP_X_GUEST_CART=token,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('access', response.data)
+        lines = dict(cart.items.values_list('product_id', 'quantity'))
+        # The chair is capped at its stock of 2 instead of failing the login.
+        self.assertEqual(lines, {self.lamp.id: 2, self.chair.id: 2})
+        self.assertIsNone(GuestCart.load(token))
+
+    def test_register_merges_guest_cart(self):
+        token = self.add_to_guest_cart([{'op': 'add', 'product_id': self.lamp.id, 'quantity': 1}]).data['token']
+        response = self.client.post(reverse('user-register'), {
+            'username': 'newcomer', 'email': 'new@example.com',
+            'password': 'Str0ng-passw0rd', 'password2': 'Str0ng-passw0rd',
+            'guest_cart_token': token,
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        user = User.objects.get(username='newcomer')
+        self.assertEqual(list(user.cart.items.values_list('product_id', flat=True)), [self.lamp.id])
+
+class StockReservationTests(APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Hot Category')
+        self.sku = Product.objects.create(name='Hot SKU', category=self.category, price=10, stock_quantity=3)
+        self.alice = User.objects.create_user(username='alice', password='testpass123')
+        self.bob = User.objects.create_user(username='bob', password='testpass123')
+
+    def add(self, user, quantity):
+        self.client.force_authenticate(user=user)
+        return self.client.post(
+            reverse('cart-items'), {'product_id': self.sku.id, 'quantity': quantity}, format='json'
+        )
+
+    def test_holds_keep_cached_catalog_pages(self):
+        get_catalog_cache().clear()
+        url = reverse('product-detail', kwargs={'pk': self.sku.pk})
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.add(self.alice, 2).status_code, status.HTTP_201_CREATED)
+            release_expired(now=timezone.now() + timedelta(days=1))
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response['ETag'], etag)
+
+    def test_add_to_cart_holds_stock(self):
+        self.assertEqual(self.add(self.alice, 2).status_code, status.HTTP_201_CREATED)
+        self.sku.refresh_from_db()
+        self.assertEqual(self.sku.reserved_quantity, 2)
+        # Only one unit is left for everybody else.
+        self.assertEqual(self.add(self.bob, 2).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.add(self.bob, 1).status_code, status.HTTP_201_CREATED)
+
+    def test_update_and_remove_adjust_the_hold(self):
+        self.add(self.alice, 2)
+        item = CartItem.objects.get(cart__user=self.alice)
+        url = reverse('cart-item-detail', args=[item.id])
+        response = self.client.put(url, {'product_id': self.sku.id, 'quantity': 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.sku.refresh_from_db()
+        self.assertEqual(self.sku.reserved_quantity, 1)
+        self.client.delete(url)
+        self.sku.refresh_from_db()
+        self.assertEqual(self.sku.reserved_quantity, 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_sweeper_releases_expired_holds(self):
+        self.add(self.alice, 3)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        out = StringIO()
+        call_command('release_expired_reservations', stdout=out)
+        self.assertIn('Released 1 expired reservations', out.getvalue())
+        self.sku.refresh_from_db()
+        self.assertEqual(self.sku.reserved_quantity, 0)
+        self.assertEqual(self.add(self.bob, 3).status_code, status.HTTP_201_CREATED)
+
+    def test_checkout_converts_holds_into_decrements(self):
+        self.add(self.alice, 2)
+        address = Address.objects.create(
+            profile=self.alice.profile, address_line_1='1 Main St', city='Springfield',
+            state='IL', postal_code='62701', country='US'
+        )
+        response = self.client.post(reverse('order-list'), {'address_id': address.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.sku.refresh_from_db()
+        self.assertEqual((self.sku.stock_quantity, self.sku.reserved_quantity), (1, 0))
+        self.assertFalse(StockReservation.objects.exists())
+
+class StockReservationContentionTests(TransactionTestCase):
+    """
+    Many threads race for one hot SKU; the conditional update must never let
+    the holds exceed the stock.
+    """
+    threads = 8
+    attempts_per_thread = 25
+    stock = 50
+
+    def setUp(self):
+        category = Category.objects.create(name='Flash Sale')
+        self.sku = Product.objects.create(
+            name='Flash SKU', category=category, price=1, stock_quantity=self.stock
+        )
+        self.carts = [
+            Cart.objects.get(user=User.objects.create_user(username=f'shopper{i}'))
+            for i in range(self.threads * self.attempts_per_thread)
+        ]
+
+    def test_no_oversell_under_contention(self):
+        held, lock = [], threading.Lock()
+
+        def shopper(carts):
+            try:
+                for cart in carts:
+                    while True:
+                        try:
+                            hold_stock(cart, {self.sku.pk: 1})
+                        except InsufficientStock:
+                            break
+                        except OperationalError:
+                            # SQLite reports write contention instead of waiting.
+                            time.sleep(0.001)
+                            continue
+                        with lock:
+                            held.append(cart.pk)
+                        break
+            finally:
+                connection.close()
+
+        chunks = [self.carts[i::self.threads] for i in range(self.threads)]
+        workers = [threading.Thread(target=shopper, args=(chunk,)) for chunk in chunks]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.sku.refresh_from_db()
+        self.assertEqual(len(held), self.stock)
+        self.assertEqual(self.sku.reserved_quantity, self.stock)
+        self.assertEqual(StockReservation.objects.filter(product=self.sku).count(), self.stock)
+
+class CartItemUpsertContentionTests(TransactionTestCase):
+    """
+    The same user adds one product from several tabs at once; every unit
+    must land on a single line.
+    """
+    threads = 8
+    adds_per_thread = 10
+
+    def setUp(self):
+        category = Category.objects.create(name='Tabs')
+        self.product = Product.objects.create(name='Sticker', category=category, price=1, stock_quantity=1000)
+        self.cart = Cart.objects.get(user=User.objects.create_user(username='tabs'))
+
+    def test_concurrent_adds_never_duplicate_or_lose_units(self):
+        def tab():
+            try:
+                for _ in range(self.adds_per_thread):
+                    while True:
+                        try:
+                            with transaction.atomic():
+                                CartItem.objects.add(self.cart, self.product.id, 1)
+                        except OperationalError:
+                            # SQLite reports write contention instead of waiting.
+                            time.sleep(0.001)
+                            continue
+                        break
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=tab) for _ in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        lines = list(CartItem.objects.filter(cart=self.cart).values_list('quantity', flat=True))
+        self.assertEqual(lines, [self.threads * self.adds_per_thread])
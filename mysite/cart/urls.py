@@ -4,6 +4,8 @@ from . import views
 urlpatterns = [
     path('', views.CartDetailView.as_view(), name='cart-detail'),
     path('items/', views.CartItemView.as_view(), name='cart-items'),
+    path('items/batch/', views.CartBatchView.as_view(), name='cart-items-batch'),
     path('items/<int:pk>/', views.CartItemDetailView.as_view(), name='cart-item-detail'),
+    path('guest/', views.GuestCartView.as_view(), name='guest-cart'),
     path('clear/', views.CartClearView.as_view(), name='cart-clear'),
 ]
@@ -1,18 +1,26 @@
+from django.db import IntegrityError, transaction
 from rest_framework import generics, status
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import serializers
 from .models import Cart, CartItem
-from .serializers import CartSerializer, CartItemSerializer
-from store.models import Product
+from .batch import apply_cart_operations
+from .guest import GuestCart, get_guest_token
+from .reservations import InsufficientStock, hold_stock, release_cart
+from .serializers import CartSerializer, CartItemSerializer, CartBatchSerializer
 
 class CartDetailView(generics.RetrieveAPIView):
     serializer_class = CartSerializer
     permission_classes = [IsAuthenticated]
 
     def get_object(self):
-        cart, created = Cart.objects.get_or_create(user=self.request.user)
-        return cart
+        carts = Cart.objects.with_contents()
+        try:
+            return carts.get(user=self.request.user)
+        except Cart.DoesNotExist:
+            Cart.objects.get_or_create(user=self.request.user)
+            return carts.get(user=self.request.user)
 
 class CartItemView(generics.CreateAPIView):
     serializer_class = CartItemSerializer
@@ -20,41 +28,107 @@ class CartItemView(generics.CreateAPIView):
 
     def perform_create(self, serializer):
         cart = Cart.objects.get(user=self.request.user)
-        product = serializer.validated_data['product_id']
+        product_id = serializer.validated_data['product_id']
         quantity = serializer.validated_data['quantity']
 
-        # Check if product is active and in stock
-        try:
-            product_obj = Product.objects.get(id=product, is_active=True, stock_quantity__gte=quantity)
-        except Product.DoesNotExist:
-            raise serializers.ValidationError("Product is not available or out of stock.")
-
-        # Check if item already exists in cart
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart, 
-            product=product_obj, 
-            defaults={'quantity': quantity}
-        )
-
-        if not created:
-            cart_item.quantity += quantity
-            cart_item.save()
-        
+        with transaction.atomic():
+            # One increment (or insert) in the database, safe against
+            # concurrent adds of the same product.
+            cart_item = CartItem.objects.add(cart, product_id, quantity)
+
+            # Hold the line's new quantity against stock other carts hold.
+            try:
+                hold_stock(cart, {product_id: cart_item.quantity})
+            except InsufficientStock:
+                raise serializers.ValidationError("Product is not available or out of stock.")
+
         serializer.instance = cart_item
 
+class CartBatchView(generics.GenericAPIView):
+    """
+    Apply a list of add / set / remove operations to the cart in one
+    transaction and return the updated cart.
+    """
+    serializer_class = CartBatchSerializer
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        cart, created = Cart.objects.get_or_create(user=request.user)
+        apply_cart_operations(cart, serializer.validated_data['operations'])
+        cart = Cart.objects.with_contents().get(pk=cart.pk)
+        return Response(CartSerializer(cart, context=self.get_serializer_context()).data)
+
 class CartItemDetailView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = CartItemSerializer
     permission_classes = [IsAuthenticated]
-    queryset = CartItem.objects.all()
+    queryset = CartItem.objects.select_related('product')
     lookup_url_kwarg = 'pk'
 
     def get_queryset(self):
         return self.queryset.filter(cart__user=self.request.user)
 
+    def perform_update(self, serializer):
+        item = serializer.instance
+        product_id = serializer.validated_data.get('product_id', item.product_id)
+        quantity = serializer.validated_data.get('quantity', item.quantity)
+        holds = {item.product_id: 0, product_id: quantity}
+        duplicate = serializers.ValidationError({'product_id': ["This product is already in the cart."]})
+        if product_id != item.product_id and item.cart.items.filter(product_id=product_id).exists():
+            raise duplicate
+        try:
+            with transaction.atomic():
+                try:
+                    hold_stock(item.cart, holds)
+                except InsufficientStock:
+                    raise serializers.ValidationError("Not enough stock available.")
+                serializer.save()
+        except IntegrityError:
+            # Another request added the product since the check above.
+            raise duplicate
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            hold_stock(instance.cart, {instance.product_id: 0})
+            instance.delete()
+
 class CartClearView(generics.GenericAPIView):
     permission_classes = [IsAuthenticated]
 
     def delete(self, request, *args, **kwargs):
         cart = Cart.objects.get(user=request.user)
-        cart.items.all().delete()
+        with transaction.atomic():
+            release_cart(cart)
+            cart.items.all().delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class GuestCartView(generics.GenericAPIView):
+    """
+    Cart for anonymous visitors, kept in the cache under the token sent in
+    the `X-Guest-Cart` header. POST takes the same operations as the batch
+    endpoint and starts a new guest cart when there is no valid token; the
+    token is returned with the cart.
+    """
+    serializer_class = CartBatchSerializer
+    permission_classes = [AllowAny]
+
+    def get_guest_cart(self):
+        guest = GuestCart.load(get_guest_token(self.request))
+        if guest is None:
+            raise NotFound('Guest cart not found or expired.')
+        return guest
+
+    def get(self, request, *args, **kwargs):
+        return Response(self.get_guest_cart().to_representation())
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        guest = GuestCart.load(get_guest_token(request)) or GuestCart()
+        guest.apply(serializer.validated_data['operations'])
+        return Response(guest.to_representation())
+
+    def delete(self, request, *args, **kwargs):
+        self.get_guest_cart().delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
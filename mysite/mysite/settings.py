@@ -117,6 +117,42 @@ DATABASES = {
     }
 }
 
+# =========================================================
+# CACHE
+# (Local memory by default — any Django cache backend works)
+# =========================================================
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "mysite-default",
+    }
+}
+
+# Catalog responses are invalidated on every Product/Category change,
+# so the timeout only bounds how long unused entries linger.
+CATALOG_CACHE_ALIAS = "default"
+CATALOG_CACHE_TIMEOUT = 60 * 15
+
+# Anonymous carts live only in the cache (cart.guest); the TTL slides on
+# every change.
+GUEST_CART_CACHE_ALIAS = "default"
+GUEST_CART_TTL = 60 * 60 * 24 * 7
+
+# Cart lines hold their stock this long after their last change; run
+# `manage.py release_expired_reservations --loop` to give expired holds back.
+CART_RESERVATION_TTL = 60 * 15
+
+# Upper edges of the price histogram on the facets endpoint.
+CATALOG_PRICE_BUCKETS = [25, 50, 100, 200, 500]
+
+# =========================================================
+# PRODUCT SEARCH
+# ("auto" uses SQLite FTS5 when available, else the inverted index)
+# =========================================================
+
+PRODUCT_SEARCH_BACKEND = os.environ.get("PRODUCT_SEARCH_BACKEND", "auto")
+
 # =========================================================
 # PASSWORD VALIDATION
 # =========================================================
@@ -156,6 +192,46 @@ REST_FRAMEWORK = {
     ),
 }
 
+# Render hot list endpoints from .values() rows (store.fastpath)
+# instead of instantiating models for every row.
+FAST_LIST_SERIALIZATION = True
+
+# =========================================================
+# IDEMPOTENCY
+# (Idempotency-Key on order and payment creation, see orders.idempotency)
+# =========================================================
+
+IDEMPOTENCY_KEY_TTL = 60 * 60 * 24
+# How long a retry waits for the first request with its key to finish.
+IDEMPOTENCY_WAIT_TIMEOUT = 10
+# A claimed key whose request never answered is taken over after this.
+IDEMPOTENCY_LOCK_TIMEOUT = 60
+
+# =========================================================
+# CHECKOUT
+# ("async" queues checkouts for `manage.py run_checkout_worker`,
+#  see orders.checkout_queue)
+# =========================================================
+
+CHECKOUT_MODE = os.environ.get("CHECKOUT_MODE", "sync")
+# Checkouts a worker places per transaction.
+CHECKOUT_BATCH_SIZE = 50
+# Seconds an idle worker waits before looking at the queue again.
+CHECKOUT_POLL_INTERVAL = 0.2
+# A batch rolled back on a locked database is retried after a wait drawn
+# from 0 to this times 2**retry, capped at the max (checkout and Stripe
+# event workers, see orders.workers).
+QUEUE_RETRY_BACKOFF = 0.005
+QUEUE_RETRY_MAX_BACKOFF = 1
+
+# =========================================================
+# ORDER ARCHIVAL
+# (manage.py archive_orders, see orders.archive)
+# =========================================================
+
+# Completed and canceled orders older than this move to the archive tables.
+ORDER_ARCHIVE_AFTER_DAYS = 365
+
 # =========================================================
 # JWT
 # =========================================================
@@ -174,6 +250,28 @@ SIMPLE_JWT = {
 STRIPE_SECRET_KEY = os.environ.get("STRIPE_SECRET_KEY", "")
 STRIPE_CURRENCY = "usd"
 
+# Client behaviour, see payments.gateway.
+STRIPE_API_BASE = os.environ.get("STRIPE_API_BASE", "https://api.stripe.com")
+STRIPE_CONNECT_TIMEOUT = 2
+STRIPE_READ_TIMEOUT = 10
+STRIPE_POOL_SIZE = 10
+STRIPE_MAX_RETRIES = 2
+# Retry waits are drawn from 0 to this times 2**retry, capped at the max.
+STRIPE_RETRY_BACKOFF = 0.25
+STRIPE_RETRY_MAX_BACKOFF = 2
+# Consecutive failed calls that open the circuit, and how long it stays open.
+STRIPE_CIRCUIT_FAILURE_THRESHOLD = 5
+STRIPE_CIRCUIT_RESET_TIMEOUT = 30
+
+# Webhooks (`manage.py process_stripe_events`, see payments.webhooks).
+STRIPE_WEBHOOK_SECRET = os.environ.get("STRIPE_WEBHOOK_SECRET", "")
+# Seconds a webhook signature stays valid.
+STRIPE_WEBHOOK_TOLERANCE = 300
+# Events a worker processes per transaction.
+STRIPE_WEBHOOK_BATCH_SIZE = 500
+# Seconds an idle worker waits before looking for new events again.
+STRIPE_WEBHOOK_POLL_INTERVAL = 0.5
+
 # =========================================================
 # CORS (RENDER + LOCAL FRONTEND)
 # =========================================================
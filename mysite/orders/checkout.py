@@ -0,0 +1,134 @@
+"""
+Checkout: turn users' carts into orders.
+
+The pipeline runs a fixed number of queries whatever the number and size
+of the carts checked out together:
+
+1. lock the carts, then read their lines joined to the carts and their
+   products in one query;
+2. decrement the stock of every product in one conditional UPDATE
+   (cart.reservations.consume_carts_stock), converting the carts' holds;
+3. insert the orders with one bulk_create, then all of their items with
+   another;
+4. add the orders to the sales rollups (orders.rollups);
+5. delete the carts.
+
+Everything runs in one transaction, so a shortfall on any product leaves
+the stock, the carts and the order tables untouched. When several carts
+are checked out together and some product runs short, the carts that
+want it are set aside and placed one at a time after the others, so a
+cart that cannot be filled fails only its own checkout.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from cart.models import CENTS, Cart, CartItem
+from cart.reservations import InsufficientStock, consume_carts_stock
+from .models import Order, OrderItem
+from .rollups import record_orders_created
+
+
+def place_order(user, shipping_address):
+    """
+    Create a pending order from `user`'s cart and empty the cart. Raise a
+    ValidationError if the cart is missing, empty or short of stock.
+    """
+    result, = place_orders([(user, shipping_address)])
+    if isinstance(result, serializers.ValidationError):
+        raise result
+    return result
+
+
+def place_orders(checkouts):
+    """
+    Check out several carts at once; `checkouts` holds `(user, shipping
+    address)` pairs, one per user. Return, for each checkout in turn, its
+    pending order or the ValidationError that place_order() would raise.
+    """
+    results = [None] * len(checkouts)
+    with transaction.atomic():
+        users = [user for user, _ in checkouts]
+        # Touching the carts first takes their row locks (the write lock on
+        # SQLite), so checkouts and edits of the same cart queue up here.
+        touched = Cart.objects.filter(user__in=users).update(updated_at=timezone.now())
+        lines = defaultdict(list)
+        for line in (
+            CartItem.objects.filter(cart__user__in=users)
+            .select_related('cart', 'product')
+            .only('quantity', 'cart__user', 'product__name', 'product__price')
+            .order_by('pk')
+        ):
+            lines[line.cart.user_id].append(line)
+
+        placing = []
+        for index, (user, shipping_address) in enumerate(checkouts):
+            if lines[user.pk]:
+                placing.append((index, user, shipping_address, lines[user.pk]))
+            elif touched:
+                results[index] = serializers.ValidationError("Cannot create an order with an empty cart.")
+            else:
+                results[index] = serializers.ValidationError("User does not have a cart.")
+
+        deferred = []
+        while placing:
+            try:
+                consume_carts_stock({
+                    cart_lines[0].cart: {line.product_id: line.quantity for line in cart_lines}
+                    for _, _, _, cart_lines in placing
+                })
+                break
+            except InsufficientStock as exc:
+                if len(placing) == 1:
+                    index = placing.pop()[0]
+                    results[index] = serializers.ValidationError(
+                        "Not enough stock available for some items in the cart."
+                    )
+                    break
+                short = set(exc.product_ids)
+                wanting = [
+                    checkout for checkout in placing
+                    if any(line.product_id in short for line in checkout[3])
+                ]
+                if not wanting:
+                    raise
+                deferred += wanting
+                placing = [checkout for checkout in placing if checkout not in wanting]
+
+        orders = Order.objects.bulk_create([
+            Order(
+                user=user,
+                shipping_address=shipping_address,
+                total_amount=sum(line.item_total for line in cart_lines).quantize(CENTS),
+                status='pending',
+            )
+            for _, user, shipping_address, cart_lines in placing
+        ])
+        # Product data is snapshotted so later catalog edits don't rewrite history.
+        items = [
+            [
+                OrderItem(
+                    order=order,
+                    product_name=line.product.name,
+                    price=line.product.price,
+                    quantity=line.quantity,
+                )
+                for line in cart_lines
+            ]
+            for order, (_, _, _, cart_lines) in zip(orders, placing)
+        ]
+        OrderItem.objects.bulk_create([item for order_items in items for item in order_items])
+        record_orders_created(zip(orders, items))
+        if placing:
+            Cart.objects.filter(pk__in=[cart_lines[0].cart_id for _, _, _, cart_lines in placing]).delete()
+        for order, (index, _, _, _) in zip(orders, placing):
+            results[index] = order
+
+        for index, user, shipping_address, _ in sorted(deferred, key=lambda checkout: checkout[0]):
+            try:
+                results[index] = place_order(user, shipping_address)
+            except serializers.ValidationError as exc:
+                results[index] = exc
+    return results
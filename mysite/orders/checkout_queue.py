@@ -0,0 +1,142 @@
+"""
+Asynchronous checkout for flash-sale traffic.
+
+With CHECKOUT_MODE = "async", `POST /api/orders/orders/` only validates the
+request and queues a CheckoutJob, answering 202 with the job. The client
+polls `GET /api/orders/checkout-jobs/{id}/` until the job has succeeded
+(and names its order) or failed. Workers (`manage.py run_checkout_worker`)
+place the queued checkouts with orders.checkout.place_orders.
+
+A worker takes up to CHECKOUT_BATCH_SIZE jobs per transaction:
+
+1. claim them with one UPDATE, which also takes the write lock on SQLite,
+
+       UPDATE orders_checkoutjob SET worker = <batch>
+       WHERE status = 'queued' AND id IN (SELECT id ... ORDER BY id LIMIT <n>)
+
+2. place all of their orders together with orders.checkout.place_orders:
+   one stock UPDATE for every cart in the batch, then the orders and
+   their items with one bulk_create each. A cart that is short of stock
+   fails only its own job;
+3. record every outcome with one bulk UPDATE and commit.
+
+Should placing the batch together fail for any other reason, its jobs are
+placed again one at a time, each in its own savepoint, so the error fails
+only the job that causes it.
+
+Under contention, checkouts then cost one transaction (and one commit)
+per batch instead of one per order, and requests never wait for the write
+lock. A worker that dies mid-batch rolls the whole batch back and leaves
+its jobs queued for the next one.
+
+A job checks out the cart as it is when a worker reaches it. A user has
+at most one queued job; queueing again returns that job.
+"""
+import logging
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from cart.models import CartItem
+from . import workers
+from .checkout import place_order, place_orders
+from .models import CheckoutJob, Order
+
+logger = logging.getLogger(__name__)
+
+SYNC = 'sync'
+ASYNC = 'async'
+
+
+def get_checkout_mode():
+    return getattr(settings, 'CHECKOUT_MODE', SYNC)
+
+
+def get_batch_size():
+    return getattr(settings, 'CHECKOUT_BATCH_SIZE', 50)
+
+
+def get_poll_interval():
+    return getattr(settings, 'CHECKOUT_POLL_INTERVAL', 0.2)
+
+
+def enqueue_checkout(user, shipping_address):
+    """
+    Queue a checkout of `user`'s cart, or return the one already queued.
+    Raise a ValidationError if the cart is empty.
+    """
+    if not CartItem.objects.filter(cart__user=user).exists():
+        raise serializers.ValidationError("Cannot create an order with an empty cart.")
+    while True:
+        try:
+            with transaction.atomic():
+                return CheckoutJob.objects.create(user=user, shipping_address=shipping_address)
+        except IntegrityError:
+            pass
+        job = CheckoutJob.objects.filter(user=user, status=CheckoutJob.QUEUED).first()
+        if job is not None:
+            return job
+        # Processed since the insert failed; try again.
+
+
+def _place_one(job):
+    """
+    Place one job's order on its own. Return the order or the
+    ValidationError it failed with.
+    """
+    try:
+        return place_order(job.user, job.shipping_address)
+    except serializers.ValidationError as exc:
+        return exc
+    except OperationalError:
+        raise
+    except Exception:
+        # place_order's savepoint was rolled back; the rest of the batch
+        # goes ahead.
+        logger.exception('Checkout job %s failed', job.pk)
+        return serializers.ValidationError(['Checkout failed.'])
+
+
+def process_batch(batch_size=None):
+    """
+    Place up to `batch_size` queued checkouts, oldest first, in one
+    transaction. Return how many jobs were processed.
+    """
+    batch_size = batch_size or get_batch_size()
+    worker = workers.batch_name()
+    with transaction.atomic():
+        queued = CheckoutJob.objects.filter(status=CheckoutJob.QUEUED)
+        claimed = queued.filter(pk__in=queued.order_by('pk').values('pk')[:batch_size]).update(worker=worker)
+        if not claimed:
+            return 0
+        jobs = list(queued.filter(worker=worker).select_related('user', 'shipping_address').order_by('pk'))
+        try:
+            # place_orders runs in a savepoint; a failure rolls back only it.
+            results = place_orders([(job.user, job.shipping_address) for job in jobs])
+        except OperationalError:
+            # Lock contention and lost connections are not the jobs' fault;
+            # the whole batch is rolled back and retried.
+            raise
+        except Exception:
+            logger.exception('Checkout batch %s failed; placing its jobs one at a time', worker)
+            results = [_place_one(job) for job in jobs]
+        now = timezone.now()
+        for job, result in zip(jobs, results):
+            if isinstance(result, Order):
+                job.order, job.status = result, CheckoutJob.SUCCEEDED
+            else:
+                job.status, job.error = CheckoutJob.FAILED, result.detail
+            job.finished_at = now
+        CheckoutJob.objects.bulk_update(jobs, ['status', 'order', 'error', 'finished_at'])
+    return len(jobs)
+
+
+def run_worker(batch_size=None, poll_interval=None, stop=None, drain=False):
+    """
+    Process batches as orders.workers.run_worker does. Return how many
+    jobs were processed.
+    """
+    poll_interval = get_poll_interval() if poll_interval is None else poll_interval
+    return workers.run_worker(process_batch, batch_size, poll_interval, stop=stop, drain=drain)
@@ -0,0 +1,183 @@
+"""
+`Idempotency-Key` support for POST endpoints that must not run twice.
+
+A client that may retry a request sends a unique `Idempotency-Key` header.
+The first request with a key claims it by inserting an IdempotencyKey row
+(the unique constraint on user, scope and key makes the claim atomic across
+workers), runs the view and stores its response. Retries get that response
+back, marked with `Idempotent-Replayed: true`, without running the view.
+The body, status and STORED_HEADERS (e.g. the Location of a queued
+checkout) are replayed.
+
+- A retry that arrives while the first request is still running waits for
+  its response (up to IDEMPOTENCY_WAIT_TIMEOUT seconds), then gets a 409.
+- Reusing a key for a different request body is rejected with a 422.
+- Only responses below 500 are stored. Raised errors (validation failures
+  included) and server errors release the key, so a retry runs again.
+- By default the view runs in one transaction with the saving of its
+  response. Views that call out to another service (e.g. Stripe) use
+  `atomic=False` instead, so no transaction, and on SQLite no write lock,
+  is held during the call. Their response is saved once the view returns.
+  Such views must be safe to run again if saving fails, e.g. by passing an
+  idempotency key on to the service.
+- Keys expire IDEMPOTENCY_KEY_TTL seconds after the first request; run
+  `manage.py purge_idempotency_keys` to delete expired rows. A claim whose
+  request never answered is taken over after IDEMPOTENCY_LOCK_TIMEOUT.
+"""
+import functools
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+# Response headers stored with a response and replayed with it.
+STORED_HEADERS = ('Location',)
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+POLL_INTERVAL = 0.05
+DEFAULT_PURGE_BATCH_SIZE = 1000
+
+
+def get_key_ttl():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+
+
+def get_lock_timeout():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_LOCK_TIMEOUT', 60))
+
+
+def get_wait_timeout():
+    return getattr(settings, 'IDEMPOTENCY_WAIT_TIMEOUT', 10)
+
+
+def fingerprint(request):
+    payload = json.dumps(
+        [request.method, request.path, request.data], sort_keys=True, cls=DjangoJSONEncoder
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def claim(user, scope, key, digest):
+    """
+    Return (row, True) if this request now owns `key`, or the live row of
+    an earlier request and False.
+    """
+    while True:
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                row = IdempotencyKey.objects.create(
+                    user=user, scope=scope, key=key, fingerprint=digest,
+                    created_at=now, expires_at=now + get_key_ttl(),
+                )
+            return row, True
+        except IntegrityError:
+            pass
+        row = IdempotencyKey.objects.filter(user=user, scope=scope, key=key).first()
+        if row is None:
+            # Released since the insert failed; try again.
+            continue
+        abandoned = not row.completed and row.created_at <= now - get_lock_timeout()
+        if row.expires_at <= now or abandoned:
+            # Only one of several racing requests deletes the row; they all
+            # retry the insert and one of them wins it.
+            IdempotencyKey.objects.filter(pk=row.pk).delete()
+            continue
+        return row, False
+
+
+def _save_response(row, response):
+    if response.status_code < 500:
+        row.status_code = response.status_code
+        row.response = response.data
+        row.headers = {name: response[name] for name in STORED_HEADERS if response.has_header(name)}
+        row.save(update_fields=['status_code', 'response', 'headers'])
+
+
+def _run(row, handler, view, request, *args, atomic=True, **kwargs):
+    try:
+        if atomic:
+            # The response is stored in the same transaction as the view's
+            # writes, so a key is never released after they committed, nor
+            # left in flight.
+            with transaction.atomic():
+                response = handler(view, request, *args, **kwargs)
+                _save_response(row, response)
+        else:
+            response = handler(view, request, *args, **kwargs)
+            _save_response(row, response)
+    except BaseException:
+        row.delete()
+        raise
+    if response.status_code >= 500:
+        row.delete()
+    return response
+
+
+def idempotent(scope, atomic=True):
+    """
+    Decorate a view's POST handler so that requests from the same user with
+    the same `Idempotency-Key` run it at most once. Requests without the
+    header are handled as before. With `atomic=False` the handler runs
+    outside a transaction (see the module docstring).
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(view, request, *args, **kwargs):
+            key = request.META.get(HEADER)
+            if key is None or not request.user.is_authenticated:
+                return handler(view, request, *args, **kwargs)
+            if not key or len(key) > MAX_KEY_LENGTH:
+                return Response(
+                    {'detail': f'Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters long.'},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            digest = fingerprint(request)
+            deadline = time.monotonic() + get_wait_timeout()
+            while True:
+                row, claimed = claim(request.user, scope, key, digest)
+                if claimed:
+                    return _run(row, handler, view, request, *args, atomic=atomic, **kwargs)
+                if row.fingerprint != digest:
+                    return Response(
+                        {'detail': 'This Idempotency-Key was already used for a different request.'},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    )
+                if row.completed:
+                    return Response(
+                        row.response, status=row.status_code, headers={**row.headers, REPLAYED_HEADER: 'true'}
+                    )
+                if time.monotonic() >= deadline:
+                    return Response(
+                        {'detail': 'A request with this Idempotency-Key is still being processed.'},
+                        status=status.HTTP_409_CONFLICT,
+                    )
+                time.sleep(POLL_INTERVAL)
+        return wrapper
+    return decorator
+
+
+def purge_expired(batch_size=DEFAULT_PURGE_BATCH_SIZE, now=None):
+    """
+    Delete up to `batch_size` expired keys and return how many were deleted.
+    """
+    now = now or timezone.now()
+    ids = list(
+        IdempotencyKey.objects.filter(expires_at__lte=now)
+        .order_by('expires_at').values_list('pk', flat=True)[:batch_size]
+    )
+    if not ids:
+        return 0
+    deleted, _ = IdempotencyKey.objects.filter(pk__in=ids, expires_at__lte=now).delete()
+    return deleted
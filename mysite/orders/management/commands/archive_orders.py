@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from orders.archive import DEFAULT_BATCH_SIZE, archive_orders, get_archive_age
+
+
+class Command(BaseCommand):
+    help = 'Move old completed and canceled orders to the archive tables, one batch per transaction.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int,
+                            help='Archive orders created more than this many days ago '
+                                 '(default: ORDER_ARCHIVE_AFTER_DAYS).')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--max-batches', type=int,
+                            help='Stop after this many batches; the next run continues from there.')
+
+    def handle(self, *args, **options):
+        age = options['older_than_days']
+        age = get_archive_age() if age is None else timedelta(days=age)
+        before = timezone.now() - age
+
+        def progress(total):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Archived {total} orders so far.')
+
+        total = archive_orders(
+            before, batch_size=options['batch_size'], max_batches=options['max_batches'], on_progress=progress
+        )
+        self.stdout.write(f'Archived {total} orders created before {before:%Y-%m-%d %H:%M}.')
@@ -0,0 +1,47 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from orders.models import ArchivedOrder, Order
+from orders.rollups import DEFAULT_BACKFILL_DAYS, backfill
+
+
+def parse_day(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f'Expected a YYYY-MM-DD date, got {value!r}.')
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily sales rollups from orders, one batch of days per transaction.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=parse_day,
+                            help='First day to rebuild (default: the day of the first order, archived or not).')
+        parser.add_argument('--until', type=parse_day, help='Last day to rebuild (default: today).')
+        parser.add_argument('--batch-days', type=int, default=DEFAULT_BACKFILL_DAYS)
+
+    def handle(self, *args, **options):
+        first = options['since']
+        if first is None:
+            oldest = [
+                model.objects.order_by('created_at').values_list('created_at', flat=True).first()
+                for model in (ArchivedOrder, Order)
+            ]
+            oldest = min((created_at for created_at in oldest if created_at), default=None)
+            if oldest is None:
+                self.stdout.write('No orders to roll up.')
+                return
+            first = timezone.localdate(oldest)
+        last = options['until'] or timezone.localdate()
+        if last < first:
+            raise CommandError('--until is before --since.')
+
+        def progress(day, until):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Rebuilt {day} to {until}.')
+
+        backfill(first, last, batch_days=options['batch_days'], on_progress=progress)
+        self.stdout.write(f'Rebuilt sales rollups from {first} to {last}.')
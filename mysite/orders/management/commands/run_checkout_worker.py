@@ -0,0 +1,54 @@
+import functools
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from orders.checkout_queue import get_batch_size, get_poll_interval, run_worker
+
+
+class Command(BaseCommand):
+    help = 'Place queued checkouts (CHECKOUT_MODE = "async") with a pool of worker threads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=get_batch_size())
+        parser.add_argument('--poll-interval', type=float, default=get_poll_interval(),
+                            help='Seconds an idle worker waits before looking at the queue again.')
+        parser.add_argument('--drain', action='store_true', help='Exit once the queue is empty.')
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        run = functools.partial(
+            run_worker, options['batch_size'], options['poll_interval'], stop=stop, drain=options['drain'],
+        )
+        if options['workers'] == 1:
+            try:
+                processed = run()
+            except KeyboardInterrupt:
+                # The batch in hand was rolled back and stays queued.
+                processed = 0
+            self.stdout.write(f'Processed {processed} checkout jobs.')
+            return
+
+        processed = []
+
+        def work():
+            try:
+                processed.append(run())
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=work, daemon=True) for _ in range(options['workers'])]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                while worker.is_alive():
+                    worker.join(0.5)
+        except KeyboardInterrupt:
+            # Workers finish the batch in hand.
+            stop.set()
+            for worker in workers:
+                worker.join()
+        self.stdout.write(f'Processed {sum(processed)} checkout jobs.')
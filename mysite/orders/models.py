@@ -1,8 +1,13 @@
-from django.db import models
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.utils import timezone
 from users.models import Address
 
-class Order(models.Model):
+class BaseOrder(models.Model):
+    """
+    Fields shared by live orders and archived ones (see orders.archive).
+    """
     STATUS_CHOICES = (
         ('pending', 'Pending'),
         ('paid', 'Paid'),
@@ -21,11 +26,179 @@ class Order(models.Model):
     def __str__(self):
         return f'Order {self.id} by {self.user.username}'
 
-class OrderItem(models.Model):
-    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
+    class Meta:
+        abstract = True
+
+class Order(BaseOrder):
+    # Allowed status changes; completed and canceled orders are final.
+    TRANSITIONS = {
+        'pending': ('paid', 'canceled'),
+        'paid': ('shipped', 'canceled'),
+        'shipped': ('completed',),
+        'completed': (),
+        'canceled': (),
+    }
+
+    @classmethod
+    def sources_of(cls, status):
+        """
+        The statuses an order may move to `status` from.
+        """
+        return [source for source, targets in cls.TRANSITIONS.items() if status in targets]
+
+    def can_transition_to(self, status):
+        return status in self.TRANSITIONS[self.status]
+
+    class Meta:
+        indexes = [
+            # id breaks created_at ties in the same direction for keyset pages.
+            models.Index(fields=['user', '-created_at', '-id'], name='orders_user_created_idx'),
+            models.Index(fields=['status', 'created_at'], name='orders_status_created_idx'),
+            # Unfiltered and date-range admin listings, keyset paginated on (created_at, id).
+            models.Index(fields=['created_at', 'id'], name='orders_created_id_idx'),
+        ]
+
+class BaseOrderItem(models.Model):
     product_name = models.CharField(max_length=255)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     quantity = models.PositiveIntegerField()
 
     def __str__(self):
-        return f'{self.quantity} of {self.product_name} in Order {self.order.id}'
+        return f'{self.quantity} of {self.product_name} in Order {self.order_id}'
+
+    class Meta:
+        abstract = True
+
+class OrderItem(BaseOrderItem):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
+
+class ArchivedOrder(BaseOrder):
+    """
+    A completed or canceled order moved out of orders_order by
+    orders.archive. It keeps its id, so links to it stay valid.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='archived_orders')
+    shipping_address = models.ForeignKey(Address, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # Copied from the live order, not set on save.
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='orders_arch_user_created_idx'),
+            models.Index(fields=['status', 'created_at'], name='orders_arch_status_created_idx'),
+            models.Index(fields=['created_at', 'id'], name='orders_arch_created_id_idx'),
+        ]
+
+class ArchivedOrderItem(BaseOrderItem):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='items')
+
+class CheckoutJob(models.Model):
+    """
+    A checkout queued by `POST /api/orders/` when CHECKOUT_MODE is "async",
+    placed later by a worker (see orders.checkout_queue).
+    """
+    QUEUED = 'queued'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    )
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='checkout_jobs')
+    shipping_address = models.ForeignKey(Address, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED)
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    error = models.JSONField(null=True, blank=True)
+    # The worker batch that processed the job.
+    worker = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'Checkout job {self.id} for user {self.user_id}: {self.status}'
+
+    class Meta:
+        constraints = [
+            # One checkout in the queue per user; repeats get that job back.
+            models.UniqueConstraint(
+                fields=['user'], condition=models.Q(status='queued'), name='orders_checkout_job_queued_uniq'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'id'], name='orders_checkout_job_queue_idx'),
+        ]
+
+class IdempotencyKey(models.Model):
+    """
+    The first response to a request sent with an `Idempotency-Key` header,
+    replayed to retries of that request (see orders.idempotency). The
+    response is empty while the first request is still in flight.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    scope = models.CharField(max_length=50)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    # Response headers replayed along with the body, e.g. Location.
+    headers = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.scope} {self.key} for user {self.user_id}'
+
+    @property
+    def completed(self):
+        return self.status_code is not None
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'scope', 'key'], name='orders_idempotency_key_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='orders_idempotency_expiry_idx'),
+        ]
+
+class DailySales(models.Model):
+    """
+    Orders and revenue per day (of `Order.created_at`) and current status,
+    kept up to date by orders.rollups.
+    """
+    date = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    # Signed, so a late correction can never fail on a constraint.
+    order_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f'{self.date} {self.status}: {self.order_count} orders, {self.revenue}'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'status'], name='orders_daily_sales_uniq'),
+        ]
+
+class DailyProductSales(models.Model):
+    """
+    Units and revenue per day and product name over orders that are not
+    canceled, kept up to date by orders.rollups.
+    """
+    date = models.DateField()
+    product_name = models.CharField(max_length=255)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f'{self.date} {self.product_name}: {self.units} units'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'product_name'], name='orders_daily_product_sales_uniq'),
+        ]
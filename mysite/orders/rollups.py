@@ -0,0 +1,211 @@
+"""
+Sales rollups for revenue and product analytics.
+
+DailySales (orders and revenue per day and status) and DailyProductSales
+(units and revenue per day and product name, canceled orders excluded) are
+small enough for the admin analytics endpoints to read in milliseconds.
+They are kept up to date in the same transaction as the change they record:
+
+- record_orders_created() when checkout creates orders;
+- record_status_changes() when orders change status, one at a time or in
+  bulk (orders.transitions).
+
+Each call adds its deltas with one statement per table,
+
+    INSERT INTO ... VALUES (...), (...)
+    ON CONFLICT (date, status) DO UPDATE SET order_count = order_count + excluded.order_count, ...
+
+(the same syntax on SQLite and PostgreSQL), so recording costs the same
+however many orders or lines are involved. Orders changed any other way,
+e.g. in the Django admin, are not seen; `manage.py backfill_sales_rollups`
+recomputes any range of days from the orders themselves, archived ones
+included.
+
+Days are calendar days of `Order.created_at` in TIME_ZONE.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderItem, DailyProductSales, DailySales, Order, OrderItem
+
+CANCELED = 'canceled'
+DEFAULT_BACKFILL_DAYS = 31
+# Rows per INSERT, well inside SQLite's bound parameter limit.
+UPSERT_BATCH_SIZE = 500
+
+
+def _increment(model, key_fields, value_fields, deltas):
+    """
+    Add `deltas` ({key tuple: value tuple}) to the rollup rows, creating
+    missing rows.
+    """
+    rows = [(*key, *values) for key, values in deltas.items() if any(values)]
+    if not rows:
+        return
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    fields = [model._meta.get_field(name) for name in (*key_fields, *value_fields)]
+    columns = ', '.join(quote(field.column) for field in fields)
+    row_sql = '(' + ', '.join(['%s'] * len(fields)) + ')'
+    conflict = ', '.join(quote(model._meta.get_field(name).column) for name in key_fields)
+    updates = ', '.join(
+        f'{quote(column)} = {table}.{quote(column)} + excluded.{quote(column)}'
+        for column in (model._meta.get_field(name).column for name in value_fields)
+    )
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            chunk = rows[start:start + UPSERT_BATCH_SIZE]
+            params = [
+                field.get_db_prep_save(value, connection)
+                for row in chunk
+                for field, value in zip(fields, row)
+            ]
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) VALUES {", ".join([row_sql] * len(chunk))} '
+                f'ON CONFLICT ({conflict}) DO UPDATE SET {updates}',
+                params,
+            )
+
+
+def _add_sales(deltas):
+    _increment(DailySales, ('date', 'status'), ('order_count', 'revenue'), deltas)
+
+
+def _add_product_sales(deltas):
+    _increment(DailyProductSales, ('date', 'product_name'), ('units', 'revenue'), deltas)
+
+
+def _pair():
+    return [0, Decimal('0.00')]
+
+
+def record_order_created(order, items):
+    """
+    Count a new order and its items (OrderItem instances).
+    """
+    record_orders_created([(order, items)])
+
+
+def record_orders_created(orders):
+    """
+    Count new orders; `orders` holds `(order, items)` pairs.
+    """
+    sales, products = defaultdict(_pair), defaultdict(_pair)
+    for order, items in orders:
+        date = timezone.localdate(order.created_at)
+        sales[(date, order.status)][0] += 1
+        sales[(date, order.status)][1] += order.total_amount
+        if order.status == CANCELED:
+            continue
+        for item in items:
+            totals = products[(date, item.product_name)]
+            totals[0] += item.quantity
+            totals[1] += item.price * item.quantity
+    _add_sales(sales)
+    _add_product_sales(products)
+
+
+def record_status_changes(changes, status):
+    """
+    Move orders between statuses in the rollups. `changes` holds
+    `(order id, created_at, total_amount, previous status)` for every order
+    that was moved to `status`.
+    """
+    sales = defaultdict(_pair)
+    canceled = []
+    for pk, created_at, total_amount, previous in changes:
+        if previous == status:
+            continue
+        date = timezone.localdate(created_at)
+        sales[(date, previous)][0] -= 1
+        sales[(date, previous)][1] -= total_amount
+        sales[(date, status)][0] += 1
+        sales[(date, status)][1] += total_amount
+        if status == CANCELED:
+            canceled.append(pk)
+    _add_sales(sales)
+
+    if canceled:
+        # Canceled orders no longer count as units sold.
+        products = defaultdict(_pair)
+        items = OrderItem.objects.filter(order_id__in=canceled).values_list(
+            'order__created_at', 'product_name', 'quantity', 'price'
+        )
+        for created_at, product_name, quantity, price in items:
+            totals = products[(timezone.localdate(created_at), product_name)]
+            totals[0] -= quantity
+            totals[1] -= price * quantity
+        _add_product_sales(products)
+
+
+def _day_bounds(first, last):
+    tz = timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.combine(first, time.min), tz),
+        timezone.make_aware(datetime.combine(last + timedelta(days=1), time.min), tz),
+    )
+
+
+def backfill(first, last, batch_days=DEFAULT_BACKFILL_DAYS, on_progress=None):
+    """
+    Recompute the rollups for the days `first` to `last` (inclusive) from
+    live and archived orders and their items, `batch_days` days per
+    transaction.
+    """
+    line_total = ExpressionWrapper(
+        F('price') * F('quantity'), output_field=DecimalField(max_digits=14, decimal_places=2)
+    )
+    day = first
+    while day <= last:
+        until = min(last, day + timedelta(days=batch_days - 1))
+        lower, upper = _day_bounds(day, until)
+        sales, products = defaultdict(_pair), defaultdict(_pair)
+        with transaction.atomic():
+            DailySales.objects.filter(date__range=(day, until)).delete()
+            DailyProductSales.objects.filter(date__range=(day, until)).delete()
+
+            for order_model, item_model in ((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem)):
+                rows = (
+                    order_model.objects.filter(created_at__gte=lower, created_at__lt=upper)
+                    .annotate(date=TruncDate('created_at'))
+                    .values('date', 'status')
+                    .annotate(order_count=Count('id'), revenue=Sum('total_amount'))
+                    .order_by()
+                )
+                for row in rows:
+                    totals = sales[(row['date'], row['status'])]
+                    totals[0] += row['order_count']
+                    totals[1] += row['revenue']
+
+                rows = (
+                    item_model.objects.filter(order__created_at__gte=lower, order__created_at__lt=upper)
+                    .exclude(order__status=CANCELED)
+                    .annotate(date=TruncDate('order__created_at'))
+                    .values('date', 'product_name')
+                    .annotate(units=Sum('quantity'), revenue=Sum(line_total))
+                    .order_by()
+                )
+                for row in rows:
+                    totals = products[(row['date'], row['product_name'])]
+                    totals[0] += row['units']
+                    totals[1] += row['revenue']
+
+            DailySales.objects.bulk_create(
+                (DailySales(date=date, status=status, order_count=count, revenue=revenue)
+                 for (date, status), (count, revenue) in sales.items()),
+                batch_size=UPSERT_BATCH_SIZE,
+            )
+            DailyProductSales.objects.bulk_create(
+                (DailyProductSales(date=date, product_name=name, units=units, revenue=revenue)
+                 for (date, name), (units, revenue) in products.items()),
+                batch_size=UPSERT_BATCH_SIZE,
+            )
+        if on_progress:
+            on_progress(day, until)
+        day = until + timedelta(days=1)
@@ -1,9 +1,10 @@
 from rest_framework import serializers
-from django.db import transaction
-from .models import Order, OrderItem
+from .checkout import place_order
+from .checkout_queue import enqueue_checkout
+from .models import ArchivedOrder, ArchivedOrderItem, CheckoutJob, Order, OrderItem
 from users.models import Address
-from cart.models import Cart, CartItem
 from users.serializers import AddressSerializer
+from store.fieldsets import SparseFieldsetMixin
 
 class OrderItemSerializer(serializers.ModelSerializer):
     """
@@ -13,19 +14,36 @@ class OrderItemSerializer(serializers.ModelSerializer):
         model = OrderItem
         fields = ['id', 'product_name', 'price', 'quantity']
 
-class OrderReadSerializer(serializers.ModelSerializer):
+class OrderReadSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer for reading and displaying Orders.
     Includes nested representations for items and shipping address.
+    Supports `?fields=` / `?omit=` sparse fieldsets.
     """
     items = OrderItemSerializer(many=True, read_only=True)
     shipping_address = AddressSerializer(read_only=True)
     user = serializers.StringRelatedField()
+    # Read by store.fastpath in place of str(order.user).
+    fast_lookups = {'user': 'user__username'}
 
     class Meta:
         model = Order
         fields = ['id', 'user', 'status', 'total_amount', 'shipping_address', 'items', 'created_at', 'updated_at']
 
+class ArchivedOrderItemSerializer(OrderItemSerializer):
+    class Meta(OrderItemSerializer.Meta):
+        model = ArchivedOrderItem
+
+class ArchivedOrderReadSerializer(OrderReadSerializer):
+    """
+    OrderReadSerializer for orders moved to the archive (see orders.archive).
+    """
+    items = ArchivedOrderItemSerializer(many=True, read_only=True)
+
+    class Meta(OrderReadSerializer.Meta):
+        model = ArchivedOrder
+        fields = OrderReadSerializer.Meta.fields + ['archived_at']
+
 class OrderCreateSerializer(serializers.Serializer):
     """
     Serializer for creating a new Order from the user's cart.
@@ -46,58 +64,30 @@ class OrderCreateSerializer(serializers.Serializer):
         if not request or not hasattr(request, 'user'):
             raise serializers.ValidationError("Request context is missing for validation.")
         
-        if address.user != request.user:
+        if address.profile.user_id != request.user.id:
             raise serializers.ValidationError("The provided shipping address does not belong to the current user.")
         return address
 
     def create(self, validated_data):
         """
-        Create an order using an atomic transaction.
-        - Fetches the user's cart.
-        - Calculates the total amount.
-        - Creates the Order and OrderItem instances.
-        - Clears the user's cart.
+        Create the order from the user's cart; see orders.checkout.
         """
         request = self.context.get('request')
-        user = request.user
-        shipping_address = validated_data['address_id']
-
-        try:
-            cart = Cart.objects.get(user=user)
-            cart_items = cart.items.all()
-        except Cart.DoesNotExist:
-            raise serializers.ValidationError("User does not have a cart.")
-
-        if not cart_items.exists():
-            raise serializers.ValidationError("Cannot create an order with an empty cart.")
-
-        # Calculate total amount from cart items
-        total_amount = sum(item.product.price * item.quantity for item in cart_items)
+        return place_order(request.user, validated_data['address_id'])
 
-        with transaction.atomic():
-            # Create the Order
-            order = Order.objects.create(
-                user=user,
-                shipping_address=shipping_address,
-                total_amount=total_amount,
-                status='pending'  # Default status
-            )
-
-            # Create OrderItems by snapshotting product data
-            order_items_to_create = [
-                OrderItem(
-                    order=order,
-                    product_name=item.product.name,
-                    price=item.product.price,
-                    quantity=item.quantity,
-                )
-                for item in cart_items
-            ]
-            OrderItem.objects.bulk_create(order_items_to_create)
-
-            # Clear the cart
-            cart.items.all().delete()
-            cart.delete()
+    def enqueue(self):
+        """
+        Queue the checkout for a worker instead; see orders.checkout_queue.
+        """
+        request = self.context.get('request')
+        return enqueue_checkout(request.user, self.validated_data['address_id'])
 
-        return order
+class CheckoutJobSerializer(serializers.ModelSerializer):
+    """
+    A queued checkout and, once a worker has placed it, its order or error.
+    """
+    url = serializers.HyperlinkedIdentityField(view_name='checkout-job-detail')
 
+    class Meta:
+        model = CheckoutJob
+        fields = ['id', 'url', 'status', 'order', 'error', 'created_at', 'finished_at']
@@ -1,3 +1,632 @@
-from django.test import TestCase
+import threading
+import time
+import unittest
+from unittest import mock
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+from rest_framework.exceptions import ValidationError
+from cart.models import Cart, CartItem
+from cart.reservations import hold_stock
+from store.cache import get_catalog_cache
+from store.models import Category, Product
+from store.testing import QueryPlanMixin
+from users.models import Address
+from . import workers
+from .checkout import place_order
+from .checkout_queue import process_batch, run_worker
+from .idempotency import REPLAYED_HEADER
+from .archive import archive_orders
+from .models import ArchivedOrder, ArchivedOrderItem, CheckoutJob, DailyProductSales, DailySales, IdempotencyKey, Order, OrderItem
+from .rollups import backfill
 
-# Create your tests here.
+User = get_user_model()
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite syntax')
+class OrderQueryPlanTests(QueryPlanMixin, APITestCase):
+    """
+    The order history, live and archived, must be read from an index in
+    page order, as OrderViewSet queries it.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(username='planner', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('order-list')
+
+    def test_user_order_history(self):
+        order = Order.objects.create(user=self.user, total_amount=10)
+        OrderItem.objects.create(order=order, product_name='Mug', price=10, quantity=1)
+        history, = self.capture_queries('orders_order', self.client.get, self.url)
+        self.assertUsesIndex(history, ordered=True)
+        items, = self.capture_queries('orders_orderitem', self.client.get, self.url)
+        self.assertUsesIndex(items)
+
+    def test_archived_order_history(self):
+        history, = self.capture_queries('orders_archivedorder', self.client.get, self.url, {'archived': 'true'})
+        self.assertUsesIndex(history, ordered=True)
+
+class OrderReadTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='reader', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.address = Address.objects.create(
+            profile=self.user.profile, address_line_1='1 Main St', city='Springfield',
+            state='IL', postal_code='62701', country='US'
+        )
+        for i in range(3):
+            order = Order.objects.create(
+                user=self.user, shipping_address=self.address, total_amount=30
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product_name=f'Item {n}', price=10, quantity=1)
+                for n in range(3)
+            ])
+        self.orders_url = reverse('order-list')
+
+    def test_list_runs_a_fixed_number_of_queries(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(self.orders_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(response.data[0]['user'], 'reader')
+        self.assertEqual(len(response.data[0]['items']), 3)
+        self.assertEqual(response.data[0]['shipping_address']['city'], 'Springfield')
+
+    def test_sparse_fields_skip_unrendered_relations(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.orders_url, {'fields': 'status,total_amount'})
+        self.assertEqual(set(response.data[0]), {'id', 'status', 'total_amount'})
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('users_address', queries[0]['sql'])
+
+    def test_fast_path_matches_serializer_output(self):
+        with override_settings(FAST_LIST_SERIALIZATION=False):
+            expected = self.client.get(self.orders_url)
+        actual = self.client.get(self.orders_url)
+        self.assertEqual(actual.content, expected.content)
+
+    def test_omit_items(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.orders_url, {'omit': 'items'})
+        self.assertNotIn('items', response.data[0])
+        self.assertIn('shipping_address', response.data[0])
+
+class CheckoutTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.address = Address.objects.create(
+            profile=self.user.profile, address_line_1='1 Main St', city='Springfield',
+            state='IL', postal_code='62701', country='US'
+        )
+        self.category = Category.objects.create(name='Checkout Category')
+        self.cart = Cart.objects.get(user=self.user)
+        self.url = reverse('order-list')
+
+    def fill_cart(self, lines, stock=5):
+        products = Product.objects.bulk_create([
+            Product(name=f'Line {i}', slug=f'line-{i}', category=self.category,
+                    price=Decimal('2.50'), stock_quantity=stock)
+            for i in range(lines)
+        ])
+        CartItem.objects.bulk_create([
+            CartItem(cart=self.cart, product=product, quantity=2) for product in products
+        ])
+        # Half of the lines hold their stock, the other half's holds expired.
+        hold_stock(self.cart, {product.pk: 2 for product in products[::2]})
+        return products
+
+    def checkout(self):
+        return self.client.post(self.url, {'address_id': self.address.id}, format='json')
+
+    def test_query_count_does_not_grow_with_the_cart(self):
+        for lines in (1, 25):
+            self.cart = Cart.objects.get_or_create(user=self.user)[0]
+            products = self.fill_cart(lines)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.checkout()
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(Decimal(response.data['total_amount']), Decimal('5.00') * lines)
+            self.assertEqual(len(response.data['items']), lines)
+            if lines == 1:
+                baseline = len(queries)
+            else:
+                self.assertEqual(len(queries), baseline)
+            Product.objects.filter(pk__in=[p.pk for p in products]).delete()
+
+    def test_stock_is_decremented_and_holds_converted(self):
+        products = self.fill_cart(3)
+        self.assertEqual(self.checkout().status_code, status.HTTP_201_CREATED)
+        stock = set(Product.objects.filter(pk__in=[p.pk for p in products])
+                    .values_list('stock_quantity', 'reserved_quantity'))
+        self.assertEqual(stock, {(3, 0)})
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+
+    def test_checkout_refreshes_cached_product_pages(self):
+        get_catalog_cache().clear()
+        product = self.fill_cart(1)[0]
+        url = reverse('product-detail', kwargs={'pk': product.pk})
+        before = self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.checkout().status_code, status.HTTP_201_CREATED)
+        after = self.client.get(url)
+        self.assertEqual(after['X-Cache'], 'MISS')
+        self.assertEqual(after.data['stock_quantity'], 3)
+        self.assertNotEqual(after['ETag'], before['ETag'])
+        stale = self.client.get(url, HTTP_IF_NONE_MATCH=before['ETag'])
+        self.assertEqual(stale.status_code, status.HTTP_200_OK)
+
+    def test_shortfall_on_one_product_changes_nothing(self):
+        products = self.fill_cart(3)
+        Product.objects.filter(pk=products[1].pk).update(stock_quantity=1)
+        response = self.checkout()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        stock = list(Product.objects.filter(pk__in=[p.pk for p in products])
+                     .order_by('pk').values_list('stock_quantity', 'reserved_quantity'))
+        self.assertEqual(stock, [(5, 2), (1, 0), (5, 2)])
+        self.assertEqual(self.cart.items.count(), 3)
+        self.assertFalse(Order.objects.exists())
+
+    def test_order_is_counted_in_the_sales_rollups(self):
+        self.fill_cart(2)
+        self.assertEqual(self.checkout().status_code, status.HTTP_201_CREATED)
+        today = timezone.localdate()
+        self.assertEqual(list(DailySales.objects.values_list('date', 'status', 'order_count', 'revenue')),
+                         [(today, 'pending', 1, Decimal('10.00'))])
+        self.assertEqual(
+            sorted(DailyProductSales.objects.values_list('product_name', 'units', 'revenue')),
+            [('Line 0', 2, Decimal('5.00')), ('Line 1', 2, Decimal('5.00'))],
+        )
+
+    def test_empty_cart_is_rejected(self):
+        response = self.checkout()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class CheckoutContentionTests(TransactionTestCase):
+    """
+    More buyers than stock check out at once; exactly the stock is sold.
+    """
+    buyers = 30
+    stock = 10
+
+    def setUp(self):
+        category = Category.objects.create(name='Drop')
+        self.product = Product.objects.create(
+            name='Limited Print', category=category, price=20, stock_quantity=self.stock
+        )
+        self.buyers_and_addresses = []
+        for i in range(self.buyers):
+            user = User.objects.create_user(username=f'buyer{i}')
+            # Lines without a hold, so only checkout stands between them and the stock.
+            CartItem.objects.create(cart=Cart.objects.get(user=user), product=self.product, quantity=1)
+            address = Address.objects.create(
+                profile=user.profile, address_line_1='1 Main St', city='Springfield',
+                state='IL', postal_code='62701', country='US'
+            )
+            self.buyers_and_addresses.append((user, address))
+
+    def test_concurrent_checkouts_never_oversell(self):
+        placed, refused, lock = [], [], threading.Lock()
+
+        def buyer(user, address):
+            try:
+                while True:
+                    try:
+                        order = place_order(user, address)
+                    except ValidationError:
+                        with lock:
+                            refused.append(user.pk)
+                    except OperationalError:
+                        # SQLite reports write contention instead of waiting.
+                        time.sleep(0.001)
+                        continue
+                    else:
+                        with lock:
+                            placed.append(order.pk)
+                    break
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=buyer, args=pair) for pair in self.buyers_and_addresses]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.product.refresh_from_db()
+        self.assertEqual(len(placed), self.stock)
+        self.assertEqual(len(refused), self.buyers - self.stock)
+        self.assertEqual(self.product.stock_quantity, 0)
+        self.assertEqual(OrderItem.objects.count(), self.stock)
+
+class IdempotentOrderCreateTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='retrier', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.address = Address.objects.create(
+            profile=self.user.profile, address_line_1='1 Main St', city='Springfield',
+            state='IL', postal_code='62701', country='US'
+        )
+        product = Product.objects.create(
+            name='Umbrella', category=Category.objects.create(name='Rain'), price=12, stock_quantity=5
+        )
+        CartItem.objects.create(cart=Cart.objects.get(user=self.user), product=product, quantity=1)
+        self.url = reverse('order-list')
+
+    def post(self, key, address_id=None):
+        return self.client.post(
+            self.url, {'address_id': address_id or self.address.id}, format='json',
+            HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_retry_replays_the_first_response(self):
+        first = self.post('order-1')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        retry = self.post('order-1')
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry[REPLAYED_HEADER], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(Order.objects.count(), 1)
+
+    @override_settings(CHECKOUT_MODE='async')
+    def test_replayed_queued_checkout_keeps_its_location(self):
+        first = self.post('order-1')
+        self.assertEqual(first.status_code, status.HTTP_202_ACCEPTED)
+        retry = self.post('order-1')
+        self.assertEqual(retry.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(retry[REPLAYED_HEADER], 'true')
+        self.assertEqual(retry['Location'], first['Location'])
+
+    def test_keys_are_scoped_to_the_user(self):
+        self.post('order-1')
+        other = User.objects.create_user(username='other')
+        self.client.force_authenticate(user=other)
+        response = self.post('order-1')
+        # Runs for real: the other user has no cart to order from.
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(response.has_header(REPLAYED_HEADER))
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        self.post('order-1')
+        other_address = Address.objects.create(
+            profile=self.user.profile, address_line_1='2 Side St', city='Springfield',
+            state='IL', postal_code='62701', country='US'
+        )
+        response = self.post('order-1', address_id=other_address.id)
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_errors_release_the_key(self):
+        Product.objects.update(stock_quantity=0)
+        self.assertEqual(self.post('order-1').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        Product.objects.update(stock_quantity=5)
+        self.assertEqual(self.post('order-1').status_code, status.HTTP_201_CREATED)
+
+    @override_settings(IDEMPOTENCY_WAIT_TIMEOUT=0)
+    def test_in_flight_duplicate_gets_a_conflict(self):
+        self.post('order-1')
+        # As if the first request were still running.
+        IdempotencyKey.objects.update(status_code=None, response=None)
+        self.assertEqual(self.post('order-1').status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_abandoned_and_expired_keys_are_reclaimed(self):
+        stale = timezone.now() - timedelta(days=2)
+        IdempotencyKey.objects.create(
+            user=self.user, scope='orders.create', key='order-1', fingerprint='x',
+            status_code=201, response={}, created_at=stale, expires_at=stale + timedelta(days=1),
+        )
+        self.assertEqual(self.post('order-1').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_purge_deletes_expired_keys(self):
+        self.post('order-1')
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        out = StringIO()
+        call_command('purge_idempotency_keys', stdout=out)
+        self.assertIn('Deleted 1 expired', out.getvalue())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+class IdempotentOrderCreateConcurrencyTests(TransactionTestCase):
+    """
+    Duplicates sent at the same time wait for the first request and get its
+    response; only one order is created.
+    """
+    duplicates = 6
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='double-tapper')
+        self.address = Address.objects.create(
+            profile=self.user.profile, address_line_1='1 Main St', city='Springfield',
+            state='IL', postal_code='62701', country='US'
+        )
+        product = Product.objects.create(
+            name='Kettle', category=Category.objects.create(name='Kitchen'), price=30, stock_quantity=5
+        )
+        CartItem.objects.create(cart=Cart.objects.get(user=self.user), product=product, quantity=1)
+
+    def test_concurrent_duplicates_create_one_order(self):
+        responses, lock = [], threading.Lock()
+
+        def send():
+            client = APIClient()
+            client.force_authenticate(user=self.user)
+            try:
+                while True:
+                    try:
+                        response = client.post(
+                            reverse('order-list'), {'address_id': self.address.id}, format='json',
+                            HTTP_IDEMPOTENCY_KEY='double-tap',
+                        )
+                    except OperationalError:
+                        # SQLite reports write contention instead of waiting.
+                        time.sleep(0.001)
+                        continue
+                    break
+                with lock:
+                    responses.append(response)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=send) for _ in range(self.duplicates)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual({response.status_code for response in responses}, {status.HTTP_201_CREATED})
+        self.assertEqual(len({response.json()['id'] for response in responses}), 1)
+
+@override_settings(ORDER_ARCHIVE_AFTER_DAYS=90)
+class OrderArchiveTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='veteran', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        old = timezone.now() - timedelta(days=200)
+        self.orders = {}
+        for status_ in ('completed', 'canceled', 'shipped'):
+            order = Order.objects.create(user=self.user, status=status_, total_amount=Decimal('7.50'))
+            OrderItem.objects.create(order=order, product_name=f'{status_} mug', price=Decimal('2.50'), quantity=3)
+            self.orders[status_] = order
+        Order.objects.update(created_at=old)
+        self.recent = Order.objects.create(user=self.user, status='completed', total_amount=Decimal('1.00'))
+
+    def test_only_old_final_orders_move(self):
+        self.assertEqual(archive_orders(), 2)
+        self.assertEqual(
+            sorted(ArchivedOrder.objects.values_list('pk', flat=True)),
+            sorted([self.orders['completed'].pk, self.orders['canceled'].pk]),
+        )
+        self.assertEqual(
+            set(Order.objects.values_list('pk', flat=True)), {self.orders['shipped'].pk, self.recent.pk}
+        )
+        archived = ArchivedOrder.objects.get(pk=self.orders['completed'].pk)
+        self.assertEqual(archived.created_at, Order.objects.get(pk=self.orders['shipped'].pk).created_at)
+        self.assertEqual(list(archived.items.values_list('product_name', 'quantity')), [('completed mug', 3)])
+        self.assertFalse(OrderItem.objects.filter(order_id=archived.pk).exists())
+
+    def test_batches_resume(self):
+        self.assertEqual(archive_orders(batch_size=1, max_batches=1), 1)
+        self.assertEqual(ArchivedOrder.objects.count(), 1)
+        out = StringIO()
+        call_command('archive_orders', '--batch-size', '1', stdout=out)
+        self.assertIn('Archived 1 orders', out.getvalue())
+        self.assertEqual(ArchivedOrder.objects.count(), 2)
+        self.assertEqual(ArchivedOrderItem.objects.count(), 2)
+
+    def test_archived_orders_are_readable(self):
+        archive_orders()
+        pk = self.orders['completed'].pk
+        response = self.client.get(reverse('order-detail', args=[pk]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'completed')
+        self.assertEqual(response.data['items'][0]['product_name'], 'completed mug')
+        self.assertIn('archived_at', response.data)
+
+        response = self.client.get(reverse('order-list'))
+        self.assertEqual({row['id'] for row in response.data}, {self.orders['shipped'].pk, self.recent.pk})
+        response = self.client.get(reverse('order-list'), {'archived': 'true'})
+        self.assertEqual({row['id'] for row in response.data},
+                         {pk, self.orders['canceled'].pk})
+        self.assertEqual(response.data[0]['items'][0]['quantity'], 3)
+
+        other = User.objects.create_user(username='stranger')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(reverse('order-detail', args=[pk])).status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+    def test_backfill_counts_archived_orders(self):
+        day = timezone.localdate(Order.objects.get(pk=self.orders['shipped'].pk).created_at)
+        backfill(day, day)
+        before = sorted(DailySales.objects.values_list('status', 'order_count', 'revenue'))
+        archive_orders()
+        backfill(day, day)
+        self.assertEqual(sorted(DailySales.objects.values_list('status', 'order_count', 'revenue')), before)
+        self.assertEqual(
+            sorted(DailyProductSales.objects.values_list('product_name', 'units')),
+            [('completed mug', 3), ('shipped mug', 3)],
+        )
+
+@override_settings(CHECKOUT_MODE='async')
+class AsyncCheckoutTests(APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Queue Category')
+        self.product = Product.objects.create(
+            name='Sneaker', category=self.category, price=Decimal('40.00'), stock_quantity=1
+        )
+        self.user, self.address = self.buyer('first')
+        self.client.force_authenticate(user=self.user)
+
+    def buyer(self, username, quantity=1):
+        user = User.objects.create_user(username=username)
+        address = Address.objects.create(
+            profile=user.profile, address_line_1='1 Main St', city='Springfield',
+            state='IL', postal_code='62701', country='US'
+        )
+        CartItem.objects.create(cart=Cart.objects.get(user=user), product=self.product, quantity=quantity)
+        return user, address
+
+    def checkout(self, user=None, address=None):
+        if user is not None:
+            self.client.force_authenticate(user=user)
+        return self.client.post(
+            reverse('order-list'), {'address_id': (address or self.address).id}, format='json'
+        )
+
+    def test_checkout_is_queued_and_placed_by_a_worker(self):
+        response = self.checkout()
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], 'queued')
+        self.assertIsNone(response.data['order'])
+        self.assertEqual(response['Location'], response.data['url'])
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.checkout().data['id'], response.data['id'])
+
+        self.assertEqual(process_batch(), 1)
+        job = self.client.get(response.data['url']).data
+        self.assertEqual(job['status'], 'succeeded')
+        order = Order.objects.get()
+        self.assertEqual(job['order'], order.pk)
+        self.assertEqual(order.shipping_address, self.address)
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+        self.assertEqual(process_batch(), 0)
+
+    def test_a_short_cart_fails_only_its_own_job(self):
+        late_user, late_address = self.buyer('second')
+        first = self.checkout().data['id']
+        second = self.checkout(late_user, late_address).data['id']
+        self.assertEqual(run_worker(drain=True), 2)
+        jobs = {job.pk: job for job in CheckoutJob.objects.all()}
+        self.assertEqual(jobs[first].status, 'succeeded')
+        self.assertEqual(jobs[second].status, 'failed')
+        self.assertEqual(jobs[second].error, ['Not enough stock available for some items in the cart.'])
+        self.assertEqual(Order.objects.get().user, self.user)
+        self.assertEqual(CartItem.objects.filter(cart__user=late_user).count(), 1)
+
+    def test_a_batch_decrements_stock_once_and_inserts_orders_in_bulk(self):
+        self.product.stock_quantity = 3
+        self.product.save()
+        buyers = [self.buyer(f'bulk{i}') for i in range(2)]
+        self.checkout()
+        for user, address in buyers:
+            self.checkout(user, address)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(process_batch(), 3)
+        sql = [query['sql'] for query in queries]
+        self.assertEqual(len([q for q in sql if q.startswith('UPDATE "store_product"')]), 1)
+        self.assertEqual(len([q for q in sql if q.startswith('INSERT INTO "orders_order"')]), 1)
+        self.assertEqual(Order.objects.count(), 3)
+        self.assertEqual(Product.objects.get().stock_quantity, 0)
+        self.assertEqual(set(CheckoutJob.objects.values_list('status', flat=True)), {'succeeded'})
+
+    def test_a_failing_batch_is_placed_one_job_at_a_time(self):
+        late_user, late_address = self.buyer('second')
+        self.checkout()
+        self.checkout(late_user, late_address)
+        with mock.patch('orders.checkout_queue.place_orders', side_effect=RuntimeError('boom')), \
+                self.assertLogs('orders.checkout_queue', 'ERROR'):
+            self.assertEqual(process_batch(), 2)
+        self.assertEqual(
+            list(CheckoutJob.objects.order_by('pk').values_list('status', flat=True)), ['succeeded', 'failed']
+        )
+        self.assertEqual(Order.objects.get().user, self.user)
+
+    def test_empty_cart_is_rejected_up_front(self):
+        CartItem.objects.all().delete()
+        self.assertEqual(self.checkout().status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(CheckoutJob.objects.exists())
+
+    def test_jobs_are_private(self):
+        url = self.checkout().data['url']
+        self.client.force_authenticate(user=User.objects.create_user(username='nosy'))
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_worker_command_drains_the_queue(self):
+        self.checkout()
+        out = StringIO()
+        call_command('run_checkout_worker', '--drain', stdout=out)
+        self.assertIn('Processed 1 checkout jobs', out.getvalue())
+        self.assertEqual(CheckoutJob.objects.get().status, 'succeeded')
+
+@override_settings(QUEUE_RETRY_BACKOFF=0.001, QUEUE_RETRY_MAX_BACKOFF=0.002)
+class WorkerRetryTests(SimpleTestCase):
+    def test_lock_errors_are_retried_and_logged(self):
+        batches = mock.Mock(side_effect=[
+            OperationalError('database is locked'), OperationalError('database table is locked'), 3, 0,
+        ])
+        with self.assertLogs('orders.workers', 'WARNING') as logs:
+            self.assertEqual(workers.run_worker(batches, 10, 0, drain=True), 3)
+        self.assertEqual(batches.call_count, 4)
+        self.assertEqual(len(logs.records), 2)
+        self.assertIn('retry 2', logs.output[1])
+
+    def test_other_errors_stop_the_worker(self):
+        batches = mock.Mock(side_effect=OperationalError('no such table: orders_checkoutjob'))
+        with self.assertRaises(OperationalError):
+            workers.run_worker(batches, 10, 0, drain=True)
+        self.assertEqual(batches.call_count, 1)
+
+        batches = mock.Mock(side_effect=ValueError('bad job'))
+        with self.assertRaises(ValueError):
+            workers.run_worker(batches, 10, 0, drain=True)
+
+@override_settings(CHECKOUT_MODE='async')
+class CheckoutWorkerPoolTests(TransactionTestCase):
+    """
+    Several workers drain the queue at once; every job is placed exactly
+    once and exactly the stock is sold.
+    """
+    buyers = 30
+    stock = 20
+    workers = 4
+
+    def setUp(self):
+        product = Product.objects.create(
+            name='Drop Tee', category=Category.objects.create(name='Drop'), price=15, stock_quantity=self.stock
+        )
+        client = APIClient()
+        for i in range(self.buyers):
+            user = User.objects.create_user(username=f'queued{i}')
+            CartItem.objects.create(cart=Cart.objects.get(user=user), product=product, quantity=1)
+            address = Address.objects.create(
+                profile=user.profile, address_line_1='1 Main St', city='Springfield',
+                state='IL', postal_code='62701', country='US'
+            )
+            client.force_authenticate(user=user)
+            response = client.post(reverse('order-list'), {'address_id': address.id}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+    def test_pool_places_each_job_once(self):
+        def work():
+            try:
+                run_worker(batch_size=3, drain=True)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=work) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        statuses = Counter(CheckoutJob.objects.values_list('status', flat=True))
+        self.assertEqual(statuses, {'succeeded': self.stock, 'failed': self.buyers - self.stock})
+        self.assertEqual(Order.objects.count(), self.stock)
+        self.assertEqual(
+            set(CheckoutJob.objects.filter(status='succeeded').values_list('order__user', flat=True)),
+            set(Order.objects.values_list('user', flat=True)),
+        )
+        self.assertEqual(Product.objects.get().stock_quantity, 0)
@@ -0,0 +1,77 @@
+"""
+Set-based order status transitions.
+
+Orders are moved in chunks. Each chunk's transaction starts with a write
+that changes nothing,
+
+    UPDATE orders_order SET status = status
+    WHERE id IN (<chunk>) AND status IN (<statuses allowed to move to target>)
+
+so it takes the row locks (the write lock on SQLite) before anything is
+read, and a concurrent transition waits for it instead of failing on a lock
+upgrade. The chunk is then read, for the report and for the rollups, and the
+orders the state machine (Order.TRANSITIONS) allows to move are moved with
+one statement of the form
+
+    UPDATE orders_order SET status = <target>, updated_at = <now>
+    WHERE id IN (<moving>) AND status IN (<statuses allowed to move to target>)
+
+The moves are recorded in the sales rollups (orders.rollups).
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Order
+from .rollups import record_status_changes
+
+DEFAULT_CHUNK_SIZE = 500
+UPDATED = 'updated'
+UNCHANGED = 'unchanged'
+INVALID_TRANSITION = 'invalid_transition'
+NOT_FOUND = 'not_found'
+
+
+def transition_orders(order_ids, status, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Move the given orders to `status` where the state machine allows it.
+
+    Return a list with one `{'id', 'outcome', 'status'}` entry per distinct
+    id, in the order given. `status` is the order's status afterwards.
+    Orders already in `status` are left alone. Each chunk commits on its own.
+    """
+    order_ids = list(dict.fromkeys(order_ids))
+    sources = Order.sources_of(status)
+    results = {}
+    for start in range(0, len(order_ids), chunk_size):
+        chunk = order_ids[start:start + chunk_size]
+        with transaction.atomic():
+            Order.objects.filter(pk__in=chunk, status__in=sources).update(status=F('status'))
+            rows = list(
+                Order.objects.filter(pk__in=chunk)
+                .values_list('pk', 'created_at', 'total_amount', 'status')
+            )
+            moving = [row for row in rows if row[3] in sources]
+            if moving:
+                Order.objects.filter(pk__in=[row[0] for row in moving], status__in=sources).update(
+                    status=status, updated_at=timezone.now()
+                )
+                record_status_changes(moving, status)
+            for pk, created_at, total_amount, current in rows:
+                if current in sources:
+                    results[pk] = {'id': pk, 'outcome': UPDATED, 'status': status}
+                elif current == status:
+                    results[pk] = {'id': pk, 'outcome': UNCHANGED, 'status': current}
+                else:
+                    results[pk] = {'id': pk, 'outcome': INVALID_TRANSITION, 'status': current}
+    return [
+        results.get(pk, {'id': pk, 'outcome': NOT_FOUND, 'status': None})
+        for pk in order_ids
+    ]
+
+
+def summarize(results):
+    counts = Counter(result['outcome'] for result in results)
+    return {outcome: counts[outcome] for outcome in (UPDATED, UNCHANGED, INVALID_TRANSITION, NOT_FOUND)}
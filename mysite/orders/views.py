@@ -1,52 +1,99 @@
+from django.http import Http404
 from rest_framework import viewsets, mixins, status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from .models import Order
-from .serializers import OrderReadSerializer, OrderCreateSerializer
+from store.fastpath import FastListMixin
+from .archive import archive_requested
+from .checkout_queue import ASYNC, get_checkout_mode
+from .idempotency import idempotent
+from .models import CheckoutJob
+from .serializers import (
+    ArchivedOrderReadSerializer, CheckoutJobSerializer, OrderReadSerializer, OrderCreateSerializer,
+)
 
-class OrderViewSet(mixins.ListModelMixin,
+class OrderViewSet(FastListMixin,
+                   mixins.ListModelMixin,
                    mixins.RetrieveModelMixin,
                    mixins.CreateModelMixin,
                    viewsets.GenericViewSet):
     """
     A ViewSet for creating, listing, and retrieving orders.
 
-    - POST /api/orders/: Creates a new order from the user's cart.
+    - POST /api/orders/: Creates a new order from the user's cart, or with
+      CHECKOUT_MODE = "async" queues the checkout (see orders.checkout_queue).
     - GET /api/orders/: Lists all orders for the authenticated user.
-    - GET /api/orders/{id}/: Retrieves a specific order.
+      `?archived=true` lists the archived ones instead (see orders.archive).
+    - GET /api/orders/{id}/: Retrieves a specific order, live or archived.
     """
     permission_classes = [IsAuthenticated]
+    archived = False
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.archived = archive_requested(request)
 
     def get_serializer_class(self):
         """
         Return the appropriate serializer class based on the request action.
         - Use OrderCreateSerializer for the 'create' action.
-        - Use OrderReadSerializer for all other actions.
+        - Use OrderReadSerializer for all other actions, or
+          ArchivedOrderReadSerializer when reading the archive.
         """
         if self.action == 'create':
             return OrderCreateSerializer
+        if self.archived:
+            return ArchivedOrderReadSerializer
         return OrderReadSerializer
 
     def get_queryset(self):
         """
         This view should return a list of all the orders for the currently authenticated user.
-        We also prefetch related items to optimize performance and prevent N+1 queries.
+        Related rows are joined or prefetched only for the fields being rendered
+        (see `?fields=` / `?omit=`), which also prevents N+1 queries.
         """
-        return Order.objects.filter(user=self.request.user).prefetch_related(
-            'items', 'shipping_address'
-        ).order_by('-created_at')
+        serializer_class = ArchivedOrderReadSerializer if self.archived else OrderReadSerializer
+        queryset = serializer_class.Meta.model.objects.filter(user=self.request.user).order_by('-created_at')
+        return serializer_class.optimize_queryset(queryset, self.request)
 
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Look the order up in the archive when it is no longer live.
+        """
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            if self.archived:
+                raise
+        self.archived = True
+        return super().retrieve(request, *args, **kwargs)
+
+    @idempotent('orders.create')
     def create(self, request, *args, **kwargs):
         """
         Create an order using the OrderCreateSerializer.
         The serializer handles all the business logic, including validating the cart,
         calculating the total, snapshotting data, and clearing the cart.
+        Retries sent with the same `Idempotency-Key` header get the first response.
+        In async checkout mode the response is a 202 with the queued job.
         """
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        if get_checkout_mode() == ASYNC:
+            job = CheckoutJobSerializer(serializer.enqueue(), context={'request': request}).data
+            return Response(job, status=status.HTTP_202_ACCEPTED, headers={'Location': job['url']})
         order = serializer.save()
         
         # After creation, we want to return the detailed order view
         read_serializer = OrderReadSerializer(order, context={'request': request})
         headers = self.get_success_headers(read_serializer.data)
         return Response(read_serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+
+class CheckoutJobViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    GET /api/orders/checkout-jobs/{id}/: The status of a queued checkout.
+    """
+    serializer_class = CheckoutJobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return CheckoutJob.objects.filter(user=self.request.user)
@@ -0,0 +1,86 @@
+"""
+Polling workers for the database-backed queues: checkout jobs
+(orders.checkout_queue) and Stripe webhook events (payments.webhooks).
+
+A queue provides `process_batch(batch_size)`, which claims up to
+`batch_size` items under a `batch_name()`, processes them in one
+transaction and returns how many it processed. `run_worker` calls it in a
+loop.
+
+A batch that fails because the database is locked or busy (SQLite reports
+write contention instead of waiting; PostgreSQL reports lock timeouts and
+deadlocks) was rolled back whole, so it is simply tried again after a
+capped, jittered exponential backoff. Any other error stops the worker.
+"""
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+
+from django.conf import settings
+from django.db import OperationalError
+
+logger = logging.getLogger(__name__)
+
+
+def batch_name():
+    """
+    A name for one batch, unique across hosts, processes and batches.
+    """
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+def get_retry_backoff():
+    return getattr(settings, 'QUEUE_RETRY_BACKOFF', 0.005)
+
+
+def get_retry_max_backoff():
+    return getattr(settings, 'QUEUE_RETRY_MAX_BACKOFF', 1)
+
+
+def is_contention(exc):
+    """
+    Whether the OperationalError `exc` means the database was locked or
+    busy, as opposed to e.g. a lost connection or a broken query.
+    """
+    message = str(exc).lower()
+    return 'lock' in message or 'busy' in message
+
+
+def _wait(stop, seconds):
+    if stop is not None:
+        stop.wait(seconds)
+    else:
+        time.sleep(seconds)
+
+
+def run_worker(process_batch, batch_size, poll_interval, stop=None, drain=False):
+    """
+    Call `process_batch(batch_size)` until `stop` (a threading.Event) is
+    set, sleeping `poll_interval` seconds whenever the queue is empty. With
+    `drain`, return as soon as the queue is empty. Return how many items
+    were processed.
+    """
+    processed, retries = 0, 0
+    while stop is None or not stop.is_set():
+        try:
+            count = process_batch(batch_size)
+        except OperationalError as exc:
+            if not is_contention(exc):
+                raise
+            # Full jitter: uniform between 0 and the exponential backoff cap.
+            delay = random.uniform(0, min(get_retry_max_backoff(), get_retry_backoff() * 2 ** retries))
+            retries += 1
+            logger.warning('Batch failed on a locked database (%s); retry %d in %.3fs', exc, retries, delay)
+            _wait(stop, delay)
+            continue
+        retries = 0
+        processed += count
+        if count:
+            continue
+        if drain:
+            break
+        _wait(stop, poll_interval)
+    return processed
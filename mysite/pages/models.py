@@ -4,6 +4,7 @@ class Page(models.Model):
     slug = models.SlugField(primary_key=True, max_length=100)
     title = models.CharField(max_length=200)
     content = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.title
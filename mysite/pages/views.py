@@ -1,8 +1,9 @@
 from rest_framework import viewsets, mixins
+from store.conditional import ConditionalGetMixin
 from .models import Page, ContactMessage
 from .serializers import PageSerializer, ContactMessageSerializer
 
-class PageViewSet(viewsets.ReadOnlyModelViewSet):
+class PageViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Page.objects.all()
     serializer_class = PageSerializer
     lookup_field = 'slug'
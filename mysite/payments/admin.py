@@ -1,3 +1,9 @@
 from django.contrib import admin
+from .models import StripeEvent
 
-# Register your models here.
+@admin.register(StripeEvent)
+class StripeEventAdmin(admin.ModelAdmin):
+    list_display = ('event_id', 'type', 'status', 'received_at', 'processed_at')
+    list_filter = ('status', 'type')
+    search_fields = ('event_id',)
+    readonly_fields = ('event_id', 'type', 'payload', 'worker', 'received_at', 'processed_at')
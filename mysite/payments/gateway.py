@@ -0,0 +1,290 @@
+"""
+The one way this project talks to Stripe.
+
+`get_gateway()` returns a process-wide StripeGateway. The gateway wraps a
+StripeClient with the following safeguards:
+
+- A shared keep-alive `requests` session with a bounded connection pool,
+  so calls reuse TLS connections instead of opening one each.
+- Separate connect and read timeouts (STRIPE_CONNECT_TIMEOUT and
+  STRIPE_READ_TIMEOUT), so a slow Stripe cannot hold a worker for long.
+- Up to STRIPE_MAX_RETRIES retries of connection errors, 429s and 5xx
+  responses. Waits grow exponentially from STRIPE_RETRY_BACKOFF with full
+  jitter, so retries from many workers do not arrive in step. Every call
+  carries an idempotency key, generated if the caller has none, so a retry
+  can never create a second object.
+- A circuit breaker. After STRIPE_CIRCUIT_FAILURE_THRESHOLD consecutive
+  failed calls it opens and rejects calls at once with GatewayUnavailable
+  for STRIPE_CIRCUIT_RESET_TIMEOUT seconds. It then lets one trial call
+  through and closes again if that call succeeds. Card declines and other
+  4xx answers show that Stripe is up, so they never open the circuit.
+- Per-process metrics (`stats.snapshot()`): calls, attempts, retries,
+  successes, 4xx answers, failures, timeouts, rejections and attempt
+  latency percentiles.
+
+STRIPE_API_BASE points the gateway at another server, e.g. a local fake
+Stripe in tests.
+"""
+import logging
+import random
+import threading
+import time
+import uuid
+from collections import deque
+
+import requests
+import stripe
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+LATENCY_WINDOW = 1000
+
+
+class GatewayUnavailable(Exception):
+    """
+    Raised without calling Stripe while the circuit is open.
+    """
+
+    def __init__(self, retry_after):
+        super().__init__('The payment provider is unavailable.')
+        self.retry_after = retry_after
+
+
+def is_transient(error):
+    """
+    Whether a Stripe error is worth retrying and counts against Stripe's
+    health: network failures, rate limiting and server errors.
+    """
+    if isinstance(error, stripe.error.APIConnectionError):
+        # False for TLS certificate failures, which a retry cannot fix.
+        return error.should_retry
+    if isinstance(error, stripe.error.RateLimitError):
+        return True
+    return isinstance(error, stripe.error.StripeError) and (error.http_status or 0) >= 500
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker, shared by the threads of a process.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == OPEN and self.clock() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+        return self._state
+
+    def acquire(self):
+        """
+        Raise GatewayUnavailable unless a call may go ahead now.
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return
+            if state == HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return
+            retry_after = self.reset_timeout
+            if self._opened_at is not None:
+                retry_after = max(0, self.reset_timeout - (self.clock() - self._opened_at))
+        raise GatewayUnavailable(retry_after)
+
+    def release(self):
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    logger.warning('Stripe circuit opened after %d failures', self._failures)
+                self._state = OPEN
+                self._opened_at = self.clock()
+
+
+class GatewayStats:
+    """
+    Per-process counters and recent attempt latencies for the gateway.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counts = dict.fromkeys(
+                ('calls', 'attempts', 'retries', 'successes', 'client_errors', 'failures', 'timeouts', 'rejected'),
+                0,
+            )
+            self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def increment(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def record_attempt(self, seconds):
+        with self._lock:
+            self.counts['attempts'] += 1
+            self.latencies.append(seconds * 1000)
+
+    def snapshot(self):
+        with self._lock:
+            counts = dict(self.counts)
+            latencies = sorted(self.latencies)
+
+        def percentile(fraction):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * fraction))], 2)
+
+        return {
+            **counts,
+            'latency_ms': {'p50': percentile(0.5), 'p95': percentile(0.95), 'p99': percentile(0.99)},
+        }
+
+
+class StripeGateway:
+    def __init__(self, api_key, api_base, connect_timeout, read_timeout, max_retries,
+                 backoff, max_backoff, pool_size, failure_threshold, reset_timeout,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.sleep = sleep
+        self.session = requests.Session()
+        # Retries are ours, so requests must not add its own.
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.client = stripe.StripeClient(
+            api_key,
+            base_addresses={'api': api_base},
+            http_client=stripe.RequestsClient(timeout=(connect_timeout, read_timeout), session=self.session),
+            max_network_retries=0,
+        )
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout, clock=clock)
+        self.stats = GatewayStats()
+
+    def retry_delay(self, retry):
+        """
+        Full jitter: uniform between 0 and the exponential backoff cap.
+        """
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** retry))
+
+    def call(self, operation, request):
+        """
+        Run `request()` (one Stripe API request) under the breaker with
+        retries, and return its result. Raise GatewayUnavailable while the
+        circuit is open, or the last Stripe error.
+        """
+        self.stats.increment('calls')
+        try:
+            self.breaker.acquire()
+        except GatewayUnavailable:
+            self.stats.increment('rejected')
+            raise
+        retry = 0
+        while True:
+            started = time.monotonic()
+            try:
+                result = request()
+            except stripe.error.StripeError as exc:
+                self.stats.record_attempt(time.monotonic() - started)
+                if isinstance(exc, stripe.error.APIConnectionError) and 'Timeout:' in str(exc):
+                    self.stats.increment('timeouts')
+                transient = is_transient(exc)
+                if not transient and not isinstance(exc, stripe.error.APIConnectionError):
+                    # Stripe answered; it is healthy even if the request was refused.
+                    self.stats.increment('client_errors')
+                    self.breaker.record_success()
+                    raise
+                if not transient or retry >= self.max_retries:
+                    logger.warning('Stripe %s failed after %d attempts: %s', operation, retry + 1, exc)
+                    self.stats.increment('failures')
+                    self.breaker.record_failure()
+                    raise
+                retry += 1
+                self.stats.increment('retries')
+                self.sleep(self.retry_delay(retry - 1))
+                continue
+            except Exception:
+                # Not Stripe's doing; let the next call be the trial.
+                self.breaker.release()
+                raise
+            self.stats.record_attempt(time.monotonic() - started)
+            self.stats.increment('successes')
+            self.breaker.record_success()
+            return result
+
+    def create_payment_intent(self, idempotency_key=None, **params):
+        options = {'idempotency_key': idempotency_key or f'gateway:{uuid.uuid4()}'}
+        return self.call(
+            'payment_intents.create',
+            lambda: self.client.payment_intents.create(params=params, options=options),
+        )
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def build_gateway():
+    return StripeGateway(
+        api_key=settings.STRIPE_SECRET_KEY,
+        api_base=getattr(settings, 'STRIPE_API_BASE', 'https://api.stripe.com'),
+        connect_timeout=getattr(settings, 'STRIPE_CONNECT_TIMEOUT', 2),
+        read_timeout=getattr(settings, 'STRIPE_READ_TIMEOUT', 10),
+        max_retries=getattr(settings, 'STRIPE_MAX_RETRIES', 2),
+        backoff=getattr(settings, 'STRIPE_RETRY_BACKOFF', 0.25),
+        max_backoff=getattr(settings, 'STRIPE_RETRY_MAX_BACKOFF', 2),
+        pool_size=getattr(settings, 'STRIPE_POOL_SIZE', 10),
+        failure_threshold=getattr(settings, 'STRIPE_CIRCUIT_FAILURE_THRESHOLD', 5),
+        reset_timeout=getattr(settings, 'STRIPE_CIRCUIT_RESET_TIMEOUT', 30),
+    )
+
+
+def get_gateway():
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = build_gateway()
+    return _gateway
+
+
+@receiver(setting_changed)
+def _reset_gateway(setting, **kwargs):
+    global _gateway
+    if setting.startswith('STRIPE_'):
+        with _gateway_lock:
+            _gateway = None
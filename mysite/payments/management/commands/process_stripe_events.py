@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from payments.webhooks import get_batch_size, get_poll_interval, run_worker
+
+
+class Command(BaseCommand):
+    help = 'Process stored Stripe webhook events, marking paid orders paid in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=get_batch_size())
+        parser.add_argument('--poll-interval', type=float, default=get_poll_interval(),
+                            help='Seconds an idle worker waits before looking for new events again.')
+        parser.add_argument('--drain', action='store_true', help='Exit once no events are waiting.')
+
+    def handle(self, *args, **options):
+        try:
+            processed = run_worker(options['batch_size'], options['poll_interval'], drain=options['drain'])
+        except KeyboardInterrupt:
+            # The batch in hand was rolled back and stays pending.
+            processed = 0
+        self.stdout.write(f'Processed {processed} Stripe events.')
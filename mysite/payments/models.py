@@ -1,3 +1,37 @@
 from django.db import models
 
-# Create your models here.
+
+class StripeEvent(models.Model):
+    """
+    A verified Stripe webhook event, stored as received and processed later
+    by payments.webhooks. Stripe's event id is unique, so redeliveries are
+    dropped on insert.
+    """
+    PENDING = 'pending'
+    PROCESSED = 'processed'
+    IGNORED = 'ignored'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (PROCESSED, 'Processed'),
+        (IGNORED, 'Ignored'),
+        (FAILED, 'Failed'),
+    )
+
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    error = models.TextField(blank=True)
+    # The worker batch that processed the event.
+    worker = models.CharField(max_length=100, blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'Stripe event {self.event_id} ({self.type}): {self.status}'
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='payments_event_queue_idx'),
+        ]
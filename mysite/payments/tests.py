@@ -1,3 +1,394 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import json
+import threading
+import time
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest import mock
+from urllib.parse import parse_qs
 
-# Create your tests here.
+import stripe
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from orders.idempotency import REPLAYED_HEADER
+from orders.models import IdempotencyKey, Order
+from .gateway import CLOSED, HALF_OPEN, OPEN, GatewayUnavailable, StripeGateway
+from .models import StripeEvent
+from .webhooks import process_batch
+
+User = get_user_model()
+
+
+class IdempotentPaymentIntentTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='payer', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.order = Order.objects.create(user=self.user, total_amount='19.99')
+        self.url = reverse('payments:stripe-create-intent')
+
+    def post(self, key):
+        return self.client.post(self.url, {'order_id': self.order.id}, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    @mock.patch('payments.gateway.StripeGateway.create_payment_intent')
+    def test_retry_does_not_create_a_second_intent(self, create):
+        create.return_value = mock.Mock(client_secret='pi_1_secret')
+        first = self.post('pay-1')
+        retry = self.post('pay-1')
+        self.assertEqual(create.call_count, 1)
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.json(), {'client_secret': 'pi_1_secret'})
+        self.assertEqual(retry[REPLAYED_HEADER], 'true')
+        self.assertEqual(create.call_args.kwargs['amount'], 1999)
+        self.assertTrue(create.call_args.kwargs['idempotency_key'].startswith(f'create-intent:{self.user.id}:'))
+
+    @mock.patch('payments.gateway.StripeGateway.create_payment_intent')
+    def test_stripe_errors_are_not_replayed(self, create):
+        create.side_effect = [stripe.error.APIConnectionError('timeout'), mock.Mock(client_secret='pi_2_secret')]
+        self.assertEqual(self.post('pay-2').status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        response = self.post('pay-2')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        # Both attempts carry the same key, so Stripe itself dedupes them.
+        keys = {call.kwargs['idempotency_key'] for call in create.call_args_list}
+        self.assertEqual(len(keys), 1)
+
+
+class PaymentIntentTransactionTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='payer')
+        self.order = Order.objects.create(user=self.user, total_amount='19.99')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    @mock.patch('payments.gateway.StripeGateway.create_payment_intent')
+    def test_stripe_is_called_outside_any_transaction(self, create):
+        in_transaction = []
+
+        def call_stripe(**kwargs):
+            in_transaction.append(connection.in_atomic_block)
+            return mock.Mock(client_secret='pi_1_secret')
+
+        create.side_effect = call_stripe
+        response = self.client.post(
+            reverse('payments:stripe-create-intent'), {'order_id': self.order.id},
+            format='json', HTTP_IDEMPOTENCY_KEY='pay-1',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(in_transaction, [False])
+        self.assertEqual(IdempotencyKey.objects.get().response, {'client_secret': 'pi_1_secret'})
+
+
+class FakeStripe:
+    """
+    A local HTTP server answering Stripe API requests from a script of
+    `(status, body, delay)` responses; once the script runs out it creates
+    PaymentIntents.
+    """
+
+    def __init__(self):
+        self.script = []
+        self.requests = []
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode()
+                fake.requests.append({
+                    'path': self.path,
+                    'params': parse_qs(body),
+                    'idempotency_key': self.headers.get('Idempotency-Key'),
+                    'client_port': self.client_address[1],
+                })
+                code, payload, delay = fake.script.pop(0) if fake.script else (200, None, 0)
+                time.sleep(delay)
+                payload = payload or {
+                    'id': f'pi_{len(fake.requests)}', 'object': 'payment_intent',
+                    'client_secret': f'pi_{len(fake.requests)}_secret',
+                }
+                data = json.dumps(payload).encode()
+                try:
+                    self.send_response(code)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except OSError:
+                    # The client timed out and went away.
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def fail(self, code, times=1, delay=0):
+        error_type = 'card_error' if code == 402 else 'api_error'
+        body = {'error': {'type': error_type, 'message': f'Fake {code}'}}
+        self.script.extend([(code, body, delay)] * times)
+
+
+class FakeStripeTestMixin:
+    def setUp(self):
+        super().setUp()
+        self.stripe = FakeStripe()
+        self.addCleanup(self.stripe.stop)
+
+
+class StripeGatewayTests(FakeStripeTestMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = 0.0
+        self.sleeps = []
+
+    def gateway(self, **options):
+        settings = dict(
+            api_key='sk_test_fake', api_base=self.stripe.url, connect_timeout=1, read_timeout=1,
+            max_retries=2, backoff=0.1, max_backoff=0.3, pool_size=2,
+            failure_threshold=2, reset_timeout=30,
+            clock=lambda: self.now, sleep=self.sleeps.append,
+        )
+        settings.update(options)
+        return StripeGateway(**settings)
+
+    def create(self, gateway, **params):
+        return gateway.create_payment_intent(amount=1999, currency='usd', **params)
+
+    def test_calls_share_a_keep_alive_connection(self):
+        gateway = self.gateway()
+        first = self.create(gateway, idempotency_key='key-1')
+        second = self.create(gateway)
+        self.assertEqual((first.client_secret, second.client_secret), ('pi_1_secret', 'pi_2_secret'))
+        self.assertEqual(len({request['client_port'] for request in self.stripe.requests}), 1)
+        self.assertEqual(self.stripe.requests[0]['params']['amount'], ['1999'])
+        self.assertEqual(self.stripe.requests[0]['idempotency_key'], 'key-1')
+        # Calls without a key still get one, so retries are safe.
+        self.assertTrue(self.stripe.requests[1]['idempotency_key'])
+
+    def test_server_errors_are_retried_with_the_same_key_and_jitter(self):
+        self.stripe.fail(500)
+        self.stripe.fail(503)
+        gateway = self.gateway()
+        self.assertEqual(self.create(gateway).client_secret, 'pi_3_secret')
+        self.assertEqual(len({request['idempotency_key'] for request in self.stripe.requests}), 1)
+        self.assertEqual(len(self.sleeps), 2)
+        self.assertTrue(0 <= self.sleeps[0] <= 0.1 and 0 <= self.sleeps[1] <= 0.2, self.sleeps)
+        stats = gateway.stats.snapshot()
+        self.assertEqual((stats['calls'], stats['attempts'], stats['retries'], stats['successes']), (1, 3, 2, 1))
+        self.assertIsNotNone(stats['latency_ms']['p99'])
+
+    def test_read_timeout_bounds_the_call(self):
+        self.stripe.fail(200, times=2, delay=1)
+        gateway = self.gateway(read_timeout=0.1, max_retries=1)
+        started = time.monotonic()
+        with self.assertRaises(stripe.error.APIConnectionError):
+            self.create(gateway)
+        self.assertLess(time.monotonic() - started, 0.9)
+        stats = gateway.stats.snapshot()
+        self.assertEqual((stats['timeouts'], stats['failures']), (2, 1))
+
+    def test_declines_are_not_retried_and_keep_the_circuit_closed(self):
+        self.stripe.fail(402, times=3)
+        gateway = self.gateway(failure_threshold=1)
+        for _ in range(3):
+            with self.assertRaises(stripe.error.CardError):
+                self.create(gateway)
+        self.assertEqual(len(self.stripe.requests), 3)
+        self.assertEqual(gateway.breaker.state, CLOSED)
+        self.assertEqual(gateway.stats.snapshot()['client_errors'], 3)
+
+    def test_circuit_opens_fails_fast_and_recovers(self):
+        self.stripe.fail(500, times=2)
+        gateway = self.gateway(max_retries=0)
+        for _ in range(2):
+            with self.assertRaises(stripe.error.APIError):
+                self.create(gateway)
+        self.assertEqual(gateway.breaker.state, OPEN)
+
+        self.now += 10
+        with self.assertRaises(GatewayUnavailable) as raised:
+            self.create(gateway)
+        self.assertEqual(raised.exception.retry_after, 20)
+        self.assertEqual(len(self.stripe.requests), 2)
+        self.assertEqual(gateway.stats.snapshot()['rejected'], 1)
+
+        self.now += 20
+        self.assertEqual(gateway.breaker.state, HALF_OPEN)
+        self.create(gateway)
+        self.assertEqual(gateway.breaker.state, CLOSED)
+
+    def test_failed_trial_reopens_the_circuit(self):
+        self.stripe.fail(500, times=3)
+        gateway = self.gateway(max_retries=0)
+        for _ in range(2):
+            with self.assertRaises(stripe.error.APIError):
+                self.create(gateway)
+        self.now += 30
+        with self.assertRaises(stripe.error.APIError):
+            self.create(gateway)
+        self.assertEqual(gateway.breaker.state, OPEN)
+        with self.assertRaises(GatewayUnavailable):
+            self.create(gateway)
+
+
+class PaymentIntentGatewayTests(FakeStripeTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='gateway-payer')
+        self.client.force_authenticate(user=self.user)
+        self.order = Order.objects.create(user=self.user, total_amount='19.99')
+        overrides = override_settings(
+            STRIPE_SECRET_KEY='sk_test_fake', STRIPE_API_BASE=self.stripe.url,
+            STRIPE_MAX_RETRIES=0, STRIPE_CIRCUIT_FAILURE_THRESHOLD=1,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def post(self):
+        return self.client.post(reverse('payments:stripe-create-intent'), {'order_id': self.order.id}, format='json')
+
+    def test_intent_is_created_through_the_gateway(self):
+        response = self.post()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data, {'client_secret': 'pi_1_secret'})
+        self.assertEqual(self.stripe.requests[0]['params']['metadata[order_id]'], [str(self.order.id)])
+
+    def test_open_circuit_answers_503_without_calling_stripe(self):
+        self.stripe.fail(500)
+        self.assertEqual(self.post().status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        response = self.post()
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(len(self.stripe.requests), 1)
+
+        admin = User.objects.create_user(username='gateway-admin', is_staff=True)
+        self.client.force_authenticate(user=admin)
+        stats = self.client.get(reverse('admin_api:admin-payment-gateway-stats')).data
+        self.assertEqual((stats['circuit'], stats['failures'], stats['rejected']), ('open', 1, 1))
+
+
+WEBHOOK_SECRET = 'whsec_test'
+
+
+def sign(payload, secret=WEBHOOK_SECRET, timestamp=None):
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    signature = hmac.new(secret.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={signature}'
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET)
+class StripeWebhookTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='webhook-payer')
+        self.url = reverse('payments:stripe-webhook')
+
+    def event(self, event_id, order=None, type='payment_intent.succeeded', amount=None, **intent):
+        intent.setdefault('currency', 'usd')
+        if order is not None:
+            intent['metadata'] = {'order_id': str(order.id)}
+            intent['amount_received'] = int(order.total_amount * 100) if amount is None else amount
+        return {'id': event_id, 'object': 'event', 'type': type, 'data': {'object': intent}}
+
+    def deliver(self, event, signature=None):
+        payload = json.dumps(event)
+        return self.client.generic(
+            'POST', self.url, payload, content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=sign(payload) if signature is None else signature,
+        )
+
+    def order(self, total='19.99', order_status='pending'):
+        return Order.objects.create(user=self.user, total_amount=Decimal(total), status=order_status)
+
+    def test_events_are_stored_once_and_acknowledged(self):
+        order = self.order()
+        for _ in range(2):
+            response = self.deliver(self.event('evt_1', order))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        event = StripeEvent.objects.get()
+        self.assertEqual((event.event_id, event.type, event.status), ('evt_1', 'payment_intent.succeeded', 'pending'))
+        self.assertEqual(event.payload['data']['object']['metadata'], {'order_id': str(order.id)})
+        # Nothing happens to the order until a worker gets to it.
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'pending')
+
+    def test_unverified_events_are_rejected(self):
+        event = self.event('evt_1', self.order())
+        payload = json.dumps(event)
+        for signature in ('', 't=1,v1=bad', sign(payload, secret='whsec_other'), sign(payload, timestamp=1)):
+            response = self.deliver(event, signature=signature)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, signature)
+        self.assertEqual(self.deliver('not an event').status_code, status.HTTP_400_BAD_REQUEST)
+        with override_settings(STRIPE_WEBHOOK_SECRET=''):
+            self.assertEqual(self.deliver(event).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_worker_marks_paid_orders_paid(self):
+        paid, twice, canceled, short = self.order(), self.order(), self.order(order_status='canceled'), self.order()
+        events = [
+            self.event('evt_1', paid),
+            self.event('evt_2', twice),
+            self.event('evt_3', twice),
+            self.event('evt_4', canceled),
+            self.event('evt_5', short, amount=100),
+            self.event('evt_6', currency='usd'),
+            self.event('evt_7', paid, type='charge.refunded'),
+        ]
+        for event in events:
+            self.deliver(event)
+
+        out = StringIO()
+        call_command('process_stripe_events', '--drain', stdout=out)
+        self.assertIn('Processed 7 Stripe events.', out.getvalue())
+
+        statuses = dict(Order.objects.values_list('pk', 'status'))
+        self.assertEqual(
+            [statuses[order.pk] for order in (paid, twice, canceled, short)],
+            ['paid', 'paid', 'canceled', 'pending'],
+        )
+        outcomes = {event.event_id: (event.status, event.error) for event in StripeEvent.objects.all()}
+        self.assertEqual(outcomes['evt_1'], ('processed', ''))
+        self.assertEqual(outcomes['evt_3'], ('processed', ''))
+        self.assertEqual(outcomes['evt_4'], ('failed', f'Order {canceled.pk} is canceled.'))
+        self.assertEqual(outcomes['evt_5'][0], 'failed')
+        self.assertIn('19.99 usd', outcomes['evt_5'][1])
+        self.assertEqual(outcomes['evt_6'], ('failed', 'The payment intent names no order.'))
+        self.assertEqual(outcomes['evt_7'], ('ignored', ''))
+        self.assertFalse(StripeEvent.objects.filter(processed_at=None).exists())
+
+    def test_batches_cost_the_same_queries_whatever_their_size(self):
+        def process(count, prefix):
+            for i in range(count):
+                self.deliver(self.event(f'{prefix}{i}', self.order()))
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(process_batch(batch_size=100), count)
+            return len(queries)
+
+        self.assertEqual(process(2, 'small'), process(40, 'large'))
+        self.assertEqual(Order.objects.filter(status='paid').count(), 42)
+
+    def test_batch_size_limits_a_batch(self):
+        for i in range(5):
+            self.deliver(self.event(f'evt_{i}', self.order()))
+        self.assertEqual(process_batch(batch_size=3), 3)
+        self.assertEqual(
+            list(StripeEvent.objects.filter(status='pending').values_list('event_id', flat=True)),
+            ['evt_3', 'evt_4'],
+        )
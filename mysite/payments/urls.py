@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import StripePaymentIntentCreateView, StripeConfirmView
+from .views import StripePaymentIntentCreateView, StripeWebhookView
 
 app_name = 'payments'
 
@@ -10,8 +10,8 @@ urlpatterns = [
         name='stripe-create-intent'
     ),
     path(
-        'stripe/confirm/',
-        StripeConfirmView.as_view(),
-        name='stripe-confirm'
+        'stripe/webhook/',
+        StripeWebhookView.as_view(),
+        name='stripe-webhook'
     ),
 ]
@@ -1,12 +1,15 @@
+import hashlib
+import math
+
 import stripe
 from django.conf import settings
 from rest_framework import views, status
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from orders.idempotency import HEADER as IDEMPOTENCY_HEADER, idempotent
+from .gateway import GatewayUnavailable, get_gateway
 from .serializers import PaymentIntentCreateSerializer
-
-# Set the Stripe API key from Django settings
-stripe.api_key = settings.STRIPE_SECRET_KEY
+from .webhooks import InvalidEvent, store_event
 
 class StripePaymentIntentCreateView(views.APIView):
     """
@@ -16,10 +19,26 @@ class StripePaymentIntentCreateView(views.APIView):
     - Creates a PaymentIntent with the correct amount and currency.
     - Attaches the order_id to the PaymentIntent metadata.
     - Returns the client_secret to the frontend.
+
+    Retries sent with the same `Idempotency-Key` header get the first
+    response instead of creating another PaymentIntent.
+
+    Stripe is called through payments.gateway; while Stripe is failing the
+    view answers 503 with Retry-After at once.
     """
     permission_classes = [IsAuthenticated]
     serializer_class = PaymentIntentCreateSerializer
 
+    def get_stripe_idempotency_key(self, request):
+        key = request.META.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return None
+        # Hashed to stay within Stripe's 255 character limit.
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return f'create-intent:{request.user.id}:{digest}'
+
+    # Not atomic: no transaction may stay open while Stripe is called.
+    @idempotent('payments.create_intent', atomic=False)
     def post(self, request, *args, **kwargs):
         serializer = self.serializer_class(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
@@ -35,14 +54,16 @@ class StripePaymentIntentCreateView(views.APIView):
             )
 
         try:
-            intent = stripe.PaymentIntent.create(
+            intent = get_gateway().create_payment_intent(
                 amount=amount_in_cents,
                 currency=settings.STRIPE_CURRENCY,
                 automatic_payment_methods={"enabled": True},
                 metadata={
                     'order_id': order.id,
                     'user_id': request.user.id
-                }
+                },
+                # Lets Stripe dedupe retries whose first attempt failed here.
+                idempotency_key=self.get_stripe_idempotency_key(request),
             )
 
             # Update order status to 'pending_payment' or a similar status if needed
@@ -53,6 +74,12 @@ class StripePaymentIntentCreateView(views.APIView):
                 status=status.HTTP_201_CREATED
             )
 
+        except GatewayUnavailable as e:
+            return Response(
+                {"error": "The payment provider is unavailable. Please try again shortly."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': str(math.ceil(e.retry_after))},
+            )
         except stripe.error.StripeError as e:
             return Response(
                 {"error": f"Stripe error: {str(e)}"}, 
@@ -64,15 +91,22 @@ class StripePaymentIntentCreateView(views.APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-class StripeConfirmView(views.APIView):
+class StripeWebhookView(views.APIView):
     """
-    Placeholder for handling payment confirmations, intended to be used with webhooks.
-    For MVP, this endpoint is not fully implemented.
+    Receives Stripe webhook events.
+
+    The event is verified and stored, then acknowledged at once; a worker
+    (`manage.py process_stripe_events`) acts on it later, see
+    payments.webhooks. Redelivered events are acknowledged again without
+    being stored twice.
     """
-    permission_classes = [IsAuthenticated]
+    # Stripe authenticates with the event signature.
+    authentication_classes = []
+    permission_classes = [AllowAny]
 
     def post(self, request, *args, **kwargs):
-        # In a real-world scenario, this logic would be in a webhook handler
-        # that is not exposed to the public internet without verification.
-        # For now, this is a placeholder.
-        return Response({"message": "Webhook confirmation pending implementation."}, status=status.HTTP_501_NOT_IMPLEMENTED)
+        try:
+            store_event(request.body, request.META.get('HTTP_STRIPE_SIGNATURE'))
+        except InvalidEvent as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"received": True})
@@ -0,0 +1,176 @@
+"""
+Stripe webhook ingestion.
+
+`POST /api/payments/stripe/webhook/` only verifies the event's signature
+(with STRIPE_WEBHOOK_SECRET) and stores the raw event with one
+
+    INSERT ... ON CONFLICT (event_id) DO NOTHING
+
+before answering 200. Redeliveries of an event already stored cost that one
+statement, so Stripe's burst of redeliveries after an outage never waits on
+order processing.
+
+`manage.py process_stripe_events` works through the stored events, oldest
+first, up to STRIPE_WEBHOOK_BATCH_SIZE per transaction:
+
+1. claim them with one UPDATE, as orders.checkout_queue claims checkouts;
+2. collect the orders paid by the batch's `payment_intent.succeeded` events,
+   after checking each intent's amount and currency against its order;
+3. move all of those orders to "paid" at once with
+   orders.transitions.transition_orders, which also keeps the sales
+   rollups up to date;
+4. record every event's outcome with one bulk UPDATE and commit.
+
+Events of other types are marked ignored. A payment for an order that
+cannot become paid (e.g. it was canceled) marks the event failed, with the
+reason, for staff to follow up.
+"""
+import json
+import logging
+
+import stripe
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from orders import workers
+from orders.models import Order
+from orders.transitions import INVALID_TRANSITION, NOT_FOUND, transition_orders
+from .models import StripeEvent
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_SUCCEEDED = 'payment_intent.succeeded'
+
+
+class InvalidEvent(Exception):
+    """
+    Raised for a webhook request that is not a correctly signed event.
+    """
+
+
+def get_batch_size():
+    return getattr(settings, 'STRIPE_WEBHOOK_BATCH_SIZE', 500)
+
+
+def get_poll_interval():
+    return getattr(settings, 'STRIPE_WEBHOOK_POLL_INTERVAL', 0.5)
+
+
+def store_event(payload, signature):
+    """
+    Verify the raw request body `payload` against the Stripe-Signature
+    header and store the event unless it is already stored. Raise
+    InvalidEvent if it cannot be verified.
+    """
+    secret = settings.STRIPE_WEBHOOK_SECRET
+    if not secret:
+        raise InvalidEvent('No webhook secret is configured.')
+    try:
+        payload = payload.decode('utf-8')
+        stripe.WebhookSignature.verify_header(
+            payload, signature or '', secret, getattr(settings, 'STRIPE_WEBHOOK_TOLERANCE', 300)
+        )
+        event = json.loads(payload)
+        event_id, event_type = event['id'], event['type']
+    except (stripe.error.SignatureVerificationError, UnicodeDecodeError, ValueError, KeyError, TypeError) as exc:
+        raise InvalidEvent(str(exc) or 'Malformed event.') from exc
+    StripeEvent.objects.bulk_create(
+        [StripeEvent(event_id=event_id, type=event_type, payload=event)], ignore_conflicts=True
+    )
+
+
+def _order_id(event):
+    metadata = event.payload.get('data', {}).get('object', {}).get('metadata') or {}
+    try:
+        return int(metadata['order_id'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _payment_error(event, order_id, totals):
+    """
+    Return why a payment_intent.succeeded event cannot pay order
+    `order_id`, or None if it can. `totals` maps order ids to totals.
+    """
+    if order_id is None:
+        return 'The payment intent names no order.'
+    if order_id not in totals:
+        return f'Order {order_id} does not exist.'
+    intent = event.payload['data']['object']
+    amount = intent.get('amount_received', intent.get('amount'))
+    currency = intent.get('currency')
+    if amount != int(totals[order_id] * 100) or currency != settings.STRIPE_CURRENCY:
+        return (
+            f'Order {order_id} costs {totals[order_id]} {settings.STRIPE_CURRENCY}; '
+            f'the payment was {amount} {currency} in minor units.'
+        )
+    return None
+
+
+def _apply_payments(events):
+    """
+    Mark the orders paid by `events` (payment_intent.succeeded events) paid,
+    and set each event's status and error.
+    """
+    order_ids = {event: _order_id(event) for event in events}
+    totals = dict(
+        Order.objects.filter(pk__in=[pk for pk in order_ids.values() if pk is not None])
+        .values_list('pk', 'total_amount')
+    )
+    paying = {}
+    for event, order_id in order_ids.items():
+        error = _payment_error(event, order_id, totals)
+        if error:
+            event.status, event.error = StripeEvent.FAILED, error
+        else:
+            paying[event] = order_id
+    results = {result['id']: result for result in transition_orders(paying.values(), 'paid')}
+    for event, order_id in paying.items():
+        result = results[order_id]
+        if result['outcome'] == INVALID_TRANSITION:
+            event.status, event.error = StripeEvent.FAILED, f'Order {order_id} is {result["status"]}.'
+        elif result['outcome'] == NOT_FOUND:
+            event.status, event.error = StripeEvent.FAILED, f'Order {order_id} does not exist.'
+        else:
+            event.status = StripeEvent.PROCESSED
+
+
+def process_batch(batch_size=None):
+    """
+    Process up to `batch_size` stored events, oldest first, in one
+    transaction. Return how many events were processed.
+    """
+    batch_size = batch_size or get_batch_size()
+    worker = workers.batch_name()
+    with transaction.atomic():
+        pending = StripeEvent.objects.filter(status=StripeEvent.PENDING)
+        claimed = pending.filter(pk__in=pending.order_by('pk').values('pk')[:batch_size]).update(worker=worker)
+        if not claimed:
+            return 0
+        events = list(pending.filter(worker=worker).order_by('pk'))
+        payments = []
+        for event in events:
+            if event.type == PAYMENT_SUCCEEDED:
+                payments.append(event)
+            else:
+                event.status = StripeEvent.IGNORED
+        if payments:
+            _apply_payments(payments)
+        now = timezone.now()
+        for event in events:
+            event.processed_at = now
+        StripeEvent.objects.bulk_update(events, ['status', 'error', 'processed_at'])
+    for event in events:
+        if event.status == StripeEvent.FAILED:
+            logger.warning('Stripe event %s failed: %s', event.event_id, event.error)
+    return len(events)
+
+
+def run_worker(batch_size=None, poll_interval=None, stop=None, drain=False):
+    """
+    Process batches as orders.workers.run_worker does. Return how many
+    events were processed.
+    """
+    poll_interval = get_poll_interval() if poll_interval is None else poll_interval
+    return workers.run_worker(process_batch, batch_size, poll_interval, stop=stop, drain=drain)
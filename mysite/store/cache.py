@@ -0,0 +1,169 @@
+"""
+Versioned response caching for the public catalog endpoints.
+
+Every cached response is keyed on the version counters of the models it was
+built from. Saving or deleting a Product or Category bumps that model's
+counter (see store.signals), so entries built from older data are never read
+again and simply age out of the cache backend.
+"""
+import hashlib
+import threading
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+
+VERSION_KEY_PREFIX = 'catalog:version:'
+RESPONSE_KEY_PREFIX = 'catalog:response:'
+# Validators stored with a cached body, so a hit can still answer 304.
+CACHED_HEADERS = ('ETag', 'Last-Modified')
+
+
+def get_catalog_cache():
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+
+def _version_key(model):
+    return f'{VERSION_KEY_PREFIX}{model._meta.label_lower}'
+
+
+def get_versions(*models):
+    """
+    Return the current version counter for each of the given models.
+    """
+    cache = get_catalog_cache()
+    keys = [_version_key(model) for model in models]
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        if key not in found:
+            # Seed missing counters from the clock so a counter that was
+            # evicted never restarts at a value an old entry still carries.
+            seed = time.time_ns()
+            cache.add(key, seed, timeout=None)
+            found[key] = cache.get(key, seed)
+        versions.append(found[key])
+    return versions
+
+
+def bump_version(model):
+    """
+    Invalidate every cached response that depends on the given model.
+    """
+    cache = get_catalog_cache()
+    key = _version_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def normalize_query(query_params):
+    """
+    Build a canonical query string: parameters sorted, blank values dropped.
+    """
+    pairs = sorted(
+        (key, value)
+        for key in query_params
+        for value in query_params.getlist(key)
+        if value != ''
+    )
+    return urlencode(pairs)
+
+
+class CacheStats:
+    """
+    Per-process hit and miss counters for the catalog cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def snapshot(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / total, 4) if total else 0.0,
+        }
+
+
+stats = CacheStats()
+
+
+class CatalogCacheMixin:
+    """
+    Serve GET requests from the catalog cache.
+
+    `cache_models` lists the models the response is built from; a change to
+    any of them invalidates the entry. Only 200 responses are stored, along
+    with their ETag/Last-Modified so cache hits honour conditional requests.
+    Last-Modified is only checked on a hit when the view checked it
+    (ConditionalGetMixin validates lists by ETag alone).
+    """
+    cache_models = ()
+    cache_timeout = None
+
+    def get_cache_timeout(self):
+        if self.cache_timeout is not None:
+            return self.cache_timeout
+        return getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300)
+
+    def get_cache_key(self, request, *args, **kwargs):
+        versions = '.'.join(str(v) for v in get_versions(*self.cache_models))
+        # Host is part of the key because paginated responses embed
+        # absolute next/previous links.
+        identity = '|'.join([
+            request.get_host(),
+            request.path,
+            normalize_query(request.query_params),
+        ])
+        digest = hashlib.md5(identity.encode('utf-8')).hexdigest()
+        return f'{RESPONSE_KEY_PREFIX}{type(self).__name__}:{versions}:{digest}'
+
+    def get(self, request, *args, **kwargs):
+        cache = get_catalog_cache()
+        key = self.get_cache_key(request, *args, **kwargs)
+        entry = cache.get(key)
+        if entry is not None:
+            stats.record(hit=True)
+            data, headers, check_last_modified = entry
+            last_modified = None
+            if check_last_modified:
+                last_modified = parse_http_date_safe(headers.get('Last-Modified', ''))
+            response = get_conditional_response(
+                request, etag=headers.get('ETag'), last_modified=last_modified,
+            ) or Response(data)
+            for name, value in headers.items():
+                response[name] = value
+            response['X-Cache'] = 'HIT'
+            return response
+
+        stats.record(hit=False)
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            headers = {name: response[name] for name in CACHED_HEADERS if response.has_header(name)}
+            check_last_modified = getattr(response, 'check_last_modified', False)
+            cache.set(key, (response.data, headers, check_last_modified), self.get_cache_timeout())
+        response['X-Cache'] = 'MISS'
+        return response
@@ -0,0 +1,110 @@
+"""
+Conditional GET (ETag / Last-Modified) for read-only list and detail views.
+
+A detail validator is derived from one aggregate over the single row — its
+newest modification timestamp — so a `304 Not Modified` costs one cheap
+query and never touches the serializer.
+
+A list validator never aggregates over the filtered result set, which
+would cost a COUNT over every match on each request and undo what cursor
+pagination saves. Views with `cache_models` (see store.cache) hash their
+models' version counters with the request path and query string, so a 304
+needs no query at all. Other views hash the rows of the page they render.
+"""
+import hashlib
+import json
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .cache import get_versions, normalize_query
+
+
+class ConditionalGetMixin:
+    """
+    Answer `If-None-Match` / `If-Modified-Since` on `list` and `retrieve`.
+
+    `validator_fields` names the timestamp fields whose maximum marks the
+    last change of the resource, e.g. `('updated_at', 'category__updated_at')`
+    when the representation also embeds the related category.
+    """
+    validator_fields = ('updated_at',)
+
+    def list(self, request, *args, **kwargs):
+        # If-Modified-Since cannot see deletions from a list (the newest
+        # timestamp is unchanged), so lists are only validated by ETag.
+        if getattr(self, 'cache_models', None):
+            return self.conditional_response(
+                request, self.get_list_etag(), None, None, super().list, *args, **kwargs
+            )
+        response = super().list(request, *args, **kwargs)
+        if response.status_code != 200:
+            return response
+        etag = self.get_page_etag(response.data)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            response = not_modified
+        response.check_last_modified = False
+        response['ETag'] = etag
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+        etag, last_modified = self.get_validators(queryset)
+        return self.conditional_response(
+            request, etag, last_modified, last_modified, super().retrieve, *args, **kwargs
+        )
+
+    def get_list_etag(self):
+        identity = '|'.join([
+            self.request.path,
+            normalize_query(self.request.query_params),
+            *(str(version) for version in get_versions(*self.cache_models)),
+        ])
+        return quote_etag(hashlib.md5(identity.encode('utf-8')).hexdigest())
+
+    def get_page_etag(self, data):
+        identity = json.dumps(data, sort_keys=True, default=str)
+        return quote_etag(hashlib.md5(identity.encode('utf-8')).hexdigest())
+
+    def get_validators(self, queryset):
+        aggregates = {
+            f'modified_{index}': Max(field)
+            for index, field in enumerate(self.validator_fields)
+        }
+        values = queryset.order_by().aggregate(row_count=Count('pk'), **aggregates)
+        stamps = [values[key] for key in aggregates if values[key] is not None]
+        if not values['row_count']:
+            return None, None
+
+        last_modified = max(stamps) if stamps else None
+        identity = '|'.join([
+            self.request.path,
+            normalize_query(self.request.query_params),
+            str(values['row_count']),
+            *(values[key].isoformat() if values[key] else '' for key in aggregates),
+        ])
+        etag = quote_etag(hashlib.md5(identity.encode('utf-8')).hexdigest())
+        return etag, last_modified
+
+    def conditional_response(self, request, etag, last_modified, check_modified, handler, *args, **kwargs):
+        if etag is None:
+            return handler(request, *args, **kwargs)
+
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        check_timestamp = int(check_modified.timestamp()) if check_modified else None
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=check_timestamp
+        )
+        response = not_modified or handler(request, *args, **kwargs)
+        # Read by CatalogCacheMixin to validate cache hits the same way.
+        response.check_last_modified = check_modified is not None
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+        return response
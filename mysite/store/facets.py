@@ -0,0 +1,71 @@
+"""
+Sidebar facet counts for a filtered product queryset.
+
+All facets come from a single grouped aggregate: rows are grouped by
+(color, category) and every price bucket is a filtered COUNT in the same
+SELECT. The color, category and price totals are then folded together in
+Python from the (small) number of groups.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Count, Q
+
+DEFAULT_PRICE_BUCKETS = (25, 50, 100, 200, 500)
+
+
+def price_bucket_ranges():
+    """
+    Turn the CATALOG_PRICE_BUCKETS edges into [(low, high), ...] ranges;
+    the last range is open-ended.
+    """
+    edges = sorted(getattr(settings, 'CATALOG_PRICE_BUCKETS', DEFAULT_PRICE_BUCKETS))
+    lows = [0] + edges
+    highs = edges + [None]
+    return list(zip(lows, highs))
+
+
+def compute_facets(queryset):
+    ranges = price_bucket_ranges()
+    bucket_counts = {}
+    for index, (low, high) in enumerate(ranges):
+        condition = Q(price__gte=low)
+        if high is not None:
+            condition &= Q(price__lt=high)
+        bucket_counts[f'bucket_{index}'] = Count('id', filter=condition)
+
+    groups = (
+        queryset.order_by()
+        .values('color', 'category_id', 'category__name', 'category__slug')
+        .annotate(count=Count('id'), **bucket_counts)
+    )
+
+    total = 0
+    colors = defaultdict(int)
+    categories = {}
+    buckets = [0] * len(ranges)
+    for group in groups:
+        total += group['count']
+        colors[group['color']] += group['count']
+        category = categories.setdefault(group['category_id'], {
+            'id': group['category_id'],
+            'name': group['category__name'],
+            'slug': group['category__slug'],
+            'count': 0,
+        })
+        category['count'] += group['count']
+        for index in range(len(ranges)):
+            buckets[index] += group[f'bucket_{index}']
+
+    return {
+        'total': total,
+        'colors': [
+            {'value': color, 'count': count}
+            for color, count in sorted(colors.items(), key=lambda item: (-item[1], item[0]))
+        ],
+        'categories': sorted(categories.values(), key=lambda c: (-c['count'], c['name'])),
+        'price_buckets': [
+            {'min': low, 'max': high, 'count': count}
+            for (low, high), count in zip(ranges, buckets)
+        ],
+    }
@@ -0,0 +1,214 @@
+"""
+Read-only fast path for hot list endpoints.
+
+`FastSerializer` compiles a ModelSerializer (after sparse-fieldset trimming)
+into a flat plan of `.values()` lookups and per-field converters, then
+renders plain dict rows without instantiating models or walking DRF's
+field-by-field `to_representation`. Nested forward relations are read
+through joins in the same query; nested reverse relations cost one extra
+`.values()` query each. The output is identical to the
+ModelSerializer's; `tests.FastSerializerParityTests` guards that.
+
+Relations rendered through `__str__` (StringRelatedField) cannot be derived
+from the model, so serializers declare them in `fast_lookups`, e.g.
+`{'category': 'category__name'}`.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from rest_framework import ISO_8601, serializers
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+VALUE, MANY, ONE = 'value', 'many', 'one'
+
+
+def _identity(value):
+    return value
+
+
+def _decimal_converter(field):
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.localize or field.decimal_places is None:
+        return field.to_representation
+    exponent = -field.decimal_places
+    quantize = field.quantize
+
+    def convert(value):
+        # Database values already carry the field's scale; only quantize
+        # when they do not, exactly as DecimalField.to_representation would.
+        if value.as_tuple().exponent != exponent:
+            value = quantize(value)
+        return '{:f}'.format(value)
+    return convert
+
+
+def _datetime_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if output_format is None or output_format.lower() != ISO_8601:
+        return field.to_representation
+    tz = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if tz is None:
+        return field.to_representation
+
+    def convert(value):
+        value = value.astimezone(tz).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return convert
+
+
+def compile_converter(field):
+    if isinstance(field, serializers.DecimalField):
+        return _decimal_converter(field)
+    if isinstance(field, serializers.DateTimeField):
+        return _datetime_converter(field)
+    if isinstance(field, (
+        serializers.CharField, serializers.IntegerField, serializers.BooleanField,
+        serializers.ReadOnlyField, PrimaryKeyRelatedField,
+    )):
+        return _identity
+    return field.to_representation
+
+
+class FastSerializer:
+    """
+    A compiled, read-only rendering plan for a ModelSerializer instance.
+    """
+
+    def __init__(self, serializer):
+        meta = serializer.Meta
+        self.model = meta.model
+        opts = self.model._meta
+        self.pk = opts.pk.attname
+        fast_lookups = getattr(serializer, 'fast_lookups', {})
+
+        self.columns = [self.pk]
+        self.plan = []
+        self.nested = {}
+        for name, field in serializer.fields.items():
+            if name in fast_lookups:
+                self._add_value(name, fast_lookups[name], _identity)
+                continue
+            root = field.source.split('.')[0]
+            try:
+                model_field = opts.get_field(root)
+            except FieldDoesNotExist:
+                raise ImproperlyConfigured(
+                    f'{type(serializer).__name__}.{name} has no fast path; '
+                    f'add it to fast_lookups.'
+                )
+            if isinstance(field, serializers.ListSerializer):
+                child = FastSerializer(field.child)
+                link = model_field.field.attname
+                self.nested[name] = (child, link)
+                self.plan.append((name, MANY, self.pk, None))
+            elif isinstance(field, serializers.ModelSerializer):
+                child = FastSerializer(field)
+                if child.nested:
+                    raise ImproperlyConfigured(
+                        f'{type(serializer).__name__}.{name} nests relations too deeply '
+                        f'for the fast path.'
+                    )
+                # The related row is joined in: its columns are read as
+                # `<fk>__<column>` from the parent row.
+                prefix = f'{model_field.name}__'
+                for column in child.columns:
+                    if prefix + column not in self.columns:
+                        self.columns.append(prefix + column)
+                self.plan.append((name, ONE, (prefix, child), None))
+            elif model_field.is_relation:
+                if not isinstance(field, PrimaryKeyRelatedField):
+                    raise ImproperlyConfigured(
+                        f'{type(serializer).__name__}.{name} has no fast path; '
+                        f'add it to fast_lookups.'
+                    )
+                self._add_value(name, model_field.attname, _identity)
+            else:
+                self._add_value(name, field.source, compile_converter(field))
+
+    def _add_value(self, name, lookup, convert):
+        if lookup not in self.columns:
+            self.columns.append(lookup)
+        self.plan.append((name, VALUE, lookup, convert))
+
+    def values(self, queryset, extra=()):
+        """
+        Turn a model queryset into the `.values()` queryset this plan reads.
+        """
+        columns = list(self.columns) + [c for c in extra if c not in self.columns]
+        return queryset.prefetch_related(None).values(*columns)
+
+    def _load_nested(self, rows):
+        loaded = {}
+        keys = {row[self.pk] for row in rows}
+        for name, (child, link) in self.nested.items():
+            grouped = defaultdict(list)
+            if keys:
+                columns = child.columns if link in child.columns else child.columns + [link]
+                child_rows = list(
+                    child.model._default_manager.filter(**{f'{link}__in': keys})
+                    .order_by(child.pk)
+                    .values(*columns)
+                )
+                for child_row, rendered in zip(child_rows, child.serialize(child_rows)):
+                    grouped[child_row[link]].append(rendered)
+            loaded[name] = grouped
+        return loaded
+
+    def render(self, row, nested, prefix=''):
+        item = {}
+        for name, kind, key, convert in self.plan:
+            if kind == VALUE:
+                value = row[prefix + key]
+                item[name] = None if value is None else convert(value)
+            elif kind == MANY:
+                item[name] = nested[name].get(row[prefix + key], [])
+            else:
+                child_prefix, child = key
+                child_prefix = prefix + child_prefix
+                if row[child_prefix + child.pk] is None:
+                    item[name] = None
+                else:
+                    item[name] = child.render(row, {}, child_prefix)
+        return item
+
+    def serialize(self, rows):
+        nested = self._load_nested(rows) if self.nested else {}
+        return [self.render(row, nested) for row in rows]
+
+
+_compiled = {}
+
+
+def get_fast_serializer(serializer):
+    """
+    Return the cached plan for a serializer class and its current field set.
+    """
+    key = (type(serializer), tuple(serializer.fields))
+    if key not in _compiled:
+        _compiled[key] = FastSerializer(serializer)
+    return _compiled[key]
+
+
+class FastListMixin:
+    """
+    Serve `list` through a FastSerializer built from `get_serializer()`.
+    Disabled by setting FAST_LIST_SERIALIZATION to False.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if not getattr(settings, 'FAST_LIST_SERIALIZATION', True):
+            return super().list(request, *args, **kwargs)
+
+        fast = get_fast_serializer(self.get_serializer())
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = fast.values(queryset, extra=getattr(self, 'sparse_required_fields', ()))
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(fast.serialize(page))
+        return Response(fast.serialize(list(rows)))
@@ -0,0 +1,108 @@
+"""
+Sparse fieldsets: `?fields=name,price` keeps only the listed fields and
+`?omit=description` drops fields from a serializer's output.
+
+`SparseFieldsetMixin.optimize_queryset` pushes the same selection down into
+the queryset, so columns that will not be rendered are never read and
+relations are only joined or prefetched when they are rendered.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.relations import PrimaryKeyRelatedField
+
+FIELDS_PARAM = 'fields'
+OMIT_PARAM = 'omit'
+
+
+def _parse_names(request, param):
+    if request is None:
+        return set()
+    params = getattr(request, 'query_params', request.GET)
+    return {name.strip() for name in params.get(param, '').split(',') if name.strip()}
+
+
+def requested_fieldset(request):
+    """
+    Return the (fields, omit) name sets requested by the client.
+    """
+    return _parse_names(request, FIELDS_PARAM), _parse_names(request, OMIT_PARAM)
+
+
+class SparseFieldsetMixin:
+    """
+    Serializer mixin that trims its fields according to the request's
+    `fields` / `omit` query parameters. The primary key is always kept.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields, omit = requested_fieldset(self.context.get('request'))
+        if not fields and not omit:
+            return
+        for name in list(self.fields):
+            if name == 'id':
+                continue
+            if (fields and name not in fields) or name in omit:
+                self.fields.pop(name)
+
+    @classmethod
+    def optimize_queryset(cls, queryset, request, required=()):
+        """
+        Shape `queryset` for the fields this serializer will render.
+
+        Rendered forward relations are joined with select_related and
+        rendered reverse relations are prefetched. When the client asked for
+        a sparse fieldset, only the rendered columns (plus `required`, e.g.
+        pagination keys) are loaded.
+        """
+        opts = queryset.model._meta
+        serializer = cls(context={'request': request})
+        columns = {opts.pk.name, *required}
+        select, prefetch = [], []
+        resolvable = True
+
+        for field in serializer.fields.values():
+            root = field.source.split('.')[0]
+            if root == '*':
+                resolvable = False
+                continue
+            try:
+                model_field = opts.get_field(root)
+            except FieldDoesNotExist:
+                # A property or method may read any column.
+                resolvable = False
+                continue
+            if not model_field.is_relation:
+                columns.add(root)
+            elif model_field.many_to_one or (model_field.one_to_one and model_field.concrete):
+                columns.add(root)
+                if not isinstance(field, PrimaryKeyRelatedField):
+                    select.append(root)
+            else:
+                prefetch.append(root)
+
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        fields, omit = requested_fieldset(request)
+        if (fields or omit) and resolvable:
+            queryset = queryset.only(*columns)
+        return queryset
+
+
+class SparseFieldsetViewMixin:
+    """
+    View mixin applying the serializer's queryset optimisation to
+    `get_queryset()`. `sparse_required_fields` lists columns the view needs
+    regardless of the rendered fields (e.g. keyset pagination keys).
+    """
+    sparse_required_fields = ()
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        serializer_class = self.get_serializer_class()
+        if hasattr(serializer_class, 'optimize_queryset'):
+            queryset = serializer_class.optimize_queryset(
+                queryset, self.request, required=self.sparse_required_fields
+            )
+        return queryset
@@ -1,11 +1,30 @@
+from django.db.models import Value
+from django.db.models.functions import Upper
 from django_filters import rest_framework as filters
 from .models import Product
+from .search import search_products
 
 class ProductFilter(filters.FilterSet):
+    q = filters.CharFilter(method='filter_search', label='Search')
     price_min = filters.NumberFilter(field_name="price", lookup_expr='gte')
     price_max = filters.NumberFilter(field_name="price", lookup_expr='lte')
-    color = filters.CharFilter(field_name='color', lookup_expr='iexact')
+    color = filters.CharFilter(method='filter_color')
 
     class Meta:
         model = Product
-        fields = ['color', 'price_min', 'price_max']
+        fields = ['q', 'color', 'price_min', 'price_max']
+
+    def filter_color(self, queryset, name, value):
+        """
+        Case-insensitive color match written as UPPER(color) = UPPER(value),
+        which the store_prod_color_idx expression index can serve on
+        every backend (unlike iexact, which is LIKE on SQLite).
+        """
+        return queryset.alias(color_upper=Upper('color')).filter(color_upper=Upper(Value(value)))
+
+    def filter_search(self, queryset, name, value):
+        """
+        Full-text search over name, description, color and category name,
+        ordered by relevance.
+        """
+        return search_products(queryset, value)
@@ -0,0 +1,296 @@
+"""
+Bulk product import from CSV or JSON Lines feeds.
+
+Rows are streamed from the file and written in chunks with bulk_create /
+bulk_update, so memory stays flat however large the feed is. Each chunk
+costs a handful of queries regardless of its size:
+
+- categories are resolved from one name/slug map loaded up front;
+- rows that carry a `slug` are upserted with INSERT ... ON CONFLICT (slug)
+  DO UPDATE, which leaves `created_at` and the primary key untouched;
+- rows without a slug always create a product, and their slugs are made
+  unique for the whole chunk with a couple of queries.
+
+Signals are bypassed by the bulk writes, so the importer keeps the search
+index and the catalog cache versions up to date itself.
+"""
+import csv
+import json
+import re
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+from . import search
+from .cache import bump_version
+from .models import Category, Product
+
+DEFAULT_BATCH_SIZE = 1000
+# Room for a "-<n>" suffix within Product.slug's max_length.
+SLUG_BASE_LENGTH = 240
+SUFFIX_RE = re.compile(r'^(?P<base>.+)-(?P<n>\d+)$')
+# Slug ranges per query, well inside SQLite's expression depth limit.
+SLUG_QUERY_TERMS = 200
+UPDATE_FIELDS = [
+    'name', 'description', 'price', 'stock_quantity', 'category',
+    'color', 'is_featured', 'is_active', 'updated_at',
+]
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'f', ''}
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+def detect_format(path):
+    return 'jsonl' if str(path).lower().endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+def iter_rows(stream, fmt):
+    """
+    Yield (line_number, row dict) pairs from an open text stream.
+    """
+    if fmt == 'jsonl':
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                yield line_number, ImportRowError(f'invalid JSON: {exc}')
+                continue
+            if not isinstance(row, dict):
+                yield line_number, ImportRowError('expected a JSON object')
+                continue
+            yield line_number, row
+    else:
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+
+
+def _text(row, key, default=''):
+    value = row.get(key)
+    return default if value is None else str(value).strip()
+
+
+def _bool(row, key, default):
+    value = row.get(key)
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    value = str(value).strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ImportRowError(f'{key}: expected a boolean, got {value!r}')
+
+
+def _price(row):
+    try:
+        price = Decimal(str(row.get('price', '')).strip())
+    except InvalidOperation:
+        raise ImportRowError(f"price: expected a decimal, got {row.get('price')!r}")
+    if not price.is_finite() or price < 0:
+        raise ImportRowError(f'price: {price} is not a valid price')
+    price = price.quantize(Decimal('0.01'))
+    if len(price.as_tuple().digits) > Product._meta.get_field('price').max_digits:
+        raise ImportRowError(f'price: {price} is too large')
+    return price
+
+
+def _stock(row):
+    value = row.get('stock_quantity')
+    if value in (None, ''):
+        return 0
+    try:
+        stock = int(str(value).strip())
+    except ValueError:
+        raise ImportRowError(f'stock_quantity: expected an integer, got {value!r}')
+    if stock < 0:
+        raise ImportRowError('stock_quantity: must not be negative')
+    return stock
+
+
+def base_slug(name):
+    return slugify(name)[:SLUG_BASE_LENGTH].strip('-') or 'product'
+
+
+class ProductImporter:
+    """
+    Import products from a row stream.
+
+    `create_categories` creates categories that are named in the feed but
+    missing from the database instead of rejecting their rows.
+    `index` updates the search index after every chunk; turn it off for a
+    one-off load and run `rebuild_search_index` afterwards.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, create_categories=False, index=True,
+                 on_progress=None, on_error=None):
+        self.batch_size = batch_size
+        self.create_categories = create_categories
+        self.index = index
+        self.on_progress = on_progress
+        self.on_error = on_error
+        self.created = 0
+        self.updated = 0
+        self.skipped = 0
+        self.categories_created = 0
+        self._categories = {}
+
+    @property
+    def processed(self):
+        return self.created + self.updated + self.skipped
+
+    def load_categories(self):
+        for category in Category.objects.all():
+            self._categories[category.name.lower()] = category
+            self._categories[category.slug.lower()] = category
+
+    def resolve_category(self, value):
+        if not value:
+            raise ImportRowError('category is required')
+        category = self._categories.get(value.lower())
+        if category is None:
+            if not self.create_categories:
+                raise ImportRowError(f'unknown category {value!r}')
+            category, created = Category.objects.get_or_create(name=value)
+            self.categories_created += created
+            self._categories[category.name.lower()] = category
+            self._categories[category.slug.lower()] = category
+        return category
+
+    def build(self, row):
+        """
+        Validate one raw row and turn it into an unsaved Product.
+        """
+        name = _text(row, 'name')
+        if not name:
+            raise ImportRowError('name is required')
+        slug = _text(row, 'slug')
+        if slug and slug != slugify(slug):
+            raise ImportRowError(f'slug: {slug!r} is not a valid slug')
+        return Product(
+            name=name[:Product._meta.get_field('name').max_length],
+            slug=slug,
+            description=_text(row, 'description'),
+            price=_price(row),
+            stock_quantity=_stock(row),
+            category=self.resolve_category(_text(row, 'category')),
+            color=_text(row, 'color')[:Product._meta.get_field('color').max_length],
+            is_featured=_bool(row, 'is_featured', False),
+            is_active=_bool(row, 'is_active', True),
+        )
+
+    def run(self, rows):
+        """
+        Import every row from `rows`, an iterable of (line number, row) pairs.
+        """
+        self.load_categories()
+        chunk = []
+        for line_number, row in rows:
+            try:
+                if isinstance(row, ImportRowError):
+                    raise row
+                chunk.append(self.build(row))
+            except ImportRowError as exc:
+                self.skipped += 1
+                if self.on_error:
+                    self.on_error(line_number, exc)
+                continue
+            if len(chunk) >= self.batch_size:
+                self.write_chunk(chunk)
+                chunk = []
+        if chunk:
+            self.write_chunk(chunk)
+        if self.created or self.updated:
+            bump_version(Product)
+
+    def write_chunk(self, products):
+        # A later row with the same slug wins, as if rows were applied in order.
+        keyed = {}
+        unkeyed = []
+        for product in products:
+            if product.slug:
+                keyed[product.slug] = product
+            else:
+                unkeyed.append(product)
+
+        with transaction.atomic():
+            # Only used to report created/updated counts; the write itself is
+            # a single INSERT ... ON CONFLICT (slug) DO UPDATE per batch.
+            existing = set(
+                Product.objects.filter(slug__in=list(keyed)).values_list('slug', flat=True)
+            )
+            self.assign_slugs(unkeyed, taken=set(keyed))
+
+            if keyed:
+                Product.objects.bulk_create(
+                    keyed.values(), update_conflicts=True,
+                    unique_fields=['slug'], update_fields=UPDATE_FIELDS,
+                )
+            if unkeyed:
+                Product.objects.bulk_create(unkeyed)
+            written = [*keyed.values(), *unkeyed]
+            missing = [product.slug for product in written if product.pk is None]
+            if missing:
+                # Backends that cannot return ids from a bulk insert.
+                ids = dict(Product.objects.filter(slug__in=missing).values_list('slug', 'pk'))
+                for product in written:
+                    product.pk = product.pk or ids[product.slug]
+            if self.index:
+                search.index_products(written)
+
+        updated = len(existing)
+        self.updated += updated
+        self.created += len(written) - updated
+        self.skipped += len(products) - len(keyed) - len(unkeyed)
+        if self.on_progress:
+            self.on_progress(self)
+
+    def assign_slugs(self, products, taken):
+        """
+        Give every product a slug unique in the database and in `taken`.
+        """
+        if not products:
+            return
+        names = [base_slug(product.name) for product in products]
+        bases = set(names)
+        in_use = set(taken)
+        in_use.update(Product.objects.filter(slug__in=bases).values_list('slug', flat=True))
+
+        # Only bases that will need a suffix have their "-<n>" variants read,
+        # so new suffixes start after the highest one already taken.
+        counts = Counter(names)
+        colliding = [base for base in bases if base in in_use or counts[base] > 1]
+        suffixed = {slug for slug in in_use if SUFFIX_RE.match(slug)}
+        for start in range(0, len(colliding), SLUG_QUERY_TERMS):
+            condition = Q()
+            for base in colliding[start:start + SLUG_QUERY_TERMS]:
+                # A range rather than LIKE 'base-%', so the slug index is used
+                # ('.' is the character after '-').
+                condition |= Q(slug__gte=f'{base}-', slug__lt=f'{base}.')
+            suffixed.update(Product.objects.filter(condition).values_list('slug', flat=True))
+        in_use |= suffixed
+
+        last_suffix = {}
+        for slug in suffixed:
+            match = SUFFIX_RE.match(slug)
+            if match and match['base'] in bases:
+                base, n = match['base'], int(match['n'])
+                last_suffix[base] = max(last_suffix.get(base, 1), n)
+
+        for product, base in zip(products, names):
+            slug = base
+            while slug in in_use:
+                last_suffix[base] = last_suffix.get(base, 1) + 1
+                slug = f'{base}-{last_suffix[base]}'
+            in_use.add(slug)
+            product.slug = slug
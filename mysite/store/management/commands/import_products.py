@@ -0,0 +1,75 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.importer import DEFAULT_BATCH_SIZE, ProductImporter, detect_format, iter_rows
+
+# Invalid rows reported individually before the command only counts them.
+MAX_REPORTED_ERRORS = 20
+
+
+class Command(BaseCommand):
+    help = (
+        'Import products from a CSV or JSON Lines file ("-" reads stdin). '
+        'Columns: name, slug, description, price, stock_quantity, category '
+        '(name or slug), color, is_featured, is_active. Rows with a slug '
+        'update the product with that slug or create it; rows without one '
+        'always create a product with a generated unique slug.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--create-categories', action='store_true',
+                            help='Create missing categories instead of skipping their rows.')
+        parser.add_argument('--no-index', action='store_true',
+                            help='Skip search indexing; run rebuild_search_index afterwards.')
+        parser.add_argument('--progress-every', type=int, default=50000,
+                            help='Report progress every N rows.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        path = options['path']
+        fmt = options['format'] or detect_format(path)
+        started = time.monotonic()
+        errors = []
+        next_report = [options['progress_every']]
+
+        def on_error(line_number, exc):
+            errors.append(line_number)
+            if len(errors) <= MAX_REPORTED_ERRORS:
+                self.stderr.write(f'Line {line_number}: {exc}')
+
+        def on_progress(importer):
+            if importer.processed >= next_report[0]:
+                next_report[0] = importer.processed + options['progress_every']
+                self.stdout.write(self.format_progress(importer, started))
+
+        importer = ProductImporter(
+            batch_size=options['batch_size'],
+            create_categories=options['create_categories'],
+            index=not options['no_index'],
+            on_progress=on_progress,
+            on_error=on_error,
+        )
+        try:
+            stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8-sig')
+        except OSError as exc:
+            raise CommandError(f'Cannot read {path}: {exc}')
+        with stream:
+            importer.run(iter_rows(stream, fmt))
+
+        if len(errors) > MAX_REPORTED_ERRORS:
+            self.stderr.write(f'... and {len(errors) - MAX_REPORTED_ERRORS} more invalid rows.')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {importer.created} new and {importer.updated} updated products, '
+            f'skipped {importer.skipped} rows. {self.format_progress(importer, started)}'
+        ))
+
+    def format_progress(self, importer, started):
+        elapsed = time.monotonic() - started
+        rate = importer.processed / elapsed if elapsed else 0
+        return f'{importer.processed} rows in {elapsed:.1f}s ({rate:,.0f} rows/s).'
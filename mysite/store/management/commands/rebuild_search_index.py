@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from store import search
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product search index from scratch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=search.INDEX_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        backend = search.get_backend()
+        batch_size = options['batch_size']
+        started = time.monotonic()
+        total = 0
+
+        with transaction.atomic():
+            backend.clear()
+            batch = []
+            products = Product.objects.select_related('category').order_by('pk')
+            for product in products.iterator(chunk_size=batch_size):
+                batch.append(product)
+                if len(batch) >= batch_size:
+                    backend.index_products(batch)
+                    total += len(batch)
+                    batch = []
+            backend.index_products(batch)
+            total += len(batch)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {total} products with the {backend.name} backend in {elapsed:.1f}s.'
+        ))
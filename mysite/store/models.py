@@ -1,10 +1,13 @@
 from django.db import models
+from django.db.models import Q
+from django.db.models.functions import Upper
 from django.utils.text import slugify
 
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(max_length=120, unique=True, blank=True)
     is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -23,11 +26,14 @@ class Product(models.Model):
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock_quantity = models.PositiveIntegerField(default=0)
+    # Units held by carts (cart.reservations); never above stock_quantity.
+    reserved_quantity = models.PositiveIntegerField(default=0)
     category = models.ForeignKey(Category, related_name='products', on_delete=models.CASCADE)
     color = models.CharField(max_length=50)
     is_featured = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -36,3 +42,56 @@ class Product(models.Model):
 
     def __str__(self):
         return self.name
+
+    @property
+    def available_quantity(self):
+        return self.stock_quantity - self.reserved_quantity
+
+    class Meta:
+        # Catalog reads always filter on is_active, which SQLite and Postgres
+        # compare as a bare boolean, so the hot-path indexes are partial on
+        # it rather than leading with a low-cardinality boolean column.
+        indexes = [
+            models.Index(
+                fields=['-created_at', '-id'],
+                condition=Q(is_active=True, is_featured=True),
+                name='store_prod_featured_idx',
+            ),
+            models.Index(
+                fields=['category', 'price'],
+                condition=Q(is_active=True),
+                name='store_prod_cat_price_idx',
+            ),
+            models.Index(
+                fields=['price', 'id'],
+                condition=Q(is_active=True),
+                name='store_prod_price_idx',
+            ),
+            models.Index(
+                fields=['-created_at', '-id'],
+                condition=Q(is_active=True),
+                name='store_prod_created_idx',
+            ),
+            models.Index(
+                Upper('color'),
+                condition=Q(is_active=True),
+                name='store_prod_color_idx',
+            ),
+        ]
+
+class ProductSearchTerm(models.Model):
+    """
+    One row of the portable inverted index used by store.search when SQLite
+    FTS5 is not available: a term, the product it occurs in and its weight.
+    """
+    term = models.CharField(max_length=64)
+    product = models.ForeignKey(Product, related_name='search_terms', on_delete=models.CASCADE)
+    weight = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.term} -> {self.product_id}'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['term', 'product'], name='store_searchterm_term_product_uniq'),
+        ]
@@ -1,6 +1,175 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import hashlib
+import json
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .cache import get_catalog_cache, get_versions
 
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a composite `(field, id)` key.
+
+    Each page is fetched with a `WHERE (field, id) > (last_field, last_id)`
+    predicate instead of an OFFSET, and no total count is computed, so the
+    cost of a page does not depend on how deep into the result set it is.
+    The cursor only carries the key of the boundary row, so it stays valid
+    when combined with any filter.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    ordering_fields = ('created_at',)
+    default_ordering = '-created_at'
+    invalid_cursor_message = 'Invalid cursor.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.field, self.descending = self.get_ordering(request)
+        self.model = queryset.model
+
+        cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor['reverse']
+        ascending = self.descending == reverse
+
+        prefix = '' if ascending else '-'
+        queryset = queryset.order_by(f'{prefix}{self.field}', f'{prefix}id')
+        if cursor is not None:
+            lookup = 'gt' if ascending else 'lt'
+            queryset = queryset.filter(
+                # Redundant with the OR below, but a plain range lets the
+                # database seek into the index instead of scanning up to it.
+                Q(**{f'{self.field}__{lookup}e': cursor['value']}),
+                Q(**{f'{self.field}__{lookup}': cursor['value']})
+                | Q(**{self.field: cursor['value'], f'id__{lookup}': cursor['id']}),
+            )
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_ordering(self, request):
+        ordering = request.query_params.get(self.ordering_query_param) or self.default_ordering
+        field = ordering.lstrip('-')
+        if field not in self.ordering_fields:
+            ordering = self.default_ordering
+            field = ordering.lstrip('-')
+        return field, ordering.startswith('-')
+
+    def _key_of(self, item):
+        if isinstance(item, dict):
+            return item[self.field], item['id']
+        return getattr(item, self.field), item.pk
+
+    def encode_cursor(self, item, reverse):
+        value, pk = self._key_of(item)
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        payload = json.dumps({'v': str(value), 'id': pk, 'r': int(reverse)})
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+    def get_cursor_link(self, item, reverse):
+        cursor = self.encode_cursor(item, reverse)
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            field = self.model._meta.get_field(self.field)
+            return {
+                'value': field.to_python(payload['v']),
+                'id': int(payload['id']),
+                'reverse': bool(payload.get('r')),
+            }
+        except (TypeError, ValueError, KeyError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.get_cursor_link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.get_cursor_link(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+class ProductKeysetPagination(KeysetPagination):
+    ordering_fields = ('created_at', 'price')
+
+class CachedCountPaginator(Paginator):
+    """
+    Django Paginator for catalog querysets whose total count is cached.
+
+    `cache_key` identifies the filtered result set (e.g. the normalised
+    query string without the page number); the count is stored under that
+    key and the current catalog versions, so every catalog change
+    invalidates it.
+    """
+
+    def __init__(self, *args, cache_key=None, cache_models=(), cache_timeout=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_key = cache_key
+        self.cache_models = cache_models
+        self.cache_timeout = cache_timeout
+
+    @cached_property
+    def count(self):
+        if self.cache_key is None:
+            return super().count
+        versions = '.'.join(str(v) for v in get_versions(*self.cache_models))
+        digest = hashlib.md5(self.cache_key.encode('utf-8')).hexdigest()
+        key = f'catalog:count:{versions}:{digest}'
+        cache = get_catalog_cache()
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            cache.set(key, count, self.cache_timeout)
+        return count
@@ -0,0 +1,213 @@
+"""
+Ranked full-text product search.
+
+Two interchangeable backends index a product's name, description, color and
+category name:
+
+- `SQLiteFTSBackend` keeps an FTS5 virtual table (`store_product_fts`) and
+  ranks matches with bm25.
+- `InvertedIndexBackend` keeps weighted terms in `ProductSearchTerm` and works
+  on any database.
+
+The active backend is chosen by the PRODUCT_SEARCH_BACKEND setting ('auto',
+'fts5' or 'inverted'). Both are kept up to date incrementally from the
+Product and Category signals in store.signals.
+
+A search becomes part of the product query itself (a join on the FTS table,
+or a subquery on the term table), with no limit of its own, so the filters,
+counts and facets applied to the same queryset see every match.
+"""
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, OuterRef, Subquery, Sum
+
+from .models import Product, ProductSearchTerm
+
+FTS_TABLE = 'store_product_fts'
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+MAX_TERM_LENGTH = 64
+INDEX_BATCH_SIZE = 500
+
+# Relative importance of a match in each indexed field.
+FIELD_WEIGHTS = {
+    'name': 10,
+    'description': 1,
+    'color': 3,
+    'category': 5,
+}
+
+
+def tokenize(text):
+    return [token[:MAX_TERM_LENGTH] for token in TOKEN_RE.findall((text or '').lower())]
+
+
+def _document(product):
+    return {
+        'name': product.name,
+        'description': product.description,
+        'color': product.color,
+        'category': product.category.name if product.category_id else '',
+    }
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class SQLiteFTSBackend:
+    name = 'fts5'
+
+    def index_products(self, products):
+        rows = [
+            (p.pk, doc['name'], doc['description'], doc['color'], doc['category'])
+            for p in products
+            for doc in [_document(p)]
+        ]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            for chunk in _chunks(rows, INDEX_BATCH_SIZE):
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(
+                    f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+                    [row[0] for row in chunk],
+                )
+                cursor.executemany(
+                    f'INSERT INTO {FTS_TABLE} (rowid, name, description, color, category) '
+                    'VALUES (%s, %s, %s, %s, %s)',
+                    chunk,
+                )
+
+    def remove_products(self, product_ids):
+        product_ids = list(product_ids)
+        with connection.cursor() as cursor:
+            for chunk in _chunks(product_ids, INDEX_BATCH_SIZE):
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', chunk)
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+    def filter(self, queryset, query):
+        tokens = tokenize(query)
+        if not tokens:
+            return queryset.none()
+        # Every token is quoted, so user input can never inject FTS syntax;
+        # the trailing * gives prefix matching for search-as-you-type.
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        weights = ', '.join(str(float(w)) for w in FIELD_WEIGHTS.values())
+        quote = connection.ops.quote_name
+        product_pk = f'{quote(queryset.model._meta.db_table)}.{quote(queryset.model._meta.pk.column)}'
+        # A join rather than IN (...), so SQLite drives the query from the
+        # index and bm25 is computed once per match.
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{quote(FTS_TABLE)}.rowid = {product_pk}', f'{quote(FTS_TABLE)} MATCH %s'],
+            params=[match],
+            select={'search_rank': f'bm25({quote(FTS_TABLE)}, {weights})'},
+        )
+
+
+class InvertedIndexBackend:
+    name = 'inverted'
+
+    def _terms_for(self, product):
+        weights = Counter()
+        for field, text in _document(product).items():
+            for token in tokenize(text):
+                weights[token] += FIELD_WEIGHTS[field]
+        return weights
+
+    def index_products(self, products):
+        products = list(products)
+        if not products:
+            return
+        ProductSearchTerm.objects.filter(product__in=[p.pk for p in products]).delete()
+        ProductSearchTerm.objects.bulk_create(
+            (
+                ProductSearchTerm(term=term, product_id=product.pk, weight=weight)
+                for product in products
+                for term, weight in self._terms_for(product).items()
+            ),
+            batch_size=INDEX_BATCH_SIZE,
+        )
+
+    def remove_products(self, product_ids):
+        ProductSearchTerm.objects.filter(product__in=list(product_ids)).delete()
+
+    def clear(self):
+        ProductSearchTerm.objects.all().delete()
+
+    def filter(self, queryset, query):
+        tokens = set(tokenize(query))
+        if not tokens:
+            return queryset.none()
+        terms = ProductSearchTerm.objects.filter(term__in=tokens)
+        matching = (
+            terms.values('product_id')
+            .annotate(matched=Count('term'))
+            .filter(matched=len(tokens))
+            .values('product_id')
+        )
+        score = (
+            terms.filter(product=OuterRef('pk'))
+            .values('product_id')
+            .annotate(rank=-Sum('weight'))
+            .values('rank')
+        )
+        return queryset.filter(pk__in=matching).annotate(search_rank=Subquery(score))
+
+
+_fts5_tables = {}
+
+
+def fts5_available():
+    if connection.vendor != 'sqlite':
+        return False
+    name = str(connection.settings_dict['NAME'])
+    if name not in _fts5_tables:
+        _fts5_tables[name] = FTS_TABLE in connection.introspection.table_names()
+    return _fts5_tables[name]
+
+
+def get_backend():
+    choice = getattr(settings, 'PRODUCT_SEARCH_BACKEND', 'auto')
+    if choice == 'fts5' or (choice == 'auto' and fts5_available()):
+        return SQLiteFTSBackend()
+    return InvertedIndexBackend()
+
+
+def index_products(products):
+    get_backend().index_products(products)
+
+
+def remove_products(product_ids):
+    get_backend().remove_products(product_ids)
+
+
+def reindex_category(category):
+    """
+    Refresh the indexed category name for every product in a category.
+    """
+    backend = get_backend()
+    products = Product.objects.filter(category=category).select_related('category')
+    batch = []
+    for product in products.iterator(chunk_size=INDEX_BATCH_SIZE):
+        batch.append(product)
+        if len(batch) >= INDEX_BATCH_SIZE:
+            backend.index_products(batch)
+            batch = []
+    backend.index_products(batch)
+
+
+def search_products(queryset, query):
+    """
+    Restrict `queryset` to products matching `query`, best matches first.
+    The rank is annotated as `search_rank`, lower being better.
+    """
+    return get_backend().filter(queryset, query).order_by('search_rank', 'pk')
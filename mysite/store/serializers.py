@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from .fieldsets import SparseFieldsetMixin
 from .models import Category, Product
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -6,9 +7,12 @@ class CategorySerializer(serializers.ModelSerializer):
         model = Category
         fields = ('id', 'name', 'slug', 'is_active')
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     category = serializers.StringRelatedField()
+    # Read by store.fastpath in place of str(product.category).
+    fast_lookups = {'category': 'category__name'}
 
     class Meta:
         model = Product
-        fields = '__all__'
+        # Stock held by carts is internal; see cart.reservations.
+        exclude = ('reserved_quantity',)
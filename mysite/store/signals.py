@@ -0,0 +1,39 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from . import search
+from .cache import bump_version
+from .models import Category, Product
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product_cache(sender, **kwargs):
+    """
+    Invalidate cached catalog responses whenever a product changes.
+    """
+    bump_version(Product)
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category_cache(sender, **kwargs):
+    """
+    Invalidate cached catalog responses whenever a category changes.
+    """
+    bump_version(Category)
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    """
+    Keep the search index in step with the saved product.
+    """
+    if not raw:
+        search.index_products([instance])
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    search.remove_products([instance.pk])
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created, raw=False, **kwargs):
+    """
+    A renamed category changes the indexed text of all of its products.
+    """
+    if not created and not raw:
+        search.reindex_category(instance)
@@ -0,0 +1,54 @@
+"""
+Test helpers shared by the apps' test suites.
+"""
+import re
+
+from django.db import connection
+from django.db.models import QuerySet
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryPlanMixin:
+    """
+    Assertions on SQLite's EXPLAIN QUERY PLAN for the queries views and
+    paginators really run. Skip test cases using it on other databases.
+    """
+
+    def capture_queries(self, table, func, *args, **kwargs):
+        """
+        Call `func` and return the SQL of the SELECTs it ran against `table`.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            func(*args, **kwargs)
+        return [
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT') and f'FROM "{table}"' in query['sql']
+        ]
+
+    def query_plan(self, query):
+        """
+        Return the steps of the plan of `query`, a queryset or SQL.
+        """
+        params = ()
+        if isinstance(query, QuerySet):
+            query, params = query.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + query, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertUsesIndex(self, query, ordered=False, seek=False):
+        """
+        Fail if `query` scans a whole table; with `ordered`, also if it
+        sorts instead of reading an index in order. With `seek`, walking
+        an index from one end counts as a full scan too: a later keyset
+        page must seek to its cursor.
+        """
+        plan = self.query_plan(query)
+        pattern = r'SCAN \w+.*' if seek else r'SCAN \w+'
+        full_scans = [step for step in plan if re.fullmatch(pattern, step)]
+        self.assertEqual(full_scans, [], f'full table scan in {plan}')
+        if ordered:
+            self.assertFalse(
+                any('TEMP B-TREE' in step for step in plan),
+                f'sort without index in {plan}'
+            )
@@ -1,7 +1,19 @@
+import os
+import tempfile
+import unittest
+from io import StringIO
+from urllib.parse import parse_qs, urlsplit
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
+from .cache import get_catalog_cache, stats
 from .models import Category, Product
+from .search import search_products
+from .testing import QueryPlanMixin
 
 class PublicApiTests(APITestCase):
     def setUp(self):
@@ -68,3 +80,586 @@ class PublicApiTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data['results']), 1)
         self.assertEqual(response.data['results'][0]['name'], 'Colored Product')
+
+    def test_filter_products_by_color_is_case_insensitive(self):
+        response = self.client.get(self.products_url, {'color': 'bLUE'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+
+class CatalogCacheTests(APITestCase):
+    def setUp(self):
+        get_catalog_cache().clear()
+        stats.reset()
+        self.category = Category.objects.create(name='Cached Category')
+        self.product = Product.objects.create(
+            name='Cached Product',
+            category=self.category,
+            price=10.00,
+            color='Red'
+        )
+        self.products_url = reverse('product-list')
+        self.detail_url = reverse('product-detail', kwargs={'pk': self.product.pk})
+
+    def test_repeat_request_is_served_from_cache(self):
+        first = self.client.get(self.products_url)
+        self.assertEqual(first['X-Cache'], 'MISS')
+
+        with self.assertNumQueries(0):
+            second = self.client.get(self.products_url)
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(stats.snapshot()['hits'], 1)
+        self.assertEqual(stats.snapshot()['misses'], 1)
+
+    def test_query_string_is_normalized(self):
+        self.client.get(self.products_url, {'color': 'Red', 'price_min': 5})
+        response = self.client.get(self.products_url + '?price_min=5&color=Red&price_max=')
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+        response = self.client.get(self.products_url, {'color': 'Blue'})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.data['results']), 0)
+
+    def test_product_save_invalidates_cache(self):
+        self.client.get(self.detail_url)
+        self.product.name = 'Renamed Product'
+        self.product.save()
+
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['name'], 'Renamed Product')
+
+    def test_product_delete_invalidates_cache(self):
+        self.client.get(self.products_url)
+        self.product.delete()
+
+        response = self.client.get(self.products_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.data['results']), 0)
+
+    def test_category_change_invalidates_product_cache(self):
+        self.client.get(self.products_url)
+        self.category.name = 'Renamed Category'
+        self.category.save()
+
+        response = self.client.get(self.products_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['category'], 'Renamed Category')
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Paged Category')
+        self.products = [
+            Product.objects.create(
+                name=f'Product {i}',
+                category=self.category,
+                price=10 + (i % 4),
+                color='Red' if i % 2 else 'Blue'
+            )
+            for i in range(23)
+        ]
+        self.products_url = reverse('product-list')
+
+    def walk(self, params):
+        ids = []
+        response = self.client.get(self.products_url, dict(params, pagination='cursor'))
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            ids.extend(p['id'] for p in response.data['results'])
+            if not response.data['next']:
+                return ids, response
+            response = self.client.get(response.data['next'])
+
+    def test_walks_newest_first_by_default(self):
+        ids, _ = self.walk({'page_size': 5})
+        self.assertEqual(ids, [p.id for p in reversed(self.products)])
+
+    def test_price_ordering_breaks_ties_on_id(self):
+        ids, _ = self.walk({'page_size': 4, 'ordering': 'price'})
+        expected = sorted(self.products, key=lambda p: (p.price, p.id))
+        self.assertEqual(ids, [p.id for p in expected])
+
+    def test_cursor_is_stable_with_filters(self):
+        ids, _ = self.walk({'page_size': 3, 'color': 'Red', 'ordering': '-price'})
+        expected = sorted(
+            (p for p in self.products if p.color == 'Red'),
+            key=lambda p: (p.price, p.id),
+            reverse=True
+        )
+        self.assertEqual(ids, [p.id for p in expected])
+
+    def test_previous_link_returns_to_prior_page(self):
+        first = self.client.get(self.products_url, {'pagination': 'cursor', 'page_size': 5})
+        self.assertIsNone(first.data['previous'])
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(
+            [p['id'] for p in back.data['results']],
+            [p['id'] for p in first.data['results']]
+        )
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(self.products_url, {'pagination': 'cursor', 'cursor': 'garbage'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class ProductSearchTests(APITestCase):
+    def setUp(self):
+        self.shoes = Category.objects.create(name='Shoes')
+        self.hats = Category.objects.create(name='Hats')
+        self.runner = Product.objects.create(
+            name='Trail Runner', category=self.shoes, price=90,
+            color='Green', description='Lightweight shoe for muddy trails.'
+        )
+        self.boot = Product.objects.create(
+            name='Hiking Boot', category=self.shoes, price=120,
+            color='Brown', description='Waterproof boot, great on any trail.'
+        )
+        self.cap = Product.objects.create(
+            name='Running Cap', category=self.hats, price=20,
+            color='Green', description='Breathable cap.'
+        )
+        self.products_url = reverse('product-list')
+
+    def search(self, query, **params):
+        response = self.client.get(self.products_url, dict(params, q=query))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [p['name'] for p in response.data['results']]
+
+    def test_name_matches_rank_above_description_matches(self):
+        self.assertEqual(self.search('trail'), ['Trail Runner', 'Hiking Boot'])
+
+    def test_all_terms_must_match(self):
+        self.assertEqual(self.search('green shoes'), ['Trail Runner'])
+
+    def test_search_combines_with_filters(self):
+        self.assertEqual(self.search('green', price_max=50), ['Running Cap'])
+
+    def test_index_updates_on_product_save_and_delete(self):
+        self.cap.description = 'Perfect for a trail run.'
+        self.cap.save()
+        self.assertIn('Running Cap', self.search('trail'))
+
+        self.boot.delete()
+        self.assertNotIn('Hiking Boot', self.search('trail'))
+
+    def test_index_updates_on_category_rename(self):
+        self.hats.name = 'Headwear'
+        self.hats.save()
+        self.assertEqual(self.search('headwear'), ['Running Cap'])
+        self.assertEqual(self.search('hats'), [])
+
+    def test_filters_and_counts_see_every_match(self):
+        for i in range(30):
+            Product.objects.create(name=f'Shirt shirt {i}', category=self.hats, price=10, color='Blue')
+            Product.objects.create(name=f'Hidden shirt {i}', category=self.hats, price=10, is_active=False)
+        for i in range(5):
+            Product.objects.create(name=f'Plain shirt {i}', category=self.hats, price=10, color='Red')
+        for backend in ('fts5', 'inverted'):
+            with self.settings(PRODUCT_SEARCH_BACKEND=backend):
+                call_command('rebuild_search_index', stdout=StringIO())
+                get_catalog_cache().clear()
+                response = self.client.get(self.products_url, {'q': 'shirt', 'color': 'red'})
+                self.assertEqual(response.data['count'], 5, backend)
+                facets = self.client.get(reverse('product-facets'), {'q': 'shirt'}).data
+                self.assertEqual(facets['total'], 35, backend)
+
+    def test_inverted_index_backend(self):
+        with self.settings(PRODUCT_SEARCH_BACKEND='inverted'):
+            call_command('rebuild_search_index', stdout=StringIO())
+            self.assertEqual(self.search('trail'), ['Trail Runner', 'Hiking Boot'])
+            self.assertEqual(self.search('green shoes'), ['Trail Runner'])
+
+class ProductFacetTests(APITestCase):
+    def setUp(self):
+        get_catalog_cache().clear()
+        self.shoes = Category.objects.create(name='Shoes')
+        self.hats = Category.objects.create(name='Hats')
+        for name, category, price, color in [
+            ('Red Shoe', self.shoes, 30, 'Red'),
+            ('Blue Shoe', self.shoes, 80, 'Blue'),
+            ('Red Hat', self.hats, 15, 'Red'),
+            ('Golden Hat', self.hats, 750, 'Gold'),
+        ]:
+            Product.objects.create(name=name, category=category, price=price, color=color)
+        Product.objects.create(
+            name='Hidden Shoe', category=self.shoes, price=10, color='Red', is_active=False
+        )
+        self.facets_url = reverse('product-facets')
+
+    def test_facets_are_computed_in_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.facets_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total'], 4)
+        self.assertEqual(response.data['colors'][0], {'value': 'Red', 'count': 2})
+        self.assertEqual(
+            {c['name']: c['count'] for c in response.data['categories']},
+            {'Shoes': 2, 'Hats': 2}
+        )
+        self.assertEqual(
+            [b['count'] for b in response.data['price_buckets']],
+            [1, 1, 1, 0, 0, 1]
+        )
+        self.assertIsNone(response.data['price_buckets'][-1]['max'])
+
+    def test_facets_follow_filters(self):
+        response = self.client.get(self.facets_url, {'price_max': 50})
+        self.assertEqual(response.data['total'], 2)
+        self.assertEqual(response.data['colors'], [{'value': 'Red', 'count': 2}])
+
+        response = self.client.get(self.facets_url, {'q': 'hat'})
+        self.assertEqual(response.data['total'], 2)
+        self.assertEqual([c['name'] for c in response.data['categories']], ['Hats'])
+
+    def test_facets_are_cached_and_invalidated(self):
+        self.client.get(self.facets_url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.facets_url)['X-Cache'], 'HIT')
+
+        Product.objects.create(name='Green Hat', category=self.hats, price=20, color='Green')
+        response = self.client.get(self.facets_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['total'], 5)
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite syntax')
+class ProductQueryPlanTests(QueryPlanMixin, TestCase):
+    """
+    Every hot catalog page query, as the views run it (category joined,
+    sparse columns, keyset pagination), must be answered from an index.
+    """
+    def setUp(self):
+        get_catalog_cache().clear()
+        category = Category.objects.create(name='Plan Category')
+        for i in range(12):
+            Product.objects.create(
+                name=f'Plan {i}', category=category, price=10 + i, color='Red', is_featured=i % 2 == 0
+            )
+
+    def page_queries(self, url, params):
+        get_catalog_cache().clear()
+        queries = self.capture_queries('store_product', self.client.get, url, params)
+        self.assertTrue(queries)
+        return queries
+
+    def test_newest_first_keyset_pages(self):
+        params = {'pagination': 'cursor'}
+        first, = self.page_queries(reverse('product-list'), params)
+        self.assertIn('INNER JOIN "store_category"', first)
+        self.assertUsesIndex(first, ordered=True)
+
+        cursor = self.client.get(reverse('product-list'), params).data['next']
+        params['cursor'] = parse_qs(urlsplit(cursor).query)['cursor'][0]
+        later, = self.page_queries(reverse('product-list'), params)
+        self.assertUsesIndex(later, ordered=True, seek=True)
+
+    def test_price_keyset_page(self):
+        page, = self.page_queries(reverse('product-list'), {'pagination': 'cursor', 'ordering': 'price'})
+        self.assertUsesIndex(page, ordered=True)
+
+    def test_sparse_keyset_page(self):
+        page, = self.page_queries(reverse('product-list'), {'pagination': 'cursor', 'fields': 'name,price'})
+        self.assertNotIn('"store_product"."description"', page)
+        self.assertUsesIndex(page, ordered=True)
+
+    def test_featured_products(self):
+        for query in self.page_queries(reverse('featured-product-list'), {}):
+            self.assertUsesIndex(query)
+
+    def test_color_filter(self):
+        for query in self.page_queries(reverse('product-list'), {'color': 'red'}):
+            self.assertUsesIndex(query)
+
+    def test_price_range_filter(self):
+        for query in self.page_queries(reverse('product-list'), {'price_min': 10, 'price_max': 50}):
+            self.assertUsesIndex(query)
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        get_catalog_cache().clear()
+        self.category = Category.objects.create(name='Polled Category')
+        self.product = Product.objects.create(name='Polled Product', category=self.category, price=10)
+        self.other = Product.objects.create(name='Other Product', category=self.category, price=20)
+        self.products_url = reverse('product-list')
+        self.detail_url = reverse('product-detail', kwargs={'pk': self.product.pk})
+
+    def test_list_returns_etag_only(self):
+        response = self.client.get(self.products_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.has_header('ETag'))
+        self.assertFalse(response.has_header('Last-Modified'))
+
+    @override_settings(CATALOG_CACHE_TIMEOUT=0)
+    def test_matching_etag_returns_304_without_querying(self):
+        etag = self.client.get(self.products_url)['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.products_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+    def test_cache_hit_answers_conditional_request(self):
+        etag = self.client.get(self.products_url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.products_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_etag_varies_with_query_string(self):
+        etag = self.client.get(self.products_url)['ETag']
+        response = self.client.get(self.products_url, {'price_max': 15}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_changes_and_deletions_change_the_etag(self):
+        etag = self.client.get(self.products_url)['ETag']
+        self.other.delete()
+        response = self.client.get(self.products_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        etag = response['ETag']
+        self.category.name = 'Renamed Category'
+        self.category.save()
+        response = self.client.get(self.products_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_detail_honours_if_modified_since(self):
+        last_modified = self.client.get(self.detail_url)['Last-Modified']
+        get_catalog_cache().clear()
+        response = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_list_validator_does_not_aggregate_the_result_set(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.products_url, {'pagination': 'cursor'})
+        self.assertTrue(response.has_header('ETag'))
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('COUNT(', queries[0]['sql'])
+        self.assertNotIn('MAX(', queries[0]['sql'])
+
+    def test_list_ignores_if_modified_since_on_miss_and_hit(self):
+        last_modified = self.client.get(self.detail_url)['Last-Modified']
+        self.other.delete()
+        for expected_cache in ('MISS', 'HIT'):
+            response = self.client.get(self.products_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response['X-Cache'], expected_cache)
+
+    def test_detail_cache_hit_honours_if_modified_since(self):
+        last_modified = self.client.get(self.detail_url)['Last-Modified']
+        response = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_missing_product_is_still_404(self):
+        response = self.client.get(reverse('product-detail', kwargs={'pk': 999999}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(response.has_header('ETag'))
+
+class SparseFieldsetTests(APITestCase):
+    def setUp(self):
+        get_catalog_cache().clear()
+        self.category = Category.objects.create(name='Sparse Category')
+        for i in range(5):
+            Product.objects.create(
+                name=f'Sparse {i}', category=self.category, price=10 + i,
+                description='A long description. ' * 50
+            )
+        self.products_url = reverse('product-list')
+
+    def test_fields_keeps_only_requested_fields(self):
+        response = self.client.get(self.products_url, {'fields': 'name,price,slug'})
+        self.assertEqual(
+            set(response.data['results'][0]),
+            {'id', 'name', 'price', 'slug'}
+        )
+
+    def test_omit_drops_fields(self):
+        response = self.client.get(self.products_url, {'omit': 'description,category'})
+        row = response.data['results'][0]
+        self.assertNotIn('description', row)
+        self.assertNotIn('category', row)
+        self.assertIn('name', row)
+
+    def test_unrequested_columns_are_not_read(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.products_url, {'fields': 'name,price', 'pagination': 'cursor'})
+        select = [q['sql'] for q in queries if 'FROM "store_product"' in q['sql']][-1]
+        self.assertNotIn('"description"', select)
+
+    def test_category_is_joined_not_fetched_per_row(self):
+        get_catalog_cache().clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.products_url, {'pagination': 'cursor'})
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertFalse(any('FROM "store_category"' in q['sql'] for q in queries))
+
+class FastSerializerParityTests(APITestCase):
+    def setUp(self):
+        get_catalog_cache().clear()
+        self.category = Category.objects.create(name='Parity Category')
+        for i in range(6):
+            Product.objects.create(
+                name=f'Parity lamp {i}', category=self.category, price=f'{10 + i}.5',
+                color='Red' if i % 2 else '', description=f'Lamp number {i}',
+                is_featured=i % 3 == 0
+            )
+
+    def assertSameOutput(self, url, params=None):
+        get_catalog_cache().clear()
+        with override_settings(FAST_LIST_SERIALIZATION=False):
+            expected = self.client.get(url, params)
+        get_catalog_cache().clear()
+        with override_settings(FAST_LIST_SERIALIZATION=True):
+            actual = self.client.get(url, params)
+        self.assertEqual(actual.status_code, status.HTTP_200_OK)
+        self.assertEqual(actual.content, expected.content)
+
+    def test_product_list(self):
+        self.assertSameOutput(reverse('product-list'))
+
+    def test_product_list_sparse_and_cursor(self):
+        self.assertSameOutput(reverse('product-list'), {'fields': 'name,price'})
+        self.assertSameOutput(reverse('product-list'), {'pagination': 'cursor', 'ordering': 'price'})
+
+    def test_product_search(self):
+        self.assertSameOutput(reverse('product-list'), {'q': 'lamp'})
+
+    def test_featured_and_categories(self):
+        self.assertSameOutput(reverse('featured-product-list'))
+        self.assertSameOutput(reverse('category-list'))
+
+    def test_reserved_stock_is_not_exposed(self):
+        product = Product.objects.filter(category=self.category).first()
+        for fast in (False, True):
+            get_catalog_cache().clear()
+            with override_settings(FAST_LIST_SERIALIZATION=fast):
+                listed = self.client.get(reverse('product-list')).json()['results'][0]
+                detail = self.client.get(reverse('product-detail', kwargs={'pk': product.pk})).json()
+            self.assertNotIn('reserved_quantity', listed)
+            self.assertNotIn('reserved_quantity', detail)
+            self.assertIn('stock_quantity', detail)
+
+    def test_fast_list_skips_model_instances(self):
+        with override_settings(FAST_LIST_SERIALIZATION=True):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse('product-list'))
+        select = [q['sql'] for q in queries if 'FROM "store_product"' in q['sql']][-1]
+        self.assertNotIn('"store_category"."updated_at"', select)
+
+class ImportProductsTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Import Category')
+        Product.objects.create(name='Desk Lamp', category=self.category, price=10, description='Old')
+
+    def write_feed(self, suffix, content):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, 'w') as feed:
+            feed.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def call(self, path, *args):
+        out, err = StringIO(), StringIO()
+        call_command('import_products', path, *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_csv_import_generates_unique_slugs(self):
+        path = self.write_feed('.csv', (
+            'name,description,price,category,color,stock_quantity\n'
+            'Desk Lamp,New one,12.5,Import Category,Red,3\n'
+            'Desk Lamp,Another,13,import-category,Blue,\n'
+            'Floor Lamp,Tall,40,Import Category,Black,1\n'
+        ))
+        out, err = self.call(path, '--batch-size', '2')
+        self.assertIn('Imported 3 new and 0 updated products', out)
+        self.assertEqual(err, '')
+        self.assertEqual(
+            set(Product.objects.values_list('slug', flat=True)),
+            {'desk-lamp', 'desk-lamp-2', 'desk-lamp-3', 'floor-lamp'}
+        )
+        product = Product.objects.get(slug='desk-lamp-2')
+        self.assertEqual(str(product.price), '12.50')
+        self.assertEqual(product.stock_quantity, 3)
+
+    def test_jsonl_upserts_by_slug(self):
+        path = self.write_feed('.jsonl', (
+            '{"name": "Desk Lamp v2", "slug": "desk-lamp", "price": "11.00", "category": "Import Category"}\n'
+            '{"name": "Shade", "slug": "shade", "price": 5, "category": "Import Category", "is_featured": true}\n'
+        ))
+        out, _ = self.call(path)
+        self.assertIn('Imported 1 new and 1 updated products', out)
+        lamp = Product.objects.get(slug='desk-lamp')
+        self.assertEqual(lamp.name, 'Desk Lamp v2')
+        self.assertTrue(Product.objects.get(slug='shade').is_featured)
+        self.assertEqual(Product.objects.count(), 2)
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        path = self.write_feed('.csv', (
+            'name,price,category\n'
+            'Good,1,Import Category\n'
+            'Bad price,abc,Import Category\n'
+            'No category,1,Missing\n'
+        ))
+        out, err = self.call(path)
+        self.assertIn('skipped 2 rows', out)
+        self.assertIn('Line 3: price', err)
+        self.assertIn("Line 4: unknown category 'Missing'", err)
+
+    def test_create_categories_and_index(self):
+        path = self.write_feed('.csv', 'name,price,category\nGlobe,7,Lighting\n')
+        self.call(path, '--create-categories')
+        product = Product.objects.get(slug='globe')
+        self.assertEqual(product.category.name, 'Lighting')
+        self.assertEqual(
+            list(search_products(Product.objects.all(), 'globe').values_list('pk', flat=True)),
+            [product.pk]
+        )
+
+class ProductListPageTests(TestCase):
+    def setUp(self):
+        get_catalog_cache().clear()
+        self.category = Category.objects.create(name='Page Category')
+        for i in range(30):
+            Product.objects.create(
+                name=f'Listed {i}', category=self.category, price=10 + i,
+                color='Red' if i % 2 else 'Blue', description=''
+            )
+        Product.objects.create(name='Hidden', category=self.category, price=1, description='', is_active=False)
+        self.url = reverse('product-list-page')
+
+    def test_paginates_active_products(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.context['products']), 24)
+        self.assertEqual(response.context['paginator'].count, 30)
+        self.assertNotContains(response, 'Hidden')
+        self.assertContains(response, 'Page Category')
+        self.assertContains(response, 'page=2')
+
+    def test_filters_are_applied_and_kept_in_links(self):
+        response = self.client.get(self.url, {'color': 'red', 'price_max': 100})
+        self.assertEqual(response.context['paginator'].count, 15)
+        self.assertNotContains(response, 'page=2')
+        response = self.client.get(self.url, {'color': 'blue', 'page': 1})
+        self.assertEqual(response.context['filter_query'], 'color=blue')
+
+    def test_first_render_does_not_query_per_row(self):
+        with self.assertNumQueries(2):
+            self.client.get(self.url)
+
+    def test_repeated_page_is_served_from_cache(self):
+        self.client.get(self.url, {'page': 2})
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {'page': 2})
+        self.assertContains(response, 'Listed 0')
+
+    def test_catalog_change_invalidates_fragment(self):
+        self.client.get(self.url)
+        Product.objects.create(name='Brand new', category=self.category, price=5, description='')
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Brand new')
+        self.assertEqual(response.context['paginator'].count, 31)
+
+    def test_out_of_range_page_is_404(self):
+        self.assertEqual(self.client.get(self.url, {'page': 99}).status_code, 404)
@@ -4,13 +4,17 @@ from .views import (
     ProductListView,
     ProductDetailView,
     FeaturedProductListView,
-    LandingPageView
+    ProductFacetView,
+    LandingPageView,
+    ProductList,
 )
 
 urlpatterns = [
     path('', LandingPageView.as_view(), name='landing-page'),
+    path('catalog/', ProductList.as_view(), name='product-list-page'),
     path('categories/', CategoryListView.as_view(), name='category-list'),
     path('products/', ProductListView.as_view(), name='product-list'),
+    path('products/facets/', ProductFacetView.as_view(), name='product-facets'),
     path('products/featured/', FeaturedProductListView.as_view(), name='featured-product-list'),
     path('products/<int:pk>/', ProductDetailView.as_view(), name='product-detail'),
 ]
@@ -1,11 +1,18 @@
 from rest_framework import generics
 from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
 from .models import Category, Product
 from .serializers import CategorySerializer, ProductSerializer
 from .filters import ProductFilter
+from .facets import compute_facets
+from django.conf import settings
 from django.shortcuts import render
 from django.views.generic import ListView, View
-from .pagination import StandardResultsSetPagination
+from .pagination import StandardResultsSetPagination, ProductKeysetPagination, CachedCountPaginator
+from .cache import CatalogCacheMixin, get_versions, normalize_query
+from .conditional import ConditionalGetMixin
+from .fastpath import FastListMixin
+from .fieldsets import SparseFieldsetViewMixin
 from django_filters.rest_framework import DjangoFilterBackend
 
 class LandingPageView(View):
@@ -13,29 +20,109 @@ class LandingPageView(View):
         return render(request, 'landing.html')
 
 class ProductList(ListView):
-    model = Product
+    """
+    Server-rendered, paginated product listing accepting the same filters as
+    the product API (`q`, `color`, `price_min`, `price_max`).
+
+    Each page's product list is a template fragment cached under the catalog
+    versions and the query string, and the page count is cached the same
+    way, so a repeated page costs no product queries at all.
+    """
     template_name = 'product_list.html'
     context_object_name = 'products'
+    paginate_by = 24
+    paginator_class = CachedCountPaginator
+    cache_models = (Product, Category)
+
+    def get_queryset(self):
+        queryset = (
+            Product.objects.filter(is_active=True)
+            .select_related('category')
+            .only('name', 'slug', 'price', 'color', 'created_at', 'category__name', 'category__slug')
+            .order_by('-created_at', '-id')
+        )
+        return ProductFilter(self.request.GET, queryset=queryset, request=self.request).qs
+
+    def get_filter_query(self):
+        params = self.request.GET.copy()
+        params.pop(self.page_kwarg, None)
+        return normalize_query(params)
 
-class CategoryListView(generics.ListAPIView):
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        return self.paginator_class(
+            queryset, per_page, orphans=orphans, allow_empty_first_page=allow_empty_first_page,
+            cache_key=self.get_filter_query(), cache_models=self.cache_models,
+            cache_timeout=getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300), **kwargs
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.update({
+            'filter_query': self.get_filter_query(),
+            'catalog_version': '.'.join(str(v) for v in get_versions(*self.cache_models)),
+            'fragment_cache_alias': getattr(settings, 'CATALOG_CACHE_ALIAS', 'default'),
+            'fragment_cache_timeout': getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300),
+        })
+        return context
+
+class CategoryListView(CatalogCacheMixin, ConditionalGetMixin, FastListMixin, generics.ListAPIView):
     queryset = Category.objects.filter(is_active=True)
     serializer_class = CategorySerializer
     permission_classes = [AllowAny]
+    cache_models = (Category,)
 
-class ProductListView(generics.ListAPIView):
+class ProductListView(CatalogCacheMixin, ConditionalGetMixin, SparseFieldsetViewMixin, FastListMixin,
+                      generics.ListAPIView):
     queryset = Product.objects.filter(is_active=True)
     serializer_class = ProductSerializer
     permission_classes = [AllowAny]
+    cache_models = (Product, Category)
+    validator_fields = ('updated_at', 'category__updated_at')
     filter_backends = [DjangoFilterBackend]
     filterset_class = ProductFilter
     pagination_class = StandardResultsSetPagination
+    cursor_pagination_class = ProductKeysetPagination
+    sparse_required_fields = ProductKeysetPagination.ordering_fields
+
+    @property
+    def paginator(self):
+        """
+        Use keyset pagination when the client asks for `?pagination=cursor`,
+        page numbers otherwise.
+        """
+        if not hasattr(self, '_paginator'):
+            if self.request.query_params.get('pagination') == 'cursor':
+                self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
 
-class ProductDetailView(generics.RetrieveAPIView):
+class ProductDetailView(CatalogCacheMixin, ConditionalGetMixin, SparseFieldsetViewMixin, generics.RetrieveAPIView):
     queryset = Product.objects.filter(is_active=True)
     serializer_class = ProductSerializer
     permission_classes = [AllowAny]
+    cache_models = (Product, Category)
+    validator_fields = ('updated_at', 'category__updated_at')
 
-class FeaturedProductListView(generics.ListAPIView):
+class FeaturedProductListView(CatalogCacheMixin, ConditionalGetMixin, SparseFieldsetViewMixin, FastListMixin,
+                              generics.ListAPIView):
     queryset = Product.objects.filter(is_active=True, is_featured=True)
     serializer_class = ProductSerializer
     permission_classes = [AllowAny]
+    cache_models = (Product, Category)
+    validator_fields = ('updated_at', 'category__updated_at')
+
+class ProductFacetView(CatalogCacheMixin, generics.ListAPIView):
+    """
+    Color, category and price-bucket counts for the current ProductFilter
+    selection, computed in one grouped aggregate query.
+    """
+    queryset = Product.objects.filter(is_active=True)
+    permission_classes = [AllowAny]
+    cache_models = (Product, Category)
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = ProductFilter
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(compute_facets(queryset))
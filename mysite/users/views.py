@@ -3,7 +3,11 @@ from rest_framework import generics, status
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenObtainPairView
+
+from cart.guest import get_guest_token, merge_guest_cart
 
 from .models import Address, UserProfile
 from .serializers import (
@@ -19,6 +23,7 @@ class RegisterView(generics.GenericAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
+        merge_guest_cart(user, get_guest_token(request))
         user_data = UserSerializer(user).data
         
         refresh = RefreshToken.for_user(user)
@@ -30,6 +35,22 @@ class RegisterView(generics.GenericAPIView):
         }, status=status.HTTP_201_CREATED)
 
 
+class LoginView(TokenObtainPairView):
+    """
+    Obtain a JWT pair and merge the caller's guest cart, if any, into the
+    user's cart.
+    """
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except TokenError as e:
+            raise InvalidToken(e.args[0])
+        merge_guest_cart(serializer.user, get_guest_token(request))
+        return Response(serializer.validated_data, status=status.HTTP_200_OK)
+
+
 class LogoutView(APIView):
     permission_classes = (IsAuthenticated,)
 